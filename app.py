@@ -1,10 +1,17 @@
+import time
+_script_start = time.perf_counter()
+
 import streamlit as st
 import os
 import shutil
 import uuid
-import io
-from docx import Document
-from src.backend import AdvancedRAG
+# src.backend pulls in torch, chromadb and llama_index; it is imported by the warm-up thread
+from src.config import WARMUP_ON_START, CHAT_WINDOW, CHUNK_STORE_PATH
+from src.chat_export import ChatExport
+from src.jobs import IngestionQueue, ACTIVE
+from src.routing import AUTO_MODEL
+from src.sessions import SessionStore
+from src.warmup import EngineLoader
 
 # 1. Page Configuration
 st.set_page_config(
@@ -107,31 +114,57 @@ if "session_id" not in st.session_state:
     st.session_state.messages = []
     st.session_state.chat_title = "New Chat"
     st.session_state.db_ready = False
+if "chat_exports" not in st.session_state:
+    # session_id -> ChatExport, created on the first download
+    st.session_state.chat_exports = {}
+    # session_id -> number of most recent messages shown
+    st.session_state.history_window = {}
+if "ingest_jobs" not in st.session_state:
+    # session_id -> id of its latest background ingestion job
+    st.session_state.ingest_jobs = {}
 
 # 4. Directory Setup
-BASE_DIR = "temp_data"
-USER_SESSION_DIR = os.path.join(BASE_DIR, st.session_state.session_id)
-FILES_DIR = os.path.join(USER_SESSION_DIR, "files")
-DB_DIR = os.path.join(USER_SESSION_DIR, "db")
-os.makedirs(FILES_DIR, exist_ok=True)
-os.makedirs(DB_DIR, exist_ok=True)
+# temp_data/<session_id> is kept within RAG_SESSION_QUOTA_MB: idle chats are archived
+# and restored when reopened, the least recently used ones are deleted
+# (both run on the store's background thread and never wait for the engine to load)
+def _close_session_db(db_path):
+    # Only an engine that has loaded can hold open clients
+    if get_engine_loader().ready:
+        get_engine_loader().get().close_session(db_path)
+
+def _delete_session_db(db_path):
+    if get_engine_loader().ready:
+        get_engine_loader().get().release_session(db_path)
+    elif CHUNK_STORE_PATH:
+        # No open clients yet; drop the session's shared-chunk references directly
+        from src.chunk_store import ChunkStore
+        chunk_store = ChunkStore(CHUNK_STORE_PATH)
+        try:
+            chunk_store.release_owner(os.path.abspath(db_path))
+        finally:
+            chunk_store.close()
+
+@st.cache_resource
+def get_session_store():
+    return SessionStore(on_close=_close_session_db, on_delete=_delete_session_db)
+session_store = get_session_store()
+
+FILES_DIR, DB_DIR = session_store.open(st.session_state.session_id)
+if st.session_state.db_ready and not os.path.exists(os.path.join(DB_DIR, "manifest.json")):
+    # Evicted while over quota
+    st.session_state.db_ready = False
+    st.toast("This chat's documents were removed to free disk space. Upload them again to continue.")
 
 # 5. Document Helper
-def generate_document(messages):
-    doc = Document()
-    doc.add_heading('Formal Conversation Log', 0)
-    for msg in messages:
-        role = "User" if msg["role"] == "user" else f"AI ({msg.get('model_name', 'System')})"
-        p = doc.add_paragraph()
-        p.add_run(f"{role}:").bold = True
-        doc.add_paragraph(msg["content"])
-        doc.add_paragraph("-" * 20)
-    buffer = io.BytesIO()
-    doc.save(buffer)
-    buffer.seek(0)
-    return buffer
+def docx_export(session_id, messages):
+    # Returns the callable the download button runs on click, so reruns never build the DOCX.
+    # It runs on another thread, hence the snapshot of the message list.
+    export = st.session_state.chat_exports.setdefault(session_id, ChatExport())
+    snapshot = list(messages)
+    return lambda: export.build(snapshot)
 
 model_map = {
+    "Auto (routed by question)": AUTO_MODEL,
     "Llama 3.3 70B (Versatile)": "llama-3.3-70b-versatile",
     "Llama 3.1 8B (Instant)": "llama-3.1-8b-instant",
     "Llama 4 (Scout 17B)": "meta-llama/llama-4-scout-17b-16e-instruct",
@@ -139,10 +172,57 @@ model_map = {
     "GPT-OSS 20B": "openai/gpt-oss-20b"
 }
 
+DEFAULT_MODEL = "Llama 3.3 70B (Versatile)"
+
+def answered_by(selected_friendly, stats):
+    # Auto mode names the model the router ended up using; cached answers say so
+    name = selected_friendly
+    if "model" in stats:
+        friendly = {model_id: name for name, model_id in model_map.items()}.get(stats["model"], stats["model"])
+        name = f"Auto → {friendly}"
+    if stats.get("cache") in ("exact", "semantic"):
+        name += " · cached"
+    return name
+
 @st.cache_resource
+def get_engine_loader():
+    # Starts loading the embedding model in the background; the page renders meanwhile
+    return EngineLoader(eager=WARMUP_ON_START)
+engine_loader = get_engine_loader()
+
 def get_rag_engine():
-    return AdvancedRAG()
-rag_engine = get_rag_engine()
+    if not engine_loader.ready:
+        with st.spinner("Loading models..."):
+            return engine_loader.get()
+    return engine_loader.get()
+
+@st.cache_resource
+def get_ingestion_queue():
+    # Worker threads shared by every session; the engine is fetched when a job starts
+    return IngestionQueue(lambda: get_engine_loader().get())
+ingestion_queue = get_ingestion_queue()
+
+@st.fragment(run_every=1.0)
+def ingest_progress(job_id):
+    job = ingestion_queue.status(job_id)
+    if job is None or job["status"] not in ACTIVE:
+        st.rerun()
+    if job["files_done"] and not st.session_state.db_ready:
+        # Files committed so far can be queried while the rest is indexed
+        st.session_state.db_ready = True
+        st.rerun()
+    if job["status"] == "queued":
+        st.progress(0.0, text="Waiting for an ingestion worker...")
+    else:
+        st.progress(
+            job["fraction"],
+            text=f"Indexing {job['current_file'] or '...'} | {job['files_done']}/{job['files_total'] or '?'} files, "
+                 f"{job['chunks_done']} chunks"
+        )
+    if st.button("Cancel", key=f"cancel_{job_id}", use_container_width=True):
+        ingestion_queue.cancel(job_id)
+
+session_store.maybe_enforce(keep={st.session_state.session_id} | ingestion_queue.busy_sessions())
 
 # 6. Sidebar Implementation
 with st.sidebar:
@@ -174,24 +254,111 @@ with st.sidebar:
 
     st.markdown("---")
     st.header("Settings")
-    selected_model_friendly = st.selectbox("Select Model", list(model_map.keys()), index=0)
+    # Llama 3.3 70B stays the default; "Auto" is opt-in
+    selected_model_friendly = st.selectbox(
+        "Select Model", list(model_map.keys()), index=list(model_map).index(DEFAULT_MODEL)
+    )
     selected_model_id = model_map[selected_model_friendly]
+    show_timings = st.toggle("Show timing breakdown", value=False)
+    if show_timings:
+        timed = [m for m in st.session_state.messages if m.get("timings")]
+        if timed:
+            choice = st.selectbox(
+                "Answer", range(len(timed)), index=len(timed) - 1,
+                format_func=lambda i: f"#{i + 1} | {timed[i].get('model_name', 'System')}"
+            )
+            st.table([
+                {"Stage": span["span"], "ms": round(span["duration_ms"], 1), "Status": span["status"]}
+                for span in timed[choice]["timings"]
+            ])
+            if timed[choice].get("prompt_tokens"):
+                st.caption(f"Prompt tokens: {timed[choice]['prompt_tokens']}")
+        else:
+            st.caption("No timed answers yet.")
     
     st.header("Upload Documents")
     uploaded_files = st.file_uploader("Drop files here", accept_multiple_files=True, key=f"uploader_{st.session_state.session_id}")
     
-    if st.button("Process Documents", use_container_width=True):
+    job_id = st.session_state.ingest_jobs.get(st.session_state.session_id)
+    job = ingestion_queue.status(job_id) if job_id else None
+    job_active = job is not None and job["status"] in ACTIVE
+
+    # Indexing runs as a background job; the files are only touched while no job of this chat runs
+    if st.button("Process Documents", use_container_width=True, disabled=job_active):
         if uploaded_files:
-            with st.spinner("Indexing..."):
-                if os.path.exists(FILES_DIR): shutil.rmtree(FILES_DIR)
-                os.makedirs(FILES_DIR)
-                for file in uploaded_files:
-                    with open(os.path.join(FILES_DIR, file.name), "wb") as f: f.write(file.getbuffer())
-                status = rag_engine.process_documents(FILES_DIR, DB_DIR)
-                if status == "Success":
-                    st.success("Ready")
-                    st.session_state.db_ready = True
-                else: st.error(f"Error: {status}")
+            # Keep FILES_DIR in sync with the upload set; unchanged files are left untouched
+            upload_names = {file.name for file in uploaded_files}
+            for name in os.listdir(FILES_DIR):
+                if name not in upload_names:
+                    path = os.path.join(FILES_DIR, name)
+                    if os.path.isdir(path): shutil.rmtree(path)
+                    else: os.remove(path)
+            for file in uploaded_files:
+                path = os.path.join(FILES_DIR, file.name)
+                data = file.getbuffer()
+                if os.path.exists(path) and os.path.getsize(path) == len(data):
+                    with open(path, "rb") as f:
+                        if f.read() == bytes(data): continue
+                with open(path, "wb") as f: f.write(data)
+            st.session_state.ingest_jobs[st.session_state.session_id] = ingestion_queue.submit(
+                st.session_state.session_id, FILES_DIR, DB_DIR
+            )
+            st.rerun()
+
+    if job_active:
+        ingest_progress(job_id)
+    elif job is not None:
+        # Report a finished job once
+        del st.session_state.ingest_jobs[st.session_state.session_id]
+        if job["status"] == "done":
+            status = job["result"]
+            st.success(
+                f"Ready ({status['added']} added, {status['updated']} updated, "
+                f"{status['skipped']} skipped, {status['deleted']} deleted) in {job['elapsed_s']:.1f}s"
+            )
+            st.session_state.db_ready = True
+        elif job["status"] == "cancelled":
+            st.warning(f"Indexing cancelled. {job['files_done']} file(s) finished before the cancel stay indexed.")
+        else:
+            st.error(job["error"])
+
+    with st.expander("Startup profile"):
+        if engine_loader.ready:
+            st.caption(engine_loader.format_profile())
+        else:
+            st.caption("Models are loading in the background...")
+        st.caption(f"Sidebar rendered {time.perf_counter() - _script_start:.2f}s after script start")
+
+    if engine_loader.ready:
+        with st.expander("Routing"):
+            for route, route_stats in get_rag_engine().router.stats().items():
+                st.caption(
+                    f"{route.capitalize()}: {route_stats['queries']} queries | "
+                    f"SLO {route_stats['slo_s']:.0f}s met {route_stats['slo_met']:.0%} | "
+                    f"p95 {route_stats['p95_s']:.2f}s | {route_stats['fallbacks']} fallbacks"
+                )
+        if get_rag_engine().answer_cache is not None:
+            with st.expander("Answer cache"):
+                cache_stats = get_rag_engine().answer_cache.stats()
+                st.caption(
+                    f"Hit rate {cache_stats['hit_rate']:.0%} of {cache_stats['lookups']} lookups "
+                    f"({cache_stats['exact_hits']} exact, {cache_stats['semantic_hits']} semantic) | "
+                    f"{cache_stats['entries']} entries"
+                )
+
+    with st.expander("Storage"):
+        storage = session_store.stats()
+        if storage["usage_mb"] is None:
+            st.caption(f"Measuring disk usage... | quota {storage['quota_mb']:.0f} MB")
+        else:
+            st.caption(
+                f"{storage['usage_mb']:.0f} / {storage['quota_mb']:.0f} MB | "
+                f"{storage['sessions']} sessions, {storage['archived_sessions']} archived"
+            )
+        st.caption(
+            f"Open p50 {storage['open_p50_ms']:.1f} ms | "
+            f"Restore p50 {storage['restore_p50_ms']:.0f} ms, p95 {storage['restore_p95_ms']:.0f} ms"
+        )
 
 # 7. Main Interface & Export Logic (Right Side)
 st.markdown("<h1 class='main-title'>Multi Model RAG</h1>", unsafe_allow_html=True)
@@ -201,21 +368,38 @@ if st.session_state.messages:
     # Use columns to push the download button to the far right
     header_col, download_col = st.columns([8, 2])
     with download_col:
-        docx_file = generate_document(st.session_state.messages)
         st.download_button(
             label="Download Log (DOCX)",
-            data=docx_file,
+            data=docx_export(st.session_state.session_id, st.session_state.messages),
+            on_click="ignore",
             file_name=f"chat_log_{st.session_state.session_id[:8]}.docx",
             mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
             use_container_width=True
         )
 
 # Chat Display
-for msg in st.session_state.messages:
-    if msg["role"] == "user":
-        st.markdown(f'<div class="chat-container user-box"><div class="role-header">User</div><div class="content-text">{msg["content"]}</div></div>', unsafe_allow_html=True)
-    else:
-        st.markdown(f'<div class="chat-container ai-box"><div class="role-header">Response | {msg.get("model_name", "System")}</div><div class="content-text">{msg["content"]}</div></div>', unsafe_allow_html=True)
+def ai_box(model_name, content, ttft=None, gen_time=None):
+    header = f"Response | {model_name}"
+    if ttft is not None and gen_time is not None:
+        header += f" | First token {ttft:.2f}s | Total {gen_time:.2f}s"
+    return f'<div class="chat-container ai-box"><div class="role-header">{header}</div><div class="content-text">{content}</div></div>'
+
+def user_box(content):
+    return f'<div class="chat-container user-box"><div class="role-header">User</div><div class="content-text">{content}</div></div>'
+
+# Only the latest window of messages is rendered, as a single element
+window = st.session_state.history_window.get(st.session_state.session_id, CHAT_WINDOW)
+hidden = max(0, len(st.session_state.messages) - window)
+if hidden:
+    if st.button(f"Show {min(hidden, CHAT_WINDOW)} earlier messages ({hidden} hidden)", type="tertiary"):
+        st.session_state.history_window[st.session_state.session_id] = window + CHAT_WINDOW
+        st.rerun()
+if st.session_state.messages:
+    st.markdown("\n\n".join(
+        user_box(msg["content"]) if msg["role"] == "user"
+        else ai_box(msg.get("model_name", "System"), msg["content"], msg.get("ttft"), msg.get("gen_time"))
+        for msg in st.session_state.messages[hidden:]
+    ), unsafe_allow_html=True)
 
 # 8. Input Processing (Fixed Parameter Name)
 if prompt := st.chat_input("Enter your query..."):
@@ -226,14 +410,28 @@ if prompt := st.chat_input("Enter your query..."):
 
 if st.session_state.messages and st.session_state.messages[-1]["role"] == "user":
     if st.session_state.get("db_ready"):
-        with st.spinner("Processing..."):
-            # FIX: Use query_text instead of prompt
-            response = rag_engine.query(
-                query_text=st.session_state.messages[-1]["content"], 
-                db_path=DB_DIR, 
-                model_name=selected_model_id
-            )
-            st.session_state.messages.append({"role": "assistant", "content": response, "model_name": selected_model_friendly})
-            st.rerun()
+        # Render tokens as they arrive instead of waiting for the full completion
+        placeholder = st.empty()
+        placeholder.markdown(ai_box(selected_model_friendly, "Processing..."), unsafe_allow_html=True)
+        stats = {}
+        response = ""
+        for token in get_rag_engine().query_stream(
+            query_text=st.session_state.messages[-1]["content"], 
+            db_path=DB_DIR, 
+            model_name=selected_model_id,
+            stats=stats
+        ):
+            response += token
+            placeholder.markdown(ai_box(answered_by(selected_model_friendly, stats), response), unsafe_allow_html=True)
+        st.session_state.messages.append({
+            "role": "assistant",
+            "content": response,
+            "model_name": answered_by(selected_model_friendly, stats),
+            "ttft": stats.get("ttft", stats.get("total_time")),
+            "gen_time": stats.get("total_time"),
+            "timings": stats.get("spans"),
+            "prompt_tokens": stats.get("prompt_tokens")
+        })
+        st.rerun()
     else:
-        st.error("Please upload and process documents first.")
\ No newline at end of file
+        st.error("Please upload and process documents first.")
@@ -0,0 +1,131 @@
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from src.config import ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL_S, ANSWER_CACHE_THRESHOLD
+
+_SPACES = re.compile(r"\s+")
+_IDENTIFIER = re.compile(r"\w*\d\w*")
+
+
+def normalize(query_text):
+    return _SPACES.sub(" ", query_text.lower()).strip().rstrip("?.!").strip()
+
+
+class AnswerCache:
+    """
+    Two-level answer cache, scoped by (db_path, model_name, index version):
+    1. exact match on the normalised query
+    2. semantic match: the cached query whose embedding has the highest cosine
+       similarity to the new one, if it reaches `threshold` and both queries
+       mention the same numbers/identifiers ("code XJ-042" vs "code XJ-142"
+       embed almost identically but must not share an answer)
+    Entries expire after ttl_s; beyond max_entries the least recently used go.
+    """
+
+    def __init__(self, max_entries=ANSWER_CACHE_SIZE, ttl_s=ANSWER_CACHE_TTL_S, threshold=ANSWER_CACHE_THRESHOLD):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.threshold = threshold
+        # (scope, normalised query) -> entry, in LRU order
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"lookups": 0, "exact_hits": 0, "semantic_hits": 0, "evictions": 0, "invalidations": 0}
+
+    @staticmethod
+    def index_version(db_path):
+        # The manifest is rewritten whenever a file is committed to the index
+        try:
+            return os.stat(os.path.join(db_path, "manifest.json")).st_mtime_ns
+        except OSError:
+            return 0
+
+    def scope(self, db_path, model_name):
+        return (os.path.abspath(db_path), model_name, self.index_version(db_path))
+
+    def _expired(self, entry, now):
+        return self.ttl_s > 0 and now - entry["created"] > self.ttl_s
+
+    def get_exact(self, scope, query_text):
+        """
+        Returns the cached entry for this exact (normalised) query, or None.
+        Counts as a lookup only on a hit; a miss is counted by get_similar().
+        """
+        key = (scope, normalize(query_text))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self._expired(entry, time.time()):
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            self.counters["lookups"] += 1
+            self.counters["exact_hits"] += 1
+            return entry
+
+    def get_similar(self, scope, query_text, embedding):
+        now = time.time()
+        vector = np.asarray(embedding, dtype=np.float32)
+        vector /= np.linalg.norm(vector) or 1.0
+        identifiers = set(_IDENTIFIER.findall(query_text.lower()))
+        with self._lock:
+            self.counters["lookups"] += 1
+            best_key, best_score = None, self.threshold
+            for key, entry in list(self._entries.items()):
+                if key[0] != scope:
+                    continue
+                if self._expired(entry, now):
+                    del self._entries[key]
+                    continue
+                score = float(entry["vector"] @ vector)
+                if score >= best_score and entry["identifiers"] == identifiers:
+                    best_key, best_score = key, score
+            if best_key is None:
+                return None
+            self._entries.move_to_end(best_key)
+            self.counters["semantic_hits"] += 1
+            return {**self._entries[best_key], "similarity": best_score}
+
+    def put(self, scope, query_text, embedding, answer, **meta):
+        if self.max_entries <= 0:
+            return
+        vector = np.asarray(embedding, dtype=np.float32)
+        vector /= np.linalg.norm(vector) or 1.0
+        with self._lock:
+            key = (scope, normalize(query_text))
+            self._entries[key] = {
+                "answer": answer,
+                "vector": vector,
+                "identifiers": set(_IDENTIFIER.findall(query_text.lower())),
+                "created": time.time(),
+                **meta
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters["evictions"] += 1
+
+    def invalidate(self, db_path):
+        """
+        Drops every entry of db_path (all models and index versions).
+        """
+        path = os.path.abspath(db_path)
+        with self._lock:
+            for key in [k for k in self._entries if k[0][0] == path]:
+                del self._entries[key]
+            self.counters["invalidations"] += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.counters["lookups"]
+            hits = self.counters["exact_hits"] + self.counters["semantic_hits"]
+            return {
+                **self.counters,
+                "entries": len(self._entries),
+                "hit_rate": hits / lookups if lookups else 0.0
+            }
@@ -1,5 +1,8 @@
 import sys
 import os
+import time
+import asyncio
+import numpy as np
 from dotenv import load_dotenv
 
 # --- CLOUD DATABASE FIX ---
@@ -12,120 +15,645 @@ except ImportError:
 
 from llama_index.core import (
     VectorStoreIndex, 
-    SimpleDirectoryReader, 
-    StorageContext, 
-    Settings,
     PromptTemplate
 )
 from llama_index.core.node_parser import SentenceSplitter
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
 from llama_index.vector_stores.chroma import ChromaVectorStore
 from llama_index.llms.groq import Groq
 from llama_index.core.retrievers import VectorIndexRetriever
-from llama_index.core.query_engine import RetrieverQueryEngine
-from llama_index.readers.file import PyMuPDFReader
+from llama_index.core.schema import MetadataMode, NodeWithScore, QueryBundle
 import chromadb
 
+from src.answer_cache import AnswerCache
+from src.bm25 import BM25Index
+from src.chunk_store import ChunkStore
+from src.context import ContextPacker, count_tokens
+from src.config import (
+    INGEST_WORKERS,
+    EMBED_BATCH_SIZE,
+    CHUNK_SIZE,
+    CHUNK_OVERLAP,
+    EMBED_MODEL_NAME,
+    EMBED_BACKEND,
+    CHUNK_STORE_PATH,
+    VECTOR_STORE,
+    GROQ_API_BASE,
+    RETRIEVAL_MODE,
+    TOP_K,
+    CANDIDATE_K,
+    DENSE_WEIGHT,
+    SPARSE_WEIGHT,
+    RRF_K,
+    RERANK,
+    RERANK_CANDIDATES,
+    CONTEXT_TOKEN_BUDGET,
+    ANSWER_CACHE_SIZE,
+    BATCH_CONCURRENCY,
+    BATCH_RPM
+)
+from src.embedding_service import get_service_embed_model, embed_queries
+from src.flat_store import FlatVectorStore
+from src.handles import HandleCache
+from src.ingestion import IngestionPipeline
+from src.manifest import IngestionManifest, list_files
+from src.rerank import Reranker
+from src.ratelimit import TokenBucket, call_with_backoff
+from src.retrieval import HybridRetriever, reciprocal_rank_fusion
+from src.routing import ModelRouter, AUTO_MODEL
+from src.tracing import Tracer
+
 load_dotenv()
 
+# System Prompt for Response Control
+# This forces the model to analyze query intent for length
+SYSTEM_PROMPT = (
+    "You are an expert assistant. Use the provided context to answer the user's question.\n"
+    "RESPONSE RULES:\n"
+    "1. If the query is simple, provide a concise 2-line response.\n"
+    "2. If the query asks for details or complex analysis, provide a comprehensive answer.\n"
+    "3. If you don't know the answer based on context, say you don't know. Don't hallucinate."
+)
+
+# Custom QA Prompt Template
+QA_PROMPT_TMPL = PromptTemplate(
+    "Context information is below.\n"
+    "---------------------\n"
+    "{context_str}\n"
+    "---------------------\n"
+    "Given the context information and not prior knowledge, "
+    "answer the query.\n"
+    "Query: {query_str}\n"
+    "Answer: "
+)
+
 class AdvancedRAG:
-    def __init__(self):
+    """
+    One engine serves every session and thread: the embedder, parser and LLMs
+    are passed explicitly to the components that use them and llama-index's
+    global Settings are never touched, so concurrent queries with different
+    models cannot see each other's state.
+    """
+
+    def __init__(self, max_clients=4, max_pipelines=16, llm_factory=None,
+                 ingest_workers=INGEST_WORKERS, embed_batch_size=EMBED_BATCH_SIZE,
+                 retrieval_mode=RETRIEVAL_MODE, top_k=TOP_K, tracer=None,
+                 chunk_store_path=CHUNK_STORE_PATH, vector_store=VECTOR_STORE, rerank=RERANK,
+                 chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, embed_model=None):
         # 1. Improved Embedding Model
-        self.embed_model = HuggingFaceEmbedding(
-            model_name="sentence-transformers/all-MiniLM-L6-v2"
-        )
-        Settings.embed_model = self.embed_model
+        # Backend (torch / onnx / onnx-int8) comes from RAG_EMBED_BACKEND;
+        # RAG_EMBED_SERVICE routes it through the shared micro-batching service.
+        # embed_model lets several engines share one loaded model (e.g. the parameter sweep)
+        self.embed_model = embed_model or get_service_embed_model()
         
         # 2. Refined Chunking Logic
-        # Smaller chunks (512) help the model find more specific information
-        self.node_parser = SentenceSplitter(chunk_size=512, chunk_overlap=50)
-        Settings.node_parser = self.node_parser
+        # Smaller chunks (512 by default) help the model find more specific information;
+        # RAG_CHUNK_SIZE / RAG_CHUNK_OVERLAP or the tuned config from src/benchmark/sweep.py override it
+        self.node_parser = SentenceSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+        # Parsed chunks and embeddings shared across sessions, keyed by content hash
+        self.chunk_store = ChunkStore(chunk_store_path) if chunk_store_path else None
+
+        # Parallel parse, batched embed/upsert
+        self.ingestion = IngestionPipeline(
+            self.embed_model, self.node_parser,
+            workers=ingest_workers, batch_size=embed_batch_size,
+            chunk_store=self.chunk_store, embed_key=f"{EMBED_MODEL_NAME}@{EMBED_BACKEND}"
+        )
 
-    def process_documents(self, file_dir, db_path):
+        # 3. Hybrid Retrieval
+        # BM25 catches exact identifiers and rare terms that MiniLM embeddings miss
+        self.retrieval_mode = retrieval_mode
+        self.top_k = top_k
+        # Optional cross-encoder over RERANK_CANDIDATES over-fetched chunks, under a latency budget
+        self.reranker = Reranker() if rerank else None
+
+        # 4. Context Packing
+        # Low-similarity and near-duplicate chunks are dropped and the rest fit to a token budget
+        self.packer = ContextPacker() if CONTEXT_TOKEN_BUDGET > 0 else None
+
+        # Session vector store: "chroma" or "flat" (memory-mapped, brute-force)
+        if vector_store not in ("chroma", "flat"):
+            raise ValueError(f"Unknown vector store: {vector_store}")
+        self.vector_store = vector_store
+
+        # Open vector stores and query pipelines, reused across queries; an evicted
+        # store is closed once no running ingest or query holds a lease on its DB
+        self.handles = HandleCache(
+            max_clients=max_clients, max_pipelines=max_pipelines,
+            close=lambda handle: handle["client"].close()
+        )
+
+        # Per-stage spans for ingestion and queries (sink from RAG_TRACE_SINK)
+        self.tracer = tracer or Tracer()
+
+        # Builds the LLM for a model name; tests swap in src.fake_llm.fake_llm_factory()
+        self.llm_factory = llm_factory or self._groq_llm
+
+        # 5. Model Routing
+        # model_name="auto" picks a route by question complexity and falls back along it
+        self.router = ModelRouter(self.llm_factory)
+
+        # 6. Answer Cache
+        # Repeated (or near-identical) questions against an unchanged index skip retrieval and the LLM
+        self.answer_cache = AnswerCache() if ANSWER_CACHE_SIZE > 0 else None
+
+    @staticmethod
+    def _groq_llm(model_name, timeout=None):
+        # Routed calls fail fast (no client retries, SLO as timeout) so the router can fall back
+        limits = {"max_retries": 0, "timeout": timeout} if timeout else {}
+        return Groq(
+            model=model_name,
+            api_key=os.getenv("GROQ_API_KEY"),
+            api_base=GROQ_API_BASE,
+            temperature=0.1, # Low temperature for high precision
+            system_prompt=SYSTEM_PROMPT,
+            **limits
+        )
+
+    def process_documents(self, file_dir, db_path, progress=None, cancelled=None):
+        """
+        Indexes file_dir into db_path. progress and cancelled are passed to
+        IngestionPipeline.run (used by src.jobs for background jobs).
+        """
+        trace = self.tracer.start("ingest", db_path=db_path)
+        self.handles.acquire(db_path)
         try:
-            # Using PyMuPDFReader for better table and structure extraction
-            file_extractor = {".pdf": PyMuPDFReader()}
-            reader = SimpleDirectoryReader(
-                input_dir=file_dir,
-                recursive=True,
-                file_extractor=file_extractor
-            )
-            documents = reader.load_data()
+            manifest = IngestionManifest.load(db_path)
+            files = list_files(file_dir)
 
-            if not documents:
+            if not files and not manifest.files:
                 return "No documents found."
-            
+
             # Database Connection
-            chroma_client = chromadb.PersistentClient(path=db_path)
-            chroma_collection = chroma_client.get_or_create_collection("user_data")
-            
-            vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
-            storage_context = StorageContext.from_defaults(vector_store=vector_store)
+            store = self._get_store(db_path)
+            if manifest.files and self._stored_count(store) == 0:
+                # Indexed with the other vector store backend: start over
+                manifest = IngestionManifest(db_path)
 
-            VectorStoreIndex.from_documents(
-                documents,
-                storage_context=storage_context,
-                show_progress=True
-            )
-            
-            return "Success"
+            try:
+                return self.ingestion.run(
+                    files, manifest, store["vector_store"], store["bm25"], trace,
+                    owner=os.path.abspath(db_path), progress=progress, cancelled=cancelled
+                )
+            finally:
+                # Keep the sparse index in step with whatever reached Chroma
+                with trace.span("bm25_save"):
+                    store["bm25"].save(db_path)
             
         except Exception as e:
+            trace.fail(e)
             return f"Error: {str(e)}"
+        finally:
+            # Cached pipelines and answers for this DB may be stale after a write
+            self.handles.invalidate(db_path)
+            self.handles.release(db_path)
+            if self.answer_cache is not None:
+                self.answer_cache.invalidate(db_path)
+            trace.finish()
 
-    def query(self, query_text, db_path, model_name):
-        try:
-            # 3. System Prompt for Response Control
-            # This forces the model to analyze query intent for length
-            system_prompt = (
-                "You are an expert assistant. Use the provided context to answer the user's question.\n"
-                "RESPONSE RULES:\n"
-                "1. If the query is simple, provide a concise 2-line response.\n"
-                "2. If the query asks for details or complex analysis, provide a comprehensive answer.\n"
-                "3. If you don't know the answer based on context, say you don't know. Don't hallucinate."
-            )
+    def close_session(self, db_path):
+        """
+        Closes the vector store of a session DB so its files can be moved or deleted.
+        """
+        for handle in self.handles.invalidate(db_path, drop_client=True):
+            handle["client"].close()
 
-            llm = Groq(
-                model=model_name,
-                api_key=os.getenv("GROQ_API_KEY"),
-                temperature=0.1, # Low temperature for high precision
-                system_prompt=system_prompt 
-            )
-            Settings.llm = llm
+    def release_session(self, db_path):
+        """
+        Call before deleting a session DB: closes it and drops its references
+        into the shared chunk store, then collects unused entries.
+        """
+        self.close_session(db_path)
+        if self.answer_cache is not None:
+            self.answer_cache.invalidate(db_path)
+        if self.chunk_store is not None:
+            self.chunk_store.release_owner(os.path.abspath(db_path))
+            return self.chunk_store.gc()
 
-            # Connect to DB
-            chroma_client = chromadb.PersistentClient(path=db_path)
-            chroma_collection = chroma_client.get_or_create_collection("user_data")
-            vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
-            
+    def _open_vector_store(self, db_path):
+        # Returns (client, collection, vector_store); the client is what close_session closes
+        if self.vector_store == "flat":
+            flat_store = FlatVectorStore(os.path.join(db_path, "flat"))
+            return flat_store, None, flat_store
+        chroma_client = chromadb.PersistentClient(path=db_path)
+        chroma_collection = chroma_client.get_or_create_collection("user_data")
+        return chroma_client, chroma_collection, ChromaVectorStore(chroma_collection=chroma_collection)
+
+    @staticmethod
+    def _stored_count(store):
+        if store["collection"] is None:
+            return len(store["vector_store"])
+        return store["collection"].count()
+
+    @staticmethod
+    def _stored_embeddings(store, node_ids):
+        if store["collection"] is None:
+            return store["vector_store"].get_embeddings(node_ids)
+        stored = store["collection"].get(ids=node_ids, include=["embeddings"])
+        return dict(zip(stored["ids"], stored["embeddings"]))
+
+    @staticmethod
+    def _stored_matrix(store):
+        # (node ids, unit-normalised float32 matrix) of every stored vector, for batched search
+        if store["collection"] is None:
+            return store["vector_store"].matrix()
+        stored = store["collection"].get(include=["embeddings"])
+        matrix = np.asarray(stored["embeddings"], dtype=np.float32).reshape(len(stored["ids"]), -1)
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        return stored["ids"], matrix
+
+    def _get_store(self, db_path):
+        def connect():
+            client, collection, vector_store = self._open_vector_store(db_path)
+            # Explicit transformations, or llama-index fills in the global Settings defaults
             index = VectorStoreIndex.from_vector_store(
                 vector_store,
-                embed_model=self.embed_model
+                embed_model=self.embed_model,
+                transformations=[self.node_parser]
             )
 
-            # 4. Custom QA Prompt Template
-            qa_prompt_tmpl_str = (
-                "Context information is below.\n"
-                "---------------------\n"
-                "{context_str}\n"
-                "---------------------\n"
-                "Given the context information and not prior knowledge, "
-                "answer the query.\n"
-                "Query: {query_str}\n"
-                "Answer: "
+            # Rebuild the BM25 index if it is missing or out of step with the manifest
+            bm25 = BM25Index.load(db_path)
+            expected = sum(len(f["chunks"]) for f in IngestionManifest.load(db_path).files.values())
+            if bm25 is None or len(bm25) != expected:
+                if collection is None:
+                    bm25 = BM25Index.from_documents(vector_store.documents())
+                else:
+                    bm25 = BM25Index.from_collection(collection)
+
+            return {
+                "client": client,
+                "collection": collection,
+                "vector_store": vector_store,
+                "index": index,
+                "bm25": bm25
+            }
+        return self.handles.get_client(db_path, connect)
+
+    def _build_retriever(self, db_path, mode=None, top_k=None, rerank=None):
+        store = self._get_store(db_path)
+        mode = mode or self.retrieval_mode
+        top_k = top_k or self.top_k
+        if rerank is None:
+            rerank = self.reranker is not None
+        if rerank:
+            # The reranker picks the final top_k from a larger candidate set
+            top_k = max(top_k, RERANK_CANDIDATES)
+
+        if mode == "dense":
+            return VectorIndexRetriever(index=store["index"], similarity_top_k=top_k)
+
+        # Over-fetch dense candidates, then fuse them with BM25 hits
+        dense_retriever = VectorIndexRetriever(index=store["index"], similarity_top_k=max(top_k, CANDIDATE_K))
+        return HybridRetriever(
+            dense_retriever, store["bm25"], store["vector_store"],
+            top_k=top_k,
+            candidate_k=max(top_k, CANDIDATE_K),
+            dense_weight=DENSE_WEIGHT,
+            sparse_weight=SPARSE_WEIGHT,
+            rrf_k=RRF_K
+        )
+
+    def retrieve(self, query_text, db_path, mode=None, top_k=None, rerank=None, stats=None):
+        """
+        Returns the NodeWithScore list the query engine would see, without calling an LLM.
+        rerank defaults to whether the engine has a reranker; its info goes to stats["rerank_info"].
+        """
+        rerank = self.reranker is not None if rerank is None else rerank
+        self.handles.acquire(db_path)
+        try:
+            nodes = self._build_retriever(db_path, mode, top_k, rerank).retrieve(query_text)
+        finally:
+            self.handles.release(db_path)
+        if rerank:
+            nodes, info = self.reranker.rerank(query_text, nodes, top_k or self.top_k)
+            if stats is not None:
+                stats["rerank_info"] = info
+        return nodes
+
+    def retrieve_batch(self, query_texts, db_path, mode=None, block_size=256):
+        """
+        Retrieval for many questions at once: one batched embedding pass, then
+        one matrix product per block_size questions against every stored vector
+        of the DB; hybrid mode fuses each dense ranking with BM25 as
+        HybridRetriever does. Returns (query bundles, candidate NodeWithScore
+        lists, node_id -> stored vector). Like the query pipeline, candidates
+        are over-fetched when there is a reranker; _context_from_nodes picks
+        the final top_k.
+        """
+        self.handles.acquire(db_path)
+        try:
+            return self._retrieve_batch(query_texts, db_path, mode, block_size)
+        finally:
+            self.handles.release(db_path)
+
+    def _retrieve_batch(self, query_texts, db_path, mode, block_size):
+        store = self._get_store(db_path)
+        mode = mode or self.retrieval_mode
+        top_k = max(self.top_k, RERANK_CANDIDATES) if self.reranker is not None else self.top_k
+        dense_k = top_k if mode == "dense" else max(top_k, CANDIDATE_K)
+
+        embeddings = np.asarray(embed_queries(self.embed_model, list(query_texts)), dtype=np.float32)
+        bundles = [QueryBundle(text, embedding=vector.tolist()) for text, vector in zip(query_texts, embeddings)]
+        ids, matrix = self._stored_matrix(store)
+        if not bundles or not ids:
+            return bundles, [[] for _ in bundles], {}
+
+        queries = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        k = min(dense_k, len(ids))
+        rankings = []
+        for begin in range(0, len(queries), block_size):
+            scores = queries[begin:begin + block_size] @ matrix.T
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            for row, candidates in zip(scores, top):
+                rankings.append([(ids[i], float(row[i])) for i in candidates[np.argsort(-row[candidates])]])
+
+        if mode == "dense":
+            rankings = [ranking[:top_k] for ranking in rankings]
+        else:
+            rankings = [
+                reciprocal_rank_fusion(
+                    [[doc_id for doc_id, _ in ranking], [doc_id for doc_id, _ in store["bm25"].search(bundle.query_str, dense_k)]],
+                    [DENSE_WEIGHT, SPARSE_WEIGHT],
+                    k=RRF_K
+                )[:top_k]
+                for bundle, ranking in zip(bundles, rankings)
+            ]
+
+        # Every chunk any question needs, read once
+        wanted = list({doc_id for ranking in rankings for doc_id, _ in ranking})
+        nodes = {node.node_id: node for node in store["vector_store"].get_nodes(node_ids=wanted)}
+        positions = {doc_id: i for i, doc_id in enumerate(ids)}
+        vectors = {doc_id: matrix[positions[doc_id]] for doc_id in wanted if doc_id in positions}
+        results = [
+            [NodeWithScore(node=nodes[doc_id], score=score) for doc_id, score in ranking if doc_id in nodes]
+            for ranking in rankings
+        ]
+        return bundles, results, vectors
+
+    def query_batch(self, query_texts, db_path, model_name, on_answer, concurrency=BATCH_CONCURRENCY, rpm=BATCH_RPM):
+        """
+        Answers many questions against one DB: retrieval goes through
+        retrieve_batch(), LLM calls run `concurrency` at a time under an
+        `rpm` token bucket (backing off on 429s). on_answer(i, answer, stats)
+        is called as each answer arrives, in completion order; stats carries
+        "sources" (the retrieved chunk ids) and the usual query stats, plus
+        "error" (the message) when the question failed.
+        """
+        trace = self.tracer.start("batch", model=model_name, questions=len(query_texts))
+        try:
+            with trace.span("batch_retrieval") as span:
+                bundles, candidates, vectors = self.retrieve_batch(query_texts, db_path)
+                span["chunks"] = len(vectors)
+        except Exception as e:
+            trace.fail(e)
+            trace.finish()
+            for i in range(len(query_texts)):
+                on_answer(i, f"Error during query: {str(e)}", {"error": str(e)})
+            return
+        trace.finish()
+
+        llm = self.llm_factory(model_name) if model_name != AUTO_MODEL else None
+
+        async def answer(i, bundle, nodes, bucket, semaphore):
+            stats = {}
+            start_time = time.perf_counter()
+            trace = self.tracer.start("query", model=model_name, batch=True)
+            try:
+                async with semaphore:
+                    context_str = await asyncio.to_thread(
+                        self._context_from_nodes, bundle, nodes, db_path, trace, stats, vectors
+                    )
+                    if not context_str:
+                        result = "Empty Response"
+                    else:
+                        result = await call_with_backoff(
+                            lambda: asyncio.to_thread(
+                                self._complete, bundle.query_str, context_str, model_name, llm, trace, stats
+                            ),
+                            bucket, label=f"question {i + 1}"
+                        )
+            except Exception as e:
+                trace.fail(e)
+                stats["error"] = str(e)
+                result = f"Error during query: {str(e)}"
+            finally:
+                stats["total_time"] = time.perf_counter() - start_time
+                stats["spans"] = trace.finish()
+            on_answer(i, result, stats)
+
+        async def run():
+            bucket = TokenBucket.per_minute(rpm, burst=concurrency)
+            semaphore = asyncio.Semaphore(concurrency)
+            await asyncio.gather(*(
+                answer(i, bundle, nodes, bucket, semaphore) for i, (bundle, nodes) in enumerate(zip(bundles, candidates))
+            ))
+
+        asyncio.run(run())
+
+    def _build_pipeline(self, db_path, model_name):
+        return {
+            # Auto mode takes its LLMs from the router
+            "llm": self.llm_factory(model_name) if model_name != AUTO_MODEL else None,
+            "retriever": self._build_retriever(db_path)
+        }
+
+    def _get_pipeline(self, db_path, model_name):
+        return self.handles.get_pipeline(
+            db_path, model_name,
+            lambda: self._build_pipeline(db_path, model_name)
+        )
+
+    def _embed_query(self, query_text, trace):
+        # Embedded once: the answer cache, the dense retriever and the packer all use it
+        with trace.span("query_embedding"):
+            return QueryBundle(query_text, embedding=self.embed_model.get_query_embedding(query_text))
+
+    def _build_context(self, retriever, query_bundle, db_path, trace, stats):
+        with trace.span("retrieval") as span:
+            nodes = retriever.retrieve(query_bundle)
+            span["chunks"] = len(nodes)
+        return self._context_from_nodes(query_bundle, nodes, db_path, trace, stats)
+
+    def _context_from_nodes(self, query_bundle, nodes, db_path, trace, stats, vectors=None):
+        # vectors: node_id -> stored embedding, when the caller already has them (batch mode)
+        query_text = query_bundle.query_str
+        keep_top = None
+        if self.reranker is not None:
+            with trace.span("rerank") as span:
+                nodes, info = self.reranker.rerank(query_text, nodes, self.top_k)
+                span.update(info)
+                stats["rerank_info"] = info
+            # Chunks the cross-encoder ranked are not second-guessed by bi-encoder similarity
+            keep_top = info["scored"] or None
+        stats["sources"] = [n.node.node_id for n in nodes]
+
+        with trace.span("context_pack") as span:
+            if self.packer is not None and nodes:
+                if vectors is None:
+                    vectors = self._stored_embeddings(self._get_store(db_path), [n.node.node_id for n in nodes])
+                pieces, info = self.packer.pack(query_text, query_bundle.embedding, nodes, vectors, keep_top=keep_top)
+                span.update(info)
+                stats["context_info"] = info
+            else:
+                pieces = [n.node.get_content(metadata_mode=MetadataMode.LLM) for n in nodes]
+
+        with trace.span("prompt_build") as span:
+            context_str = "\n\n".join(pieces)
+            span["context_chars"] = len(context_str)
+            if context_str:
+                # What the LLM is billed for: system prompt plus the filled QA template
+                stats["prompt_tokens"] = count_tokens(SYSTEM_PROMPT) + count_tokens(
+                    QA_PROMPT_TMPL.format(context_str=context_str, query_str=query_text)
+                )
+                span["prompt_tokens"] = stats["prompt_tokens"]
+
+        return context_str
+
+    def build_context(self, query_text, db_path, stats=None):
+        """
+        Returns the context string a query would send to the LLM, without calling it.
+        """
+        stats = stats if stats is not None else {}
+        trace = self.tracer.start("context")
+        self.handles.acquire(db_path)
+        try:
+            return self._build_context(
+                self._build_retriever(db_path), self._embed_query(query_text, trace), db_path, trace, stats
             )
-            qa_prompt_tmpl = PromptTemplate(qa_prompt_tmpl_str)
+        finally:
+            self.handles.release(db_path)
+            stats["spans"] = trace.finish()
+
+    def _lookup_cache(self, query_text, db_path, model_name, trace, stats):
+        """
+        Returns (cached entry or None, query bundle or None, cache scope or None).
+        On a miss the bundle carries the embedding for retrieval.
+        """
+        if self.answer_cache is None:
+            return None, self._embed_query(query_text, trace), None
+        scope = self.answer_cache.scope(db_path, model_name)
+        with trace.span("cache_exact") as span:
+            entry = self.answer_cache.get_exact(scope, query_text)
+            span["hit"] = entry is not None
+        query_bundle = None
+        if entry is None:
+            query_bundle = self._embed_query(query_text, trace)
+            with trace.span("cache_semantic") as span:
+                entry = self.answer_cache.get_similar(scope, query_text, query_bundle.embedding)
+                span["hit"] = entry is not None
+
+        stats["cache"] = "miss" if entry is None else ("semantic" if "similarity" in entry else "exact")
+        if entry is not None and entry.get("model"):
+            stats["model"] = entry["model"]
+        return entry, query_bundle, scope
+
+    def _remember(self, scope, query_bundle, answer, stats):
+        if scope is not None:
+            self.answer_cache.put(scope, query_bundle.query_str, query_bundle.embedding, answer, model=stats.get("model"))
+
+    def _prepare(self, query_bundle, db_path, model_name, trace, stats):
+        pipeline = self._get_pipeline(db_path, model_name)
+        context_str = self._build_context(pipeline["retriever"], query_bundle, db_path, trace, stats)
+        return pipeline["llm"], context_str
 
-            # Retrieve top 5 most relevant chunks
-            retriever = VectorIndexRetriever(index=index, similarity_top_k=5)
+    def _route(self, query_text, trace, stats):
+        with trace.span("routing") as span:
+            decision = self.router.classify(query_text, stats.get("context_info"))
+            span.update(route=decision["route"], complexity=decision["score"])
+        stats["route"], stats["complexity"] = decision["route"], decision["score"]
+        return decision
 
-            query_engine = RetrieverQueryEngine.from_args(
-                retriever=retriever,
-                text_qa_template=qa_prompt_tmpl
+    def _complete(self, query_text, context_str, model_name, llm, trace, stats):
+        if model_name == AUTO_MODEL:
+            answer, stats["model"], stats["fallbacks"] = self.router.complete(
+                self._route(query_text, trace, stats),
+                lambda llm: llm.predict(QA_PROMPT_TMPL, context_str=context_str, query_str=query_text),
+                trace
             )
+            return answer
+        with trace.span("llm_completion"):
+            return llm.predict(QA_PROMPT_TMPL, context_str=context_str, query_str=query_text)
+
+    def query(self, query_text, db_path, model_name, stats=None):
+        stats = stats if stats is not None else {}
+        trace = self.tracer.start("query", model=model_name)
+        self.handles.acquire(db_path)
+        try:
+            cached, query_bundle, scope = self._lookup_cache(query_text, db_path, model_name, trace, stats)
+            if cached is not None:
+                return cached["answer"]
+
+            llm, context_str = self._prepare(query_bundle, db_path, model_name, trace, stats)
+            if not context_str:
+                return "Empty Response"
+            answer = self._complete(query_text, context_str, model_name, llm, trace, stats)
+            self._remember(scope, query_bundle, answer, stats)
+            return answer
+
+        except Exception as e:
+            trace.fail(e)
+            return f"Error during query: {str(e)}"
+        finally:
+            self.handles.release(db_path)
+            stats["spans"] = trace.finish()
+
+    def query_stream(self, query_text, db_path, model_name, stats=None):
+        """
+        Yields the answer token by token. If a stats dict is passed, it receives
+        "ttft" (seconds to first token), "total_time" (seconds until the last token),
+        "prompt_tokens" and "spans" (per-stage timings). With model_name="auto" also
+        "route", "model" (the model that answered) and "fallbacks". "cache" tells
+        whether the answer came from the answer cache ("exact", "semantic" or "miss").
+        """
+        stats = stats if stats is not None else {}
+        start_time = time.perf_counter()
+        trace = self.tracer.start("query", model=model_name, streaming=True)
+        self.handles.acquire(db_path)
+        try:
+            cached, query_bundle, scope = self._lookup_cache(query_text, db_path, model_name, trace, stats)
+            if cached is not None:
+                stats["ttft"] = time.perf_counter() - start_time
+                yield cached["answer"]
+                return
+
+            llm, context_str = self._prepare(query_bundle, db_path, model_name, trace, stats)
+            if not context_str:
+                yield "Empty Response"
+                return
+            parts = []
+
+            if model_name == AUTO_MODEL:
+                def chosen(name, fallbacks):
+                    stats["model"], stats["fallbacks"] = name, fallbacks
+
+                tokens = self.router.stream(
+                    self._route(query_text, trace, stats),
+                    lambda llm: llm.stream(QA_PROMPT_TMPL, context_str=context_str, query_str=query_text),
+                    trace, on_model=chosen
+                )
+                with trace.span("llm_completion"):
+                    for token in tokens:
+                        stats.setdefault("ttft", time.perf_counter() - start_time)
+                        parts.append(token)
+                        yield token
+                self._remember(scope, query_bundle, "".join(parts), stats)
+                return
 
-            response = query_engine.query(query_text)
-            return str(response)
+            llm_start = time.perf_counter()
+            with trace.span("llm_completion"):
+                for token in llm.stream(QA_PROMPT_TMPL, context_str=context_str, query_str=query_text):
+                    if "ttft" not in stats:
+                        stats["ttft"] = time.perf_counter() - start_time
+                        trace.record("llm_first_token", time.perf_counter() - llm_start)
+                    parts.append(token)
+                    yield token
+            self._remember(scope, query_bundle, "".join(parts), stats)
 
         except Exception as e:
-            return f"Error during query: {str(e)}"
\ No newline at end of file
+            trace.fail(e)
+            yield f"Error during query: {str(e)}"
+        finally:
+            self.handles.release(db_path)
+            stats["total_time"] = time.perf_counter() - start_time
+            stats["spans"] = trace.finish()
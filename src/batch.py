@@ -0,0 +1,120 @@
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.config import BATCH_CONCURRENCY, BATCH_RPM, VECTOR_STORE
+from src.journal import ResultsJournal
+
+
+def read_questions(path):
+    """
+    Reads a JSONL file of {"question": ..., "id": ...} objects ("id" is optional and
+    defaults to the line number; answers are resumed by it, so it must be unique).
+    Plain-text lines are taken as the question itself.
+    """
+    items = []
+    seen = set()
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line) if line.startswith("{") else {"question": line}
+            if not item.get("question"):
+                raise ValueError(f"{path}:{line_no}: no question")
+            item_id = str(item.get("id", line_no))
+            if item_id in seen:
+                raise ValueError(f"{path}:{line_no}: duplicate id {item_id}")
+            seen.add(item_id)
+            items.append({**item, "id": item_id})
+    return items
+
+
+def run_batch(rag, items, db_path, model_name, output_path, concurrency=BATCH_CONCURRENCY, rpm=BATCH_RPM):
+    """
+    Answers items (see read_questions) against db_path and appends one JSON line
+    per answer to output_path as it arrives: id, question, model, answer, source
+    chunk ids and latency. Items (by id) already answered in output_path by the
+    same model without an error are skipped, so an interrupted run picks up
+    where it stopped.
+    """
+    journal = ResultsJournal(output_path, key=lambda entry: (entry["model"], entry["id"]))
+    pending = []
+    for item in items:
+        done = journal.get((model_name, item["id"]))
+        if done is None or done.get("error"):
+            pending.append(item)
+    summary = {"questions": len(items), "skipped": len(items) - len(pending), "answered": 0, "failed": 0}
+    if not pending:
+        journal.close()
+        return summary
+
+    start_time = time.perf_counter()
+
+    def on_answer(i, answer, stats):
+        item = pending[i]
+        failed = "error" in stats
+        journal.append({
+            **{key: value for key, value in item.items() if key not in ("answer", "error")},
+            # The requested model keys the resume; "answered_by" differs from it in auto mode
+            "model": model_name,
+            "answered_by": stats.get("model", model_name),
+            "answer": None if failed else answer,
+            "error": stats["error"] if failed else None,
+            "sources": stats.get("sources", []),
+            "latency_s": stats.get("total_time")
+        })
+        summary["failed" if failed else "answered"] += 1
+        done = summary["answered"] + summary["failed"]
+        if done % 10 == 0 or done == len(pending):
+            print(f"  {done}/{len(pending)} answered ({summary['failed']} failed)", flush=True)
+
+    try:
+        rag.query_batch([item["question"] for item in pending], db_path, model_name, on_answer,
+                        concurrency=concurrency, rpm=rpm)
+    finally:
+        journal.close()
+    summary["seconds"] = time.perf_counter() - start_time
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Answers a JSONL file of questions against one session DB and writes the answers as JSONL."
+    )
+    parser.add_argument("--db", required=True, help="Session DB directory, e.g. temp_data/<session id>/db")
+    parser.add_argument("--input", required=True, help="JSONL with one {\"question\": ..., \"id\": ...} per line")
+    parser.add_argument("--output", required=True, help="Answers JSONL; re-running resumes it")
+    parser.add_argument("--model", default="llama-3.3-70b-versatile", help="Groq model id, or \"auto\" for routing")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument("--rpm", type=int, default=BATCH_RPM)
+    parser.add_argument("--vector-store", default=VECTOR_STORE, help="Store the DB was indexed with")
+    parser.add_argument("--fake-llm", action="store_true", help="Answer with the local fake LLM (no API key needed)")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.db):
+        print(f"Error: no session DB at {args.db}", flush=True)
+        sys.exit(1)
+
+    from src.backend import AdvancedRAG
+
+    llm_factory = None
+    if args.fake_llm:
+        from src.fake_llm import fake_llm_factory
+
+        llm_factory = fake_llm_factory(0.05, 0.001)
+
+    items = read_questions(args.input)
+    print(f"Loading engine for {len(items)} questions...", flush=True)
+    rag = AdvancedRAG(llm_factory=llm_factory, vector_store=args.vector_store)
+    summary = run_batch(rag, items, args.db, args.model, args.output, args.concurrency, args.rpm)
+    elapsed = f" in {summary['seconds']:.1f}s" if "seconds" in summary else ""
+    print(f"{summary['answered']} answered, {summary['failed']} failed, {summary['skipped']} already done{elapsed}", flush=True)
+    sys.exit(1 if summary["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
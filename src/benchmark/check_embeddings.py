@@ -0,0 +1,47 @@
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from src.embeddings import BACKENDS, PARITY_TEXTS, get_embed_model, parity_check
+
+
+def throughput(embed_model, texts, rounds=5):
+    embed_model.get_text_embedding_batch(texts)  # warm-up
+    start_time = time.perf_counter()
+    for _ in range(rounds):
+        embed_model.get_text_embedding_batch(texts)
+    return rounds * len(texts) / (time.perf_counter() - start_time)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check an embedding backend against the PyTorch reference.")
+    parser.add_argument("--backend", choices=BACKENDS, default="onnx-int8")
+    parser.add_argument("--tolerance", type=float, default=0.02)
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    print("Loading reference (torch) backend...", flush=True)
+    reference = get_embed_model("torch", batch_size=args.batch_size, threads=args.threads)
+    print(f"Loading candidate ({args.backend}) backend...", flush=True)
+    candidate = get_embed_model(args.backend, batch_size=args.batch_size, threads=args.threads)
+
+    report = parity_check(candidate, reference, tolerance=args.tolerance)
+    print(f"Max pairwise cosine difference: {report['max_similarity_diff']:.4f} (tolerance {args.tolerance})")
+    print(f"Min cosine between backends:    {report['min_self_cosine']:.4f}")
+
+    texts = PARITY_TEXTS * 16
+    print(f"torch throughput:       {throughput(reference, texts):.1f} texts/s")
+    print(f"{args.backend} throughput: {throughput(candidate, texts):.1f} texts/s")
+
+    if not report["passed"]:
+        print("Parity check FAILED.")
+        sys.exit(1)
+    print("Parity check passed.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from src.config import EMBED_BATCH_SIZE
+from src.embeddings import get_embed_model, PARITY_TEXTS
+from src.embedding_service import BatchedEmbedding, LocalEmbeddingService, UnixSocketClient
+from src.benchmark.metrics import percentile
+
+
+def run_sessions(embed_model, sessions, requests, chunks_per_request):
+    """
+    Each thread plays one chat session issuing `requests` embedding calls back to back.
+    """
+    latencies = []
+    lock = threading.Lock()
+
+    def session(seed):
+        rng = random.Random(seed)
+        own = []
+        for _ in range(requests):
+            start_time = time.perf_counter()
+            if chunks_per_request > 1:
+                embed_model.get_text_embedding_batch([rng.choice(PARITY_TEXTS) for _ in range(chunks_per_request)])
+            else:
+                embed_model.get_query_embedding(f"{rng.choice(PARITY_TEXTS)} {rng.random()}")
+            own.append(time.perf_counter() - start_time)
+        with lock:
+            latencies.extend(own)
+
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(sessions)]
+    start_time = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start_time
+
+    calls = sessions * requests
+    return {
+        "sessions": sessions,
+        "calls_per_s": calls / elapsed,
+        "texts_per_s": calls * chunks_per_request / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding throughput versus concurrent sessions.")
+    parser.add_argument("--sessions", default="1,2,4,8,16,32", help="Comma-separated session counts")
+    parser.add_argument("--requests", type=int, default=20, help="Embedding calls per session")
+    parser.add_argument("--chunks", type=int, default=1, help="Texts per call (1 = single query embeddings)")
+    parser.add_argument("--modes", default="direct,local", help="Any of direct, local, unix")
+    parser.add_argument("--socket", default="/tmp/rag-embed.sock", help="EmbeddingServer socket for the unix mode")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    session_counts = [int(n) for n in args.sessions.split(",")]
+    modes = args.modes.split(",")
+    base_model = get_embed_model() if {"direct", "local"} & set(modes) else None
+
+    report = {"requests_per_session": args.requests, "chunks_per_request": args.chunks, "results": {}}
+    for mode in modes:
+        if mode == "direct":
+            embed_model = base_model
+        elif mode == "local":
+            embed_model = BatchedEmbedding(LocalEmbeddingService(base_model, EMBED_BATCH_SIZE, args.max_wait_ms))
+        elif mode == "unix":
+            embed_model = BatchedEmbedding(UnixSocketClient(args.socket))
+        else:
+            raise ValueError(f"Unknown mode '{mode}'")
+
+        embed_model.get_query_embedding("warm up")
+        print(f"\n--- {mode} ---")
+        print(f"{'sessions':>8} {'calls/s':>10} {'texts/s':>10} {'p50 ms':>9} {'p95 ms':>9}")
+        rows = []
+        for sessions in session_counts:
+            row = run_sessions(embed_model, sessions, args.requests, args.chunks)
+            rows.append(row)
+            print(f"{sessions:>8} {row['calls_per_s']:>10.1f} {row['texts_per_s']:>10.1f} {row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f}", flush=True)
+        if mode == "local":
+            report["local_batching"] = embed_model.service.stats()
+            print(f"Batching: {report['local_batching']}")
+        report["results"][mode] = rows
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=4)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,102 +1,276 @@
 import os
-import json
+import re
 import sys
-from llama_index.core import SimpleDirectoryReader, Settings
+import json
+import asyncio
+import hashlib
+import argparse
+import numpy as np
+from llama_index.core.node_parser import SentenceSplitter
 from llama_index.llms.groq import Groq
 from dotenv import load_dotenv
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from src.bm25 import tokenize
+from src.context import count_tokens
+from src.ingestion import parse_file
+from src.journal import ResultsJournal
+from src.ratelimit import TokenBucket, call_with_backoff
+
 # Load environment variables (Force reload)
 load_dotenv(override=True)
 
-def generate_questions(pdf_path, output_path, num_questions=20):
-    """
-    Generates Q&A pairs from the provided PDF using Llama 3.3.
-    """
-    print(f"Starting generation process...", flush=True)
-    
-    if not os.path.exists(pdf_path):
-        print(f"Error: PDF file not found at {pdf_path}", flush=True)
-        return
+PDF_PATH = os.path.join("benchmark_data", "Dr.R.Praba-StudyonMLAlgorithms.pdf")
+OUTPUT_PATH = os.path.join("benchmark_data", "test_set.json")
+GROQ_API_BASE = os.getenv("GROQ_API_BASE", "https://api.groq.com/openai/v1")
+MODEL = "llama-3.3-70b-versatile"
+SECTION_TOKENS = 1500
+PER_SECTION = 3
+CONCURRENCY = 4
+RPM = 30
+DEDUPE_THRESHOLD = 0.92
+REQUEST_TIMEOUT = 60.0
 
-    print(f"Loading PDF from {pdf_path}...", flush=True)
-    try:
-        reader = SimpleDirectoryReader(input_files=[pdf_path])
-        documents = reader.load_data()
-        text_content = ""
-        for doc in documents:
-            text_content += doc.text + "\n"
-        print(f"Loaded {len(documents)} documents. Total text length: {len(text_content)}", flush=True)
-    except Exception as e:
-        print(f"Error loading PDF: {e}", flush=True)
-        return
-
-    # Truncate text content to fit within context window if necessary
-    max_chars = 30000 
-    if len(text_content) > max_chars:
-        print(f"Text content too long ({len(text_content)} chars). Truncating to {max_chars} chars.", flush=True)
-        text_content = text_content[:max_chars]
+PROMPT_TMPL = """
+    You are an expert at creating benchmark datasets for RAG systems.
 
-    print("Initializing Groq LLM...", flush=True)
-    try:
-        llm = Groq(model="llama-3.3-70b-versatile", api_key=os.getenv("GROQ_API_KEY"))
-        Settings.llm = llm
-    except Exception as e:
-        print(f"Error initializing LLM: {e}", flush=True)
-        return
+    Given the following section of a research paper, generate {num_questions} diverse verification questions
+    and their corresponding correct answers. Every question must be answerable from this section alone.
 
-    prompt = f"""
-    You are an expert at creating benchmark datasets for RAG systems.
-    
-    Given the following text from a research paper, generate {num_questions} diverse verification questions 
-    and their corresponding correct answers.
-    
     The questions should vary in difficulty:
     - Factual retrieval
     - Summarization
     - Reasoning
-    
+
     Output the result STRICTLY as a JSON array of objects, where each object has:
     - "question": The generated question.
     - "ground_truth": The correct answer based entirely on the text.
     - "type": One of "factual", "summarization", "reasoning".
-    
+    - "evidence": The sentence of the text that supports the answer, copied verbatim.
+
     Do not include any markdown formatting. Just the raw JSON string.
-    
+
     TEXT CONTENT:
     {text_content}
     """
 
-    print("Generating Q&A pairs...", flush=True)
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def split_sections(pages, section_tokens=SECTION_TOKENS):
+    """
+    Groups consecutive pages into sections of up to section_tokens tokens;
+    longer pages are split on their own. pages: [(page_label, text)].
+    """
+    splitter = SentenceSplitter(chunk_size=section_tokens, chunk_overlap=min(100, section_tokens // 10))
+    sections, current, used = [], [], 0
+
+    def close():
+        if current:
+            sections.append({"pages": [label for label, _ in current], "text": "\n".join(text for _, text in current)})
+
+    for label, text in pages:
+        tokens = count_tokens(text)
+        if tokens > section_tokens:
+            close()
+            current, used = [], 0
+            for part in splitter.split_text(text):
+                sections.append({"pages": [label], "text": part})
+            continue
+        if used + tokens > section_tokens:
+            close()
+            current, used = [], 0
+        current.append((label, text))
+        used += tokens
+    close()
+    return sections
+
+
+def parse_items(text):
+    # Tolerates markdown fences and chatter around the JSON array
+    start, end = text.find("["), text.rfind("]")
+    if start < 0 or end < start:
+        raise ValueError("No JSON array in response")
+    items = json.loads(text[start:end + 1])
+    return [item for item in items if isinstance(item, dict) and item.get("question") and item.get("ground_truth")]
+
+
+def locate_source(item, section, pages):
+    """
+    The sentence the answer comes from: the model's evidence if it really is in
+    the section, otherwise the section sentence sharing most terms with the answer.
+    """
+    evidence = " ".join(str(item.get("evidence") or "").split())
+    flat = " ".join(section["text"].split())
+    if len(evidence) < 20 or evidence not in flat:
+        truth = set(tokenize(item["ground_truth"]))
+        evidence = max(_SENTENCE_END.split(flat), key=lambda s: len(truth & set(tokenize(s))))
+    page = next((label for label, text in pages if label in section["pages"] and evidence in " ".join(text.split())), None)
+    return evidence, page or section["pages"][0]
+
+
+def section_key(section, per_section, model):
+    # A section's questions are reused only for the same text, question count and model
+    return hashlib.sha256(f"{model}\0{per_section}\0{section['text']}".encode("utf-8")).hexdigest()
+
+
+async def generate_sections(llm, sections, pending, per_section, concurrency, rpm, on_section):
+    """
+    Generates questions for the section indices in `pending`; on_section(i, items)
+    is called for every section that succeeds. Returns the indices that failed.
+    """
+    bucket = TokenBucket.per_minute(rpm)
+    semaphore = asyncio.Semaphore(concurrency)
+    failed = []
+
+    async def run_section(i):
+        section = sections[i]
+        prompt = PROMPT_TMPL.format(num_questions=per_section, text_content=section["text"])
+        async with semaphore:
+            try:
+                response = await call_with_backoff(lambda: llm.acomplete(prompt), bucket, label=f"section {i + 1}")
+                items = parse_items(response.text)
+            except Exception as e:
+                print(f"  Section {i + 1}/{len(sections)} failed: {e}", flush=True)
+                failed.append(i)
+                return
+        print(f"  Section {i + 1}/{len(sections)} (pages {section['pages'][0]}-{section['pages'][-1]}): "
+              f"{len(items)} questions", flush=True)
+        on_section(i, items)
+
+    await asyncio.gather(*(run_section(i) for i in pending))
+    return failed
+
+
+def deduplicate(items, embed_model, threshold=DEDUPE_THRESHOLD):
+    """
+    Drops questions whose embedding is at least `threshold` cosine-similar to an earlier kept one.
+    """
+    if not items or threshold <= 0:
+        return items
+    vectors = np.asarray(embed_model.get_text_embedding_batch([item["question"] for item in items]), dtype=np.float32)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    kept = []
+    for i in range(len(items)):
+        if not kept or float(np.max(vectors[kept] @ vectors[i])) < threshold:
+            kept.append(i)
+    return [items[i] for i in kept]
+
+
+def select(items, max_questions):
+    # Round-robin over sections so a cap still covers the whole document
+    if not max_questions or len(items) <= max_questions:
+        return items
+    by_section = {}
+    for item in items:
+        by_section.setdefault(item["source"]["section"], []).append(item)
+    queues = list(by_section.values())
+    chosen = []
+    while len(chosen) < max_questions:
+        for queue in queues:
+            if queue and len(chosen) < max_questions:
+                chosen.append(queue.pop(0))
+    return chosen
+
+
+def generate_questions(pdf_path, output_path, per_section=PER_SECTION, max_questions=0, section_tokens=SECTION_TOKENS,
+                       concurrency=CONCURRENCY, rpm=RPM, dedupe_threshold=DEDUPE_THRESHOLD, model=MODEL,
+                       api_base=GROQ_API_BASE):
+    """
+    Map-reduce Q&A generation: the PDF is split into sections, questions are
+    generated per section concurrently under a token bucket, near-duplicates
+    are dropped by embedding similarity and every item records its source.
+    Each section's raw questions are journalled next to the output
+    (<output>.sections.jsonl), so a re-run only generates the sections that
+    are missing or failed.
+    """
+    print(f"Starting generation process...", flush=True)
+
+    if not os.path.exists(pdf_path):
+        print(f"Error: PDF file not found at {pdf_path}", flush=True)
+        return
+
+    print(f"Loading PDF from {pdf_path}...", flush=True)
     try:
-        response = llm.complete(prompt)
-        print("Response received.", flush=True)
+        documents, _ = parse_file(pdf_path)
+        pages = [(str(doc.metadata.get("source", i + 1)), doc.text) for i, doc in enumerate(documents)]
+        sections = split_sections(pages, section_tokens)
+        print(f"Loaded {len(pages)} pages, split into {len(sections)} sections of up to {section_tokens} tokens.", flush=True)
     except Exception as e:
-        print(f"Error generating Q&A: {e}", flush=True)
+        print(f"Error loading PDF: {e}", flush=True)
         return
-    
+
+    # max_retries=0: 429s must reach our own backoff instead of the client's
+    llm = Groq(model=model, api_key=os.getenv("GROQ_API_KEY"), api_base=api_base, max_retries=0, timeout=REQUEST_TIMEOUT)
+
+    journal = ResultsJournal(output_path + ".sections.jsonl", key=lambda entry: entry["key"])
+    keys = [section_key(section, per_section, model) for section in sections]
+    pending = [i for i, key in enumerate(keys) if key not in journal]
+    if len(pending) < len(sections):
+        print(f"Reusing {len(sections) - len(pending)} sections from {journal.path}.", flush=True)
+
+    def on_section(i, section_items):
+        journal.append({"key": keys[i], "section": i, "items": section_items})
+
+    print(f"Generating Q&A pairs for {len(pending)} sections ({concurrency} concurrent, {rpm} requests/min)...", flush=True)
     try:
-        # Clean up response if it contains markdown code blocks
-        response_text = response.text.strip()
-        if response_text.startswith("```json"):
-            response_text = response_text[7:]
-        if response_text.endswith("```"):
-            response_text = response_text[:-3]
-            
-        qa_pairs = json.loads(response_text)
-        
-        # Save to file
-        with open(output_path, "w") as f:
-            json.dump(qa_pairs, f, indent=4)
-            
-        print(f"Successfully generated {len(qa_pairs)} Q&A pairs to {output_path}", flush=True)
-        
-    except json.JSONDecodeError as e:
-        print(f"Failed to decode JSON response: {e}", flush=True)
-        print("Raw response:", response.text, flush=True)
-    except Exception as e:
-        print(f"An error occurred: {e}", flush=True)
+        failed = asyncio.run(generate_sections(llm, sections, pending, per_section, concurrency, rpm, on_section))
+    finally:
+        journal.close()
+
+    items = []
+    for i, section in enumerate(sections):
+        done = journal.get(keys[i])
+        for item in (done["items"] if done else []):
+            chunk, page = locate_source(item, section, pages)
+            items.append({
+                "question": item["question"],
+                "ground_truth": item["ground_truth"],
+                "type": item.get("type", "factual"),
+                "source": {"file": os.path.basename(pdf_path), "page": page, "section": i, "chunk": chunk}
+            })
+
+    if dedupe_threshold > 0:
+        from src.embeddings import get_embed_model
+
+        before = len(items)
+        items = deduplicate(items, get_embed_model(), dedupe_threshold)
+        print(f"Removed {before - len(items)} near-duplicate questions.", flush=True)
+    items = select(items, max_questions)
+
+    with open(output_path, "w") as f:
+        json.dump(items, f, indent=4)
+    covered = len({item["source"]["section"] for item in items})
+    print(f"Successfully generated {len(items)} Q&A pairs covering {covered}/{len(sections)} sections to {output_path}", flush=True)
+    if failed:
+        print(f"{len(failed)} section(s) failed; re-run the same command to generate only those "
+              f"(finished sections are kept in {journal.path}).", flush=True)
+    return items
+
 
 if __name__ == "__main__":
-    pdf_file = os.path.join("benchmark_data", "Dr.R.Praba-StudyonMLAlgorithms.pdf")
-    output_file = os.path.join("benchmark_data", "test_set.json")
-    generate_questions(pdf_file, output_file)
+    parser = argparse.ArgumentParser(description="Generates a benchmark Q&A dataset covering the whole PDF.")
+    parser.add_argument("--pdf", default=PDF_PATH)
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    parser.add_argument("--per-section", type=int, default=PER_SECTION, help="Questions requested per section")
+    parser.add_argument("--max-questions", type=int, default=0, help="Cap, picked round-robin across sections (0 = keep all)")
+    parser.add_argument("--section-tokens", type=int, default=SECTION_TOKENS)
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--rpm", type=int, default=RPM)
+    parser.add_argument("--dedupe-threshold", type=float, default=DEDUPE_THRESHOLD, help="Cosine similarity (0 = no dedupe)")
+    parser.add_argument("--model", default=MODEL)
+    parser.add_argument("--mock", action="store_true", help="Generate against the local mock server (no API key needed)")
+    args = parser.parse_args()
+
+    api_base = GROQ_API_BASE
+    if args.mock:
+        from src.benchmark.mock_server import serve_in_background
+
+        server, api_base = serve_in_background()
+        os.environ.setdefault("GROQ_API_KEY", "mock")
+
+    generate_questions(
+        args.pdf, args.output, per_section=args.per_section, max_questions=args.max_questions,
+        section_tokens=args.section_tokens, concurrency=args.concurrency, rpm=args.rpm,
+        dedupe_threshold=args.dedupe_threshold, model=args.model, api_base=api_base
+    )
@@ -0,0 +1,71 @@
+import math
+
+from src.bm25 import tokenize
+
+
+def normalize(text):
+    # PDF extraction wraps lines differently from the text a dataset was written from
+    return " ".join(text.split()).lower()
+
+
+def source_hit(source, texts):
+    """
+    A retrieval "hit" when the gold source passage itself was retrieved: some
+    retrieved text contains it, ignoring case and whitespace.
+    """
+    source = normalize(source)
+    return bool(source) and any(source in normalize(text) for text in texts)
+
+
+def frequent_terms(bm25, max_df=0.1):
+    """
+    Terms found in more than max_df of the indexed chunks. They say nothing about
+    which chunk was retrieved, so answer_hit ignores them.
+    """
+    n_docs = len(bm25)
+    if not n_docs:
+        return frozenset()
+    return frozenset(term for term, docs in bm25.postings.items() if len(docs) / n_docs > max_df)
+
+
+def answer_hit(ground_truth, texts, threshold=0.5, common=frozenset()):
+    """
+    A retrieval "hit" when at least `threshold` of the ground-truth answer's
+    distinctive terms (no stopwords, nothing in `common`) appear in the retrieved chunks.
+    """
+    truth = set(tokenize(ground_truth)) - common
+    if not truth:
+        return False
+    found = set()
+    for text in texts:
+        found.update(tokenize(text))
+    return len(truth & found) / len(truth) >= threshold
+
+
+def item_hit(item, texts, threshold=0.5, common=frozenset()):
+    # Items that record the passage their answer came from are scored on retrieving it;
+    # only items without one fall back to the answer's distinctive terms
+    source = (item.get("source") or {}).get("chunk")
+    if source:
+        return source_hit(source, texts)
+    return answer_hit(item["ground_truth"], texts, threshold, common)
+
+
+def recall_at_k(dataset, retrieve_texts, threshold=0.5, common=frozenset()):
+    """
+    Fraction of dataset items whose source passage (or distinctive answer terms)
+    is found in retrieve_texts(question).
+    """
+    if not dataset:
+        return 0.0
+    hits = sum(item_hit(item, retrieve_texts(item["question"]), threshold, common) for item in dataset)
+    return hits / len(dataset)
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low, high = math.floor(rank), math.ceil(rank)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
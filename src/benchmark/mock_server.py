@@ -0,0 +1,241 @@
+import re
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class RateLimiter:
+    """
+    Per-model sliding one-minute window, mimicking Groq's requests-per-minute limits.
+    """
+
+    def __init__(self, rpm):
+        self.rpm = rpm
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def check(self, model):
+        # Returns 0 when the call is allowed, otherwise the seconds until it would be
+        if not self.rpm:
+            return 0
+        now = time.monotonic()
+        with self.lock:
+            calls = [t for t in self.calls.get(model, []) if now - t < 60]
+            self.calls[model] = calls
+            if len(calls) >= self.rpm:
+                return 60 - (now - calls[0])
+            calls.append(now)
+            return 0
+
+
+def mock_dataset(prompt):
+    # generate_dataset.py prompts: one question per sentence, spread over the section
+    count = int(re.search(r"generate (\d+)", prompt).group(1))
+    text = prompt.split("TEXT CONTENT:", 1)[-1]
+    sentences = [s for s in re.split(r"(?<=[.!?])\s+", " ".join(text.split())) if len(s.split()) >= 6]
+    step = max(1, len(sentences) // max(1, count))
+    items = []
+    for sentence in sentences[::step][:count]:
+        items.append({
+            "question": f"What does the document say about {' '.join(sentence.split()[:6])}?",
+            "ground_truth": sentence,
+            "type": "factual",
+            "evidence": sentence
+        })
+    return json.dumps(items)
+
+
+def mock_answer(model, prompt):
+    if "impartial judge" in prompt:
+        return json.dumps({"relevance_score": 8, "accuracy_score": 7, "explanation": "Mock evaluation."})
+    if "benchmark datasets for RAG" in prompt:
+        return mock_dataset(prompt)
+    match = re.search(r"-{5,}\n(.*?)\n-{5,}", prompt, re.S)
+    context = match.group(1) if match else prompt
+    return f"[{model}] " + " ".join(context.split()[:30])
+
+
+def parse_model_options(values, parse):
+    # ["MODEL=VALUE", ...] -> {MODEL: parse(VALUE)}
+    options = {}
+    for value in values or []:
+        model, _, option = value.rpartition("=")
+        options[model] = parse(option)
+    return options
+
+
+def parse_failure(value):
+    # "429", "500" or "timeout", optionally followed by ":probability"
+    kind, _, probability = value.partition(":")
+    return kind, float(probability) if probability else 1.0
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    server_version = "MockGroq/1.0"
+
+    def handle(self):
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up (e.g. timed out on an injected hang)
+            pass
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": []})
+        else:
+            self._send_json(404, {"error": {"message": "Not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        model = request.get("model", "mock")
+
+        if self.path.rstrip("/").endswith("/chat/completions"):
+            prompt = "\n".join(str(m.get("content", "")) for m in request.get("messages", []))
+        elif self.path.rstrip("/").endswith("/completions"):
+            prompt = request.get("prompt", "")
+        else:
+            self._send_json(404, {"error": {"message": "Not found"}})
+            return
+
+        wait = self.server.limiter.check(model)
+        if wait:
+            self._send_json(
+                429,
+                {"error": {"message": f"Rate limit reached for model {model}", "type": "rate_limit_exceeded"}},
+                headers={"retry-after": f"{wait:.2f}"}
+            )
+            return
+
+        failure = self.server.failures.get(model)
+        if failure and random.random() < failure[1]:
+            if failure[0] == "timeout":
+                # Hang longer than any sensible client timeout, then answer normally
+                time.sleep(self.server.hang_s)
+            else:
+                status = int(failure[0])
+                self._send_json(status, {"error": {"message": f"Injected {status} for model {model}", "type": "mock_failure"}})
+                return
+
+        time.sleep(self.server.model_latency.get(model, self.server.latency))
+        answer = mock_answer(model, prompt)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        usage = {
+            "prompt_tokens": len(prompt.split()),
+            "completion_tokens": len(answer.split()),
+            "total_tokens": len(prompt.split()) + len(answer.split())
+        }
+
+        if request.get("stream"):
+            self._stream(completion_id, model, answer)
+            return
+
+        self._send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": answer},
+                "finish_reason": "stop"
+            }],
+            "usage": usage
+        })
+
+    def _stream(self, completion_id, model, answer):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        tokens = re.findall(r"\S+\s*", answer)
+        for i, token in enumerate(tokens + [None]):
+            delta = {"content": token} if token is not None else {}
+            if i == 0:
+                delta["role"] = "assistant"
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": None if token is not None else "stop"}]
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            if token is not None:
+                time.sleep(self.server.token_delay)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def make_server(host="127.0.0.1", port=8000, rpm=0, latency=0.0, token_delay=0.0, verbose=False,
+                failures=None, model_latency=None, hang_s=30.0):
+    """
+    failures: model -> (kind, probability) with kind "429", "500" or "timeout";
+    model_latency: model -> seconds, overriding latency for that model.
+    """
+    server = ThreadingHTTPServer((host, port), MockHandler)
+    server.daemon_threads = True
+    server.limiter = RateLimiter(rpm)
+    server.latency = latency
+    server.failures = failures or {}
+    server.model_latency = model_latency or {}
+    server.hang_s = hang_s
+    server.token_delay = token_delay
+    server.verbose = verbose
+    return server
+
+
+def serve_in_background(**kwargs):
+    """
+    Starts a mock server on a free port and returns (server, base_url).
+    """
+    kwargs.setdefault("port", 0)
+    server = make_server(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}/v1"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local OpenAI/Groq-compatible mock server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--rpm", type=int, default=0, help="Requests per minute per model before answering 429 (0 = unlimited)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before answering")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Seconds between streamed tokens")
+    parser.add_argument("--fail", action="append", metavar="MODEL=KIND[:P]",
+                        help="Make MODEL answer 429, 500 or time out (with probability P, default 1); repeatable")
+    parser.add_argument("--model-latency", action="append", metavar="MODEL=SECONDS",
+                        help="Per-model latency overriding --latency; repeatable")
+    parser.add_argument("--hang", type=float, default=30.0, help="Seconds a 'timeout' failure hangs before answering")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    server = make_server(
+        args.host, args.port, args.rpm, args.latency, args.token_delay, args.verbose,
+        failures=parse_model_options(args.fail, parse_failure),
+        model_latency=parse_model_options(args.model_latency, float),
+        hang_s=args.hang
+    )
+    print(f"Mock Groq server on http://{args.host}:{args.port}/v1 (set GROQ_API_BASE to this URL)", flush=True)
+    server.serve_forever()
@@ -0,0 +1,321 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import tempfile
+import argparse
+import resource
+import platform
+import subprocess
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from src.backend import AdvancedRAG
+from src.config import INGEST_WORKERS, EMBED_BATCH_SIZE, EMBED_BACKEND, TOP_K, RERANK_BUDGET_MS
+from src.fake_llm import fake_llm_factory
+from src.tracing import Tracer, summarize_spans
+from src.benchmark.metrics import frequent_terms, item_hit, percentile
+
+PDF_PATH = os.path.join("benchmark_data", "Dr.R.Praba-StudyonMLAlgorithms.pdf")
+DATASET_PATH = os.path.join("benchmark_data", "test_set.json")
+OUTPUT_DIR = os.path.join("benchmark_data", "offline_runs")
+
+TOPICS = [
+    "decision trees", "random forests", "support vector machines", "gradient boosting",
+    "k-means clustering", "logistic regression", "neural networks", "naive bayes",
+    "principal component analysis", "k-nearest neighbours", "linear regression", "dropout"
+]
+FILLER = [
+    "is widely used in practice because it balances accuracy and interpretability",
+    "can overfit when the training data is small or noisy",
+    "benefits from careful feature scaling and cross-validation",
+    "was compared against several baselines on the benchmark datasets",
+    "requires tuning of its hyperparameters to reach good performance",
+    "is sensitive to class imbalance unless the loss is reweighted",
+    "scales to large datasets when trained with mini-batches",
+    "produces results that are easy to explain to domain experts"
+]
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)), text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except Exception:
+        return "unknown"
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    scale = 1024 * 1024 if platform.system() == "Darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+    return {"self": own, "children": children}
+
+
+def build_synthetic_corpus(out_dir, pages, files=4, seed=13):
+    """
+    Writes `pages` PDF pages of filler text, each with one unique fact, and
+    returns the matching question / ground-truth pairs. Every fact shares its
+    wording with the others except for the reference code, so each item records
+    the fact as its source and only retrieving that page's chunk counts as a hit.
+    """
+    import pymupdf
+
+    rng = random.Random(seed)
+    dataset = []
+    per_file = max(1, pages // files)
+    page_no = 0
+    for file_no in range(files):
+        doc = pymupdf.open()
+        name = f"synthetic_{file_no}.pdf"
+        for _ in range(per_file if file_no < files - 1 else pages - page_no):
+            topic = rng.choice(TOPICS)
+            code = f"{rng.choice('ABCDEFGHJKLMNPQRSTUVWXYZ')}{rng.choice('ABCDEFGHJKLMNPQRSTUVWXYZ')}-{rng.randint(1000, 9999)}"
+            fact = f"Experiment {page_no} on {topic} was registered under reference code {code}."
+            sentences = [f"{rng.choice(TOPICS).capitalize()} {rng.choice(FILLER)}." for _ in range(18)]
+            sentences.insert(rng.randint(0, len(sentences)), fact)
+            page = doc.new_page()
+            page.insert_textbox(page.rect + (50, 50, -50, -50), " ".join(sentences), fontsize=10)
+            dataset.append({
+                "question": f"Which reference code was experiment {page_no} on {topic} registered under?",
+                "ground_truth": code,
+                "type": "factual",
+                "source": {"file": name, "page": str(doc.page_count), "chunk": fact}
+            })
+            page_no += 1
+        doc.save(os.path.join(out_dir, name))
+        doc.close()
+    return dataset
+
+
+def count_pages(file_dir):
+    import pymupdf
+
+    pages = 0
+    for name in os.listdir(file_dir):
+        path = os.path.join(file_dir, name)
+        if name.lower().endswith(".pdf"):
+            with pymupdf.open(path) as doc:
+                pages += doc.page_count
+        else:
+            pages += 1
+    return pages
+
+
+def latency_summary(values):
+    return {
+        "p50_ms": percentile(values, 50) * 1000,
+        "p95_ms": percentile(values, 95) * 1000,
+        "p99_ms": percentile(values, 99) * 1000,
+        "mean_ms": sum(values) / len(values) * 1000 if values else 0.0
+    }
+
+
+def run(args):
+    work_dir = tempfile.mkdtemp(prefix="rag_offline_")
+    files_dir = os.path.join(work_dir, "files")
+    db_dir = os.path.join(work_dir, "db")
+    os.makedirs(files_dir)
+
+    try:
+        if args.pdf:
+            shutil.copy(args.pdf, files_dir)
+            with open(args.dataset, "r") as f:
+                dataset = json.load(f)
+            corpus = {"type": "fixture", "source": args.pdf}
+        else:
+            dataset = build_synthetic_corpus(files_dir, args.pages)
+            corpus = {"type": "synthetic", "pages": args.pages}
+        if args.max_questions:
+            dataset = dataset[:args.max_questions]
+
+        print("Loading engine...", flush=True)
+        start_time = time.perf_counter()
+        # Same span format as the app; summarized per stage in the report
+        spans = []
+        tracer = Tracer(sink=args.trace or "")
+        tracer.listeners.append(spans.append)
+        rag = AdvancedRAG(
+            llm_factory=fake_llm_factory(),
+            ingest_workers=args.workers,
+            embed_batch_size=args.batch_size,
+            tracer=tracer,
+            # A private store, so earlier runs cannot serve cached embeddings
+            chunk_store_path=os.path.join(work_dir, "chunk_store.sqlite"),
+            rerank=args.rerank
+        )
+        # Questions are asked more than once; measure the full query path, not cache hits
+        rag.answer_cache = None
+        if rag.reranker is not None:
+            rag.reranker.budget_ms = args.rerank_budget_ms
+            rag.reranker.warm()
+        engine_load_s = time.perf_counter() - start_time
+
+        pages = count_pages(files_dir)
+        print(f"Ingesting {pages} pages...", flush=True)
+        start_time = time.perf_counter()
+        summary = rag.process_documents(files_dir, db_dir)
+        ingest_s = time.perf_counter() - start_time
+        if not isinstance(summary, dict):
+            raise RuntimeError(summary)
+        # Only used for dataset items that do not record their source
+        common = frequent_terms(rag._get_store(db_dir)["bm25"])
+
+        report = {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "config": {
+                "workers": args.workers,
+                "batch_size": args.batch_size,
+                "embed_backend": EMBED_BACKEND,
+                "top_k": args.top_k,
+                "context_tokens": rag.packer.token_budget if rag.packer else 0,
+                "rerank_model": rag.reranker.model_name if rag.reranker else None,
+                "rerank_budget_ms": args.rerank_budget_ms if rag.reranker else None,
+                "repeats": args.repeats
+            },
+            "corpus": {**corpus, "files": len(os.listdir(files_dir)), "pages": pages, "questions": len(dataset)},
+            "engine_load_s": engine_load_s,
+            "ingestion": {
+                "seconds": ingest_s,
+                "chunks": summary["chunks_embedded"] + summary["chunks_reused"],
+                "pages_per_s": pages / ingest_s,
+                "chunks_per_s": (summary["chunks_embedded"] + summary["chunks_reused"]) / ingest_s
+            },
+            "retrieval": {},
+            "query": {}
+        }
+
+        # With --rerank, each mode runs again with the cross-encoder over the over-fetched candidates
+        modes = [("dense", False), ("hybrid", False)]
+        if rag.reranker is not None:
+            modes += [("dense+rerank", True), ("hybrid+rerank", True)]
+        hit_sets = {}
+        for label, rerank in modes:
+            mode = label.split("+")[0]
+            rag.retrieve(dataset[0]["question"], db_dir, mode=mode, top_k=args.top_k, rerank=rerank)  # warm-up
+            latencies, hit, complete = [], set(), 0
+            for i, item in enumerate(dataset):
+                for repeat in range(args.repeats):
+                    stats = {}
+                    start_time = time.perf_counter()
+                    nodes = rag.retrieve(item["question"], db_dir, mode=mode, top_k=args.top_k, rerank=rerank, stats=stats)
+                    latencies.append(time.perf_counter() - start_time)
+                    complete += stats.get("rerank_info", {}).get("complete", False)
+                if item_hit(item, [n.node.get_content() for n in nodes], common=common):
+                    hit.add(i)
+            hit_sets[label] = hit
+            report["retrieval"][label] = {
+                **latency_summary(latencies),
+                f"recall_at_{args.top_k}": len(hit) / len(dataset)
+            }
+            line = (f"Retrieval ({label}): p50 {report['retrieval'][label]['p50_ms']:.1f} ms, "
+                    f"p95 {report['retrieval'][label]['p95_ms']:.1f} ms, recall@{args.top_k} {len(hit) / len(dataset):.3f}")
+            if rerank:
+                # Share of queries whose candidates were all scored within the budget, and the
+                # questions whose source chunk the rerank brought into (or pushed out of) the top k
+                base = hit_sets[mode]
+                report["retrieval"][label].update({
+                    "rerank_complete": complete / len(latencies),
+                    "rerank_gained": len(hit - base),
+                    "rerank_lost": len(base - hit)
+                })
+                line += (f", rerank complete {complete / len(latencies):.0%}, "
+                         f"+{len(hit - base)}/-{len(base - hit)} questions vs {mode}")
+            print(line, flush=True)
+
+        # Full query path with the stub LLM: everything except network time.
+        # Run with and without context packing to track the prompt-token savings.
+        packer = rag.packer
+        for label, label_packer in (("query", packer), ("query_unpacked", None)):
+            rag.packer = label_packer
+            latencies, prompt_tokens, hits = [], [], 0
+            for item in dataset:
+                stats = {}
+                start_time = time.perf_counter()
+                rag.query(item["question"], db_dir, "stub-llm", stats=stats)
+                latencies.append(time.perf_counter() - start_time)
+                prompt_tokens.append(stats.get("prompt_tokens", 0))
+                hits += item_hit(item, [rag.build_context(item["question"], db_dir)], common=common)
+            report[label] = {
+                **latency_summary(latencies),
+                "prompt_tokens_mean": sum(prompt_tokens) / len(prompt_tokens),
+                "prompt_tokens_p95": percentile(prompt_tokens, 95),
+                "context_recall": hits / len(dataset)
+            }
+            print(f"Query ({label}): p50 {report[label]['p50_ms']:.1f} ms, "
+                  f"{report[label]['prompt_tokens_mean']:.0f} prompt tokens, "
+                  f"context recall {hits / len(dataset):.3f}", flush=True)
+        rag.packer = packer
+        report["stages"] = summarize_spans(spans)
+        report["peak_rss_mb"] = peak_rss_mb()
+        return report
+
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+
+    def flatten(data, prefix=""):
+        flat = {}
+        for key, value in data.items():
+            if isinstance(value, dict):
+                flat.update(flatten(value, f"{prefix}{key}."))
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                flat[f"{prefix}{key}"] = value
+        return flat
+
+    old_flat, new_flat = flatten(old), flatten(new)
+    print(f"{'metric':45} {old.get('commit', '?'):>12} {new.get('commit', '?'):>12} {'change':>9}")
+    for key in sorted(set(old_flat) & set(new_flat)):
+        if key.startswith("config."):
+            continue
+        before, after = old_flat[key], new_flat[key]
+        change = f"{(after - before) / before * 100:+.1f}%" if before else "n/a"
+        print(f"{key:45} {before:12.3f} {after:12.3f} {change:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline ingestion and retrieval benchmark (no API key needed).")
+    parser.add_argument("--pdf", help=f"Fixture PDF to index, scored against --dataset (e.g. {PDF_PATH})")
+    parser.add_argument("--dataset", default=DATASET_PATH)
+    parser.add_argument("--pages", type=int, default=200, help="Pages of synthetic corpus when no --pdf is given")
+    parser.add_argument("--max-questions", type=int, default=0)
+    parser.add_argument("--top-k", type=int, default=TOP_K)
+    parser.add_argument("--repeats", type=int, default=5, help="Retrievals per question for the latency percentiles")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS)
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE)
+    parser.add_argument("--rerank", action="store_true",
+                        help="Also measure dense and hybrid retrieval with the cross-encoder rerank (needs sentence-transformers)")
+    parser.add_argument("--rerank-budget-ms", type=float, default=RERANK_BUDGET_MS)
+    parser.add_argument("--output", help="Result file (default: benchmark_data/offline_runs/<commit>-<time>.json)")
+    parser.add_argument("--trace", help="Also write every span as JSON lines to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two result files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    report = run(args)
+    output = args.output or os.path.join(
+        OUTPUT_DIR, f"{report['commit']}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=4)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import argparse
+import statistics
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+
+def make_history(turns):
+    messages = []
+    for i in range(turns):
+        messages.append({"role": "user", "content": f"Question {i}: what does section {i} of the report say about the results?"})
+        messages.append({
+            "role": "assistant",
+            "content": " ".join(f"Answer {i} sentence {j} with some detail about the findings." for j in range(12)),
+            "model_name": "Llama 3.3 70B (Versatile)",
+            "ttft": 0.4,
+            "gen_time": 1.8
+        })
+    return messages
+
+
+def rerun_times(turns, reruns):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=120)
+    at.session_state["session_id"] = f"rerun-benchmark-{turns}"
+    at.session_state["messages"] = make_history(turns)
+    at.session_state["chat_title"] = "Benchmark"
+    at.session_state["db_ready"] = False
+    at.run()  # first run pays for imports and cached resources
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+
+    times = []
+    for _ in range(reruns):
+        start_time = time.perf_counter()
+        at.run()
+        times.append(time.perf_counter() - start_time)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measures Streamlit rerun time of app.py as the chat history grows.")
+    parser.add_argument("--turns", default="0,50,200,500", help="Comma-separated history lengths (question/answer pairs)")
+    parser.add_argument("--reruns", type=int, default=10)
+    parser.add_argument("--max-ratio", type=float, default=1.5,
+                        help="Fail if the median rerun with the longest history is this much slower than with the shortest")
+    args = parser.parse_args()
+
+    # No model warm-up and a throwaway session directory, so only the page itself is timed
+    work_dir = tempfile.mkdtemp(prefix="rag_rerun_")
+    os.environ["RAG_WARMUP"] = "0"
+    os.environ["RAG_SESSION_DIR"] = os.path.join(work_dir, "sessions")
+    os.environ["RAG_CHUNK_STORE"] = os.path.join(work_dir, "chunk_store.sqlite")
+    os.chdir(ROOT)
+    try:
+        medians = {}
+        print(f"{'turns':>6} {'p50_ms':>8} {'max_ms':>8}", flush=True)
+        for turns in [int(t) for t in args.turns.split(",")]:
+            times = rerun_times(turns, args.reruns)
+            medians[turns] = statistics.median(times)
+            print(f"{turns:>6} {medians[turns] * 1000:>8.1f} {max(times) * 1000:>8.1f}", flush=True)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    shortest, longest = min(medians), max(medians)
+    ratio = medians[longest] / medians[shortest]
+    print(f"Rerun time with {longest} turns is {ratio:.2f}x the time with {shortest} turns (limit {args.max_ratio}x)", flush=True)
+    sys.exit(0 if ratio <= args.max_ratio else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import argparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from src.benchmark.mock_server import serve_in_background, parse_model_options, parse_failure
+
+COMPLEX_QUESTIONS = [
+    "Compare how decision trees and random forests handle overfitting and explain why the difference matters.",
+    "Summarize the trade-offs between support vector machines and logistic regression discussed in the experiments.",
+    "Why would gradient boosting need more careful tuning than naive bayes, and what are the implications for small datasets?"
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Checks 'auto' model routing against the mock server with injected failures (no API key needed)."
+    )
+    parser.add_argument("--pages", type=int, default=20, help="Pages of synthetic corpus")
+    parser.add_argument("--questions", type=int, default=6, help="Simple lookup questions (the complex ones are fixed)")
+    parser.add_argument("--latency", type=float, default=0.2, help="Mock answer latency in seconds")
+    parser.add_argument("--fail", action="append", metavar="MODEL=KIND[:P]",
+                        help="Injected failure, as for mock_server.py (default: 429 on the fast route's first model, "
+                             "timeouts on the deep route's first model half the time)")
+    parser.add_argument("--stream", action="store_true", help="Use query_stream instead of query")
+    args = parser.parse_args()
+
+    # src.config reads GROQ_API_BASE on import, so the server has to be up first
+    server, base_url = serve_in_background(latency=args.latency)
+    os.environ["GROQ_API_BASE"] = base_url
+    os.environ.setdefault("GROQ_API_KEY", "mock")
+
+    from src.config import ROUTE_FAST_MODELS, ROUTE_DEEP_MODELS, ROUTE_DEEP_SLO_S
+    from src.backend import AdvancedRAG
+    from src.benchmark.offline_benchmark import build_synthetic_corpus
+
+    work_dir = tempfile.mkdtemp(prefix="rag_routing_")
+    files_dir = os.path.join(work_dir, "files")
+    db_dir = os.path.join(work_dir, "db")
+    os.makedirs(files_dir)
+    server.failures = parse_model_options(args.fail, parse_failure) if args.fail else {
+        ROUTE_FAST_MODELS[0]: ("429", 1.0),
+        ROUTE_DEEP_MODELS[0]: ("timeout", 0.5)
+    }
+    server.hang_s = ROUTE_DEEP_SLO_S
+    try:
+        dataset = build_synthetic_corpus(files_dir, args.pages)
+        print(f"Mock server on {base_url}, failures: {server.failures}", flush=True)
+        print("Loading engine...", flush=True)
+        rag = AdvancedRAG(chunk_store_path=os.path.join(work_dir, "chunk_store.sqlite"))
+        summary = rag.process_documents(files_dir, db_dir)
+        if not isinstance(summary, dict):
+            raise RuntimeError(summary)
+
+        questions = [item["question"] for item in dataset[:args.questions]] + COMPLEX_QUESTIONS
+        print(f"\n{'route':<6} {'score':>5} {'model':<45} {'fallbacks':>9} {'latency_s':>9}  question", flush=True)
+        for question in questions:
+            stats = {}
+            start_time = time.perf_counter()
+            if args.stream:
+                answer = "".join(rag.query_stream(question, db_dir, "auto", stats=stats))
+            else:
+                answer = rag.query(question, db_dir, "auto", stats=stats)
+            latency = time.perf_counter() - start_time
+            if str(answer).startswith("Error"):
+                print(f"{stats.get('route', '-'):<6} {'':>5} {answer[:80]}", flush=True)
+                continue
+            print(f"{stats['route']:<6} {stats['complexity']:>5} {stats['model']:<45} {stats['fallbacks']:>9} "
+                  f"{latency:>9.2f}  {question[:60]}", flush=True)
+
+        print("\nPer route:", flush=True)
+        for route, route_stats in rag.router.stats().items():
+            print(f"{route:<6} queries {route_stats['queries']:>3}  SLO {route_stats['slo_s']:.1f}s  "
+                  f"met {route_stats['slo_met']:.0%}  p50 {route_stats['p50_s']:.2f}s  p95 {route_stats['p95_s']:.2f}s  "
+                  f"fallbacks {route_stats['fallbacks']}  failed {route_stats['failed']}", flush=True)
+    finally:
+        server.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,26 @@
 import os
+import sys
 import json
 import time
+import asyncio
+import argparse
 import pandas as pd
 from dotenv import load_dotenv
 from llama_index.core import Settings, VectorStoreIndex, StorageContext, SimpleDirectoryReader
+from llama_index.core.node_parser import SentenceSplitter
 from llama_index.vector_stores.chroma import ChromaVectorStore
 from llama_index.llms.groq import Groq
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
 import chromadb
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from src.bm25 import BM25Index
+from src.config import CANDIDATE_K, DENSE_WEIGHT, SPARSE_WEIGHT, RRF_K, TOP_K, CHUNK_SIZE, CHUNK_OVERLAP
+from src.embeddings import get_embed_model
+from src.journal import ResultsJournal
+from src.ratelimit import TokenBucket, call_with_backoff
+from src.retrieval import HybridRetriever
+from src.benchmark.metrics import frequent_terms, recall_at_k
+
 # Load env vars
 load_dotenv(override=True)
 
@@ -25,10 +37,26 @@ PDF_PATH = os.path.join("benchmark_data", "Dr.R.Praba-StudyonMLAlgorithms.pdf")
 DATASET_PATH = os.path.join("benchmark_data", "test_set.json")
 # Save results to docs/ folder for GitHub Pages report
 RESULTS_PATH = os.path.join("docs", "results.json")
+# Append-only log the run writes to; compacted into RESULTS_PATH at the end
+JOURNAL_PATH = os.path.join("benchmark_data", "results.jsonl")
+RETRIEVAL_RESULTS_PATH = os.path.join("docs", "retrieval_results.json")
+# TOP_K, CHUNK_SIZE and CHUNK_OVERLAP come from src.config, like the app (see src/benchmark/sweep.py)
+# Results journalled before entries recorded their top_k were all run with this one
+LEGACY_TOP_K = 3
+
+# Rate limiting: GROQ_API_BASE can point at src/benchmark/mock_server.py to run offline
+GROQ_API_BASE = os.getenv("GROQ_API_BASE", "https://api.groq.com/openai/v1")
+# Judge with a faster model to avoid rate limits
+JUDGE_MODEL = "llama-3.1-8b-instant"
+CONCURRENCY = 4
+MODEL_RPM = 30
+JUDGE_RPM = 30
+MAX_RETRIES = 6
+REQUEST_TIMEOUT = 60.0
 
 def setup_rag_engine(db_path):
     print("Setting up RAG engine...")
-    embed_model = HuggingFaceEmbedding(model_name="sentence-transformers/all-MiniLM-L6-v2")
+    embed_model = get_embed_model()
     Settings.embed_model = embed_model
     
     if not os.path.exists(db_path):
@@ -44,7 +72,10 @@ def setup_rag_engine(db_path):
             vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
             storage_context = StorageContext.from_defaults(vector_store=vector_store)
             
-            VectorStoreIndex.from_documents(documents, storage_context=storage_context, show_progress=True)
+            VectorStoreIndex.from_documents(
+                documents, storage_context=storage_context, show_progress=True,
+                transformations=[SentenceSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)]
+            )
             print("Database created successfully.")
         except Exception as e:
             print(f"Error creating database: {e}")
@@ -56,11 +87,49 @@ def setup_rag_engine(db_path):
     index = VectorStoreIndex.from_vector_store(vector_store, embed_model=embed_model)
     return index
 
-def evaluate_answer(question, ground_truth, prediction, model_name):
-    # Judge with a strong model
-    # Judge with a faster model to avoid rate limits
-    judge_llm = Groq(model="llama-3.1-8b-instant", api_key=os.getenv("GROQ_API_KEY"))
-    
+def evaluate_retrieval(index, dataset, db_path, top_k=TOP_K):
+    """
+    Recall@k of dense-only retrieval versus BM25 + dense reciprocal rank fusion.
+    """
+    bm25 = BM25Index.load(db_path)
+    if bm25 is None:
+        chroma_client = chromadb.PersistentClient(path=db_path)
+        bm25 = BM25Index.from_collection(chroma_client.get_or_create_collection("benchmark_data"))
+        bm25.save(db_path)
+
+    retrievers = {
+        "dense": index.as_retriever(similarity_top_k=top_k),
+        "hybrid": HybridRetriever(
+            index.as_retriever(similarity_top_k=max(top_k, CANDIDATE_K)), bm25, index.vector_store,
+            top_k=top_k, candidate_k=max(top_k, CANDIDATE_K),
+            dense_weight=DENSE_WEIGHT, sparse_weight=SPARSE_WEIGHT, rrf_k=RRF_K
+        )
+    }
+    report = {"top_k": top_k, "questions": len(dataset)}
+    # Items without a recorded source are scored on their distinctive terms only
+    common = frequent_terms(bm25)
+    for mode, retriever in retrievers.items():
+        report[f"recall_{mode}"] = recall_at_k(
+            dataset, lambda q: [n.node.get_content() for n in retriever.retrieve(q)], common=common
+        )
+        print(f"Recall@{top_k} ({mode}): {report[f'recall_{mode}']:.3f}")
+
+    with open(RETRIEVAL_RESULTS_PATH, "w") as f:
+        json.dump(report, f, indent=4)
+    return report
+
+def make_llm(model_id, temperature=0.1):
+    # max_retries=0: 429s must reach our own backoff instead of the client's
+    return Groq(
+        model=model_id,
+        api_key=os.getenv("GROQ_API_KEY"),
+        api_base=GROQ_API_BASE,
+        temperature=temperature,
+        max_retries=0,
+        timeout=REQUEST_TIMEOUT
+    )
+
+async def evaluate_answer(judge_llm, judge_bucket, question, ground_truth, prediction):
     prompt = f"""
     You are an impartial judge evaluating the quality of an answer provided by an AI model.
     
@@ -81,7 +150,9 @@ def evaluate_answer(question, ground_truth, prediction, model_name):
     """
     
     try:
-        response = judge_llm.complete(prompt)
+        response = await call_with_backoff(
+            lambda: judge_llm.acomplete(prompt), judge_bucket, max_retries=MAX_RETRIES, label="judge"
+        )
         txt = response.text.strip()
         if txt.startswith("```json"): txt = txt[7:]
         if txt.endswith("```"): txt = txt[:-3]
@@ -89,7 +160,17 @@ def evaluate_answer(question, ground_truth, prediction, model_name):
     except Exception as e:
         return {"relevance_score": 0, "accuracy_score": 0, "explanation": f"Evaluation failed: {str(e)}"}
 
-def run_benchmark():
+def evaluation_failed(result):
+    return "Evaluation failed" in str(result.get("explanation", ""))
+
+def result_key(entry):
+    # Answers retrieved with a different top_k are different results, not earlier attempts
+    return (entry["model"], entry["question"], entry.get("top_k", LEGACY_TOP_K))
+
+def current_top_k(entry):
+    return entry.get("top_k", LEGACY_TOP_K) == TOP_K
+
+async def run_benchmark_async(concurrency=CONCURRENCY, rpm=MODEL_RPM, judge_rpm=JUDGE_RPM):
     if not os.path.exists(DATASET_PATH):
         print("Dataset not found. Run generate_dataset.py first.")
         return
@@ -101,100 +182,111 @@ def run_benchmark():
     if not index:
         return
 
-    # Load existing results to resume
-    results = []
-    if os.path.exists(RESULTS_PATH):
+    print("\n--- Retrieval recall (dense vs hybrid) ---")
+    evaluate_retrieval(index, dataset, DB_PATH)
+
+    # Resume from the journal; seed it from an older results.json if needed
+    journal = ResultsJournal(JOURNAL_PATH, key=result_key)
+    if not len(journal) and os.path.exists(RESULTS_PATH):
         try:
             with open(RESULTS_PATH, "r") as f:
-                results = json.load(f)
-            print(f"Resuming benchmark. Loaded {len(results)} existing results.")
+                journal.seed(json.load(f))
         except:
             print("Could not load existing results. Starting fresh.")
-    
-    # Create a map of processed items for fast lookup and status check
-    processed = {}
-    for r in results:
-        processed[(r["model"], r["question"])] = r
+    done = sum(current_top_k(entry) for entry in journal.values())
+    if done:
+        print(f"Resuming benchmark. Loaded {done} existing results for top_k={TOP_K}.")
 
+    # One judge client and one token bucket per model, shared by every task
+    judge_llm = make_llm(JUDGE_MODEL, temperature=0.0)
+    judge_bucket = TokenBucket.per_minute(judge_rpm)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_item(name, query_engine, bucket, i, item):
+        question = item["question"]
+        ground_truth = item["ground_truth"]
+        key = (name, question, TOP_K)
+        label = f"{name} Q{i+1}"
+
+        async with semaphore:
+            # Check if already done AND evaluation succeeded
+            if key in journal:
+                prev_result = journal.get(key)
+                if not evaluation_failed(prev_result):
+                    print(f"Skipping {label} (already done successfully)")
+                    return
+                print(f"Retrying {label} (previous evaluation failed)...")
+                # Re-use the prediction if available to save RAG tokens/latency
+                if prev_result.get("prediction"):
+                    print(f"  {label}: re-using existing prediction, running evaluation only...")
+                    eval_metrics = await evaluate_answer(
+                        judge_llm, judge_bucket, question, ground_truth, prev_result["prediction"]
+                    )
+                    journal.append({**prev_result, **eval_metrics})
+                    return
+
+            print(f"Processing {label}: {question[:50]}...")
+            try:
+                timing = {}
+
+                async def timed_query():
+                    start_time = time.perf_counter()
+                    response = await query_engine.aquery(question)
+                    timing["latency"] = time.perf_counter() - start_time
+                    return response
+
+                response = await call_with_backoff(timed_query, bucket, max_retries=MAX_RETRIES, label=label)
+                prediction = str(response)
+
+                # Evaluate
+                eval_metrics = await evaluate_answer(judge_llm, judge_bucket, question, ground_truth, prediction)
+
+                result_entry = {
+                    "model": name,
+                    "question": question,
+                    "ground_truth": ground_truth,
+                    "prediction": prediction,
+                    "top_k": TOP_K,
+                    "latency": timing["latency"],
+                    **eval_metrics
+                }
+                # Save immediately
+                journal.append(result_entry)
+
+            except Exception as e:
+                print(f"Error processing {label}: {e}")
+
+    tasks = []
     for name, model_id in MODELS.items():
-        print(f"\n--- Testing Model: {name} ({model_id}) ---")
-        
+        print(f"Queueing model: {name} ({model_id})")
         try:
-            llm = Groq(model=model_id, api_key=os.getenv("GROQ_API_KEY"), temperature=0.1)
-            query_engine = index.as_query_engine(llm=llm, similarity_top_k=3)
-            
-            for i, item in enumerate(dataset):
-                question = item["question"]
-                ground_truth = item["ground_truth"]
-                
-                # Check if already done AND evaluation succeeded
-                key = (name, question)
-                if key in processed:
-                    prev_result = processed[key]
-                    if prev_result.get("explanation") != "Evaluation failed" and "Evaluation failed" not in str(prev_result.get("explanation", "")):
-                        print(f"Skipping Q{i+1} (already done successfully)")
-                        continue
-                    else:
-                        print(f"Retrying Q{i+1} (previous evaluation failed)...")
-                        # If we have a prediction but eval failed, we could just re-eval, but simpler to re-run or re-use prediction.
-                        # For simplicity, let's re-use prediction if available to save RAG tokens/latency
-                        prediction = prev_result.get("prediction")
-                        latency = prev_result.get("latency", 0)
-                        
-                        if prediction:
-                            print("  Re-using existing prediction, running evaluation only...")
-                            eval_metrics = evaluate_answer(question, ground_truth, prediction, name)
-                            # Update result in list
-                            # Find index of this result
-                            for idx, r in enumerate(results):
-                                if r["model"] == name and r["question"] == question:
-                                    results[idx].update(eval_metrics)
-                                    break
-                            
-                            with open(RESULTS_PATH, "w") as f:
-                                json.dump(results, f, indent=4)
-                            time.sleep(2)
-                            continue
-
-                print(f"Processing Q{i+1}: {question[:50]}...")
-                
-                try:
-                    start_time = time.time()
-                    response = query_engine.query(question)
-                    end_time = time.time()
-                    
-                    prediction = str(response)
-                    latency = end_time - start_time
-                    
-                    # Evaluate
-                    eval_metrics = evaluate_answer(question, ground_truth, prediction, name)
-                    
-                    result_entry = {
-                        "model": name,
-                        "question": question,
-                        "ground_truth": ground_truth,
-                        "prediction": prediction,
-                        "latency": latency,
-                        **eval_metrics
-                    }
-                    results.append(result_entry)
-                    processed[(name, question)] = results[-1]
-                    
-                    # Save immediately
-                    with open(RESULTS_PATH, "w") as f:
-                        json.dump(results, f, indent=4)
-                    
-                    # Rate limit handling
-                    time.sleep(5) 
-                    
-                except Exception as e:
-                    print(f"Error processing Q{i+1}: {e}")
-                    time.sleep(10) # Wait longer on error
-
+            llm = make_llm(model_id)
+            query_engine = index.as_query_engine(llm=llm, similarity_top_k=TOP_K)
         except Exception as e:
             print(f"Failed to run model {name}: {e}")
+            continue
+        bucket = TokenBucket.per_minute(rpm)
+        tasks.extend(run_item(name, query_engine, bucket, i, item) for i, item in enumerate(dataset))
+
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        journal.close()
+        count = journal.compact(RESULTS_PATH, keep=current_top_k)
+        print(f"\nBenchmark complete. {count} results compacted to {RESULTS_PATH}")
 
-    print(f"\nBenchmark complete. Results saved to {RESULTS_PATH}")
+def run_benchmark(concurrency=CONCURRENCY, rpm=MODEL_RPM, judge_rpm=JUDGE_RPM):
+    asyncio.run(run_benchmark_async(concurrency, rpm, judge_rpm))
 
 if __name__ == "__main__":
-    run_benchmark()
+    parser = argparse.ArgumentParser(description="Benchmark every model in MODELS against the test set.")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="Questions in flight across all models")
+    parser.add_argument("--rpm", type=float, default=MODEL_RPM, help="Requests per minute allowed per model")
+    parser.add_argument("--judge-rpm", type=float, default=JUDGE_RPM, help="Requests per minute allowed for the judge")
+    parser.add_argument("--compact-only", action="store_true", help=f"Only rebuild {RESULTS_PATH} from {JOURNAL_PATH}")
+    args = parser.parse_args()
+    if args.compact_only:
+        journal = ResultsJournal(JOURNAL_PATH, key=result_key)
+        print(f"Compacted {journal.compact(RESULTS_PATH, keep=current_top_k)} results for top_k={TOP_K} to {RESULTS_PATH}")
+    else:
+        run_benchmark(args.concurrency, args.rpm, args.judge_rpm)
@@ -0,0 +1,150 @@
+import os
+import re
+import sys
+import time
+import random
+import shutil
+import tempfile
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from llama_index.core import Settings
+from src.backend import AdvancedRAG
+from src.config import VECTOR_STORE
+from src.fake_llm import fake_llm_factory
+from src.benchmark.metrics import percentile
+
+MODELS = "llama-3.3-70b-versatile,llama-3.1-8b-instant,meta-llama/llama-4-scout-17b-16e-instruct,qwen/qwen3-32b"
+FILLER = [
+    "The quarterly review covered hiring, infrastructure costs and the product roadmap.",
+    "Several teams reported delays caused by vendor onboarding and security reviews.",
+    "The committee asked for a follow-up on data retention and backup policies.",
+    "Customer feedback highlighted search quality and response times as priorities."
+]
+SESSION_MARKER = re.compile(r"session_(\d{3})")
+
+
+def write_session_files(files_dir, session, rng):
+    # Each session's documents carry its own code and live under .../session_NNN/, which the
+    # fake LLM echoes back through the file_path metadata of the retrieved chunks
+    os.makedirs(files_dir)
+    for doc in range(2):
+        lines = [rng.choice(FILLER) for _ in range(30)]
+        lines.insert(rng.randint(0, len(lines)), f"The project codename of session {session} is ORCHID-{session:03d}-{doc}.")
+        with open(os.path.join(files_dir, f"notes_{doc}.txt"), "w") as f:
+            f.write(" ".join(lines))
+
+
+def run_session(rag, session, db_dir, models, queries, stream_ratio, start, seed):
+    rng = random.Random(seed)
+    results = []
+    start.wait()
+    for q in range(queries):
+        # Every session rotates through the models, so neighbours usually ask different ones
+        model = models[(session + q) % len(models)]
+        question = f"What is the project codename of session {session}?"
+        stats = {}
+        streamed = rng.random() < stream_ratio
+        start_time = time.perf_counter()
+        if streamed:
+            answer = "".join(rag.query_stream(question, db_dir, model, stats=stats))
+        else:
+            answer = rag.query(question, db_dir, model, stats=stats)
+        latency = time.perf_counter() - start_time
+
+        problems = []
+        if answer.startswith("Error"):
+            problems.append("error")
+        else:
+            if not answer.startswith(f"[{model}]"):
+                problems.append("model")
+            sessions_seen = {int(n) for n in SESSION_MARKER.findall(answer)}
+            if sessions_seen != {session}:
+                problems.append("context")
+        results.append({
+            "session": session, "model": model, "streamed": streamed, "latency": latency,
+            "ttft": stats.get("ttft"), "problems": problems, "answer": answer[:120]
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Drives concurrent sessions with mixed models through one shared engine and a fake LLM."
+    )
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--queries", type=int, default=20, help="Queries per session")
+    parser.add_argument("--models", default=MODELS, help="Comma-separated model names to rotate through")
+    parser.add_argument("--first-token-delay", type=float, default=0.05, help="Fake LLM seconds to first token")
+    parser.add_argument("--token-delay", type=float, default=0.002, help="Fake LLM seconds per token")
+    parser.add_argument("--stream-ratio", type=float, default=0.5, help="Fraction of queries using query_stream")
+    parser.add_argument("--vector-store", default=VECTOR_STORE)
+    args = parser.parse_args()
+
+    models = args.models.split(",")
+    work_dir = tempfile.mkdtemp(prefix="rag_load_")
+    try:
+        rng = random.Random(11)
+        sessions = []
+        for session in range(args.sessions):
+            session_dir = os.path.join(work_dir, f"session_{session:03d}")
+            write_session_files(os.path.join(session_dir, "files"), session, rng)
+            sessions.append((session, os.path.join(session_dir, "files"), os.path.join(session_dir, "db")))
+
+        print("Loading engine...", flush=True)
+        rag = AdvancedRAG(
+            max_clients=args.sessions,
+            max_pipelines=args.sessions * len(models),
+            llm_factory=fake_llm_factory(args.first_token_delay, args.token_delay),
+            ingest_workers=1,
+            chunk_store_path=os.path.join(work_dir, "chunk_store.sqlite"),
+            vector_store=args.vector_store
+        )
+        # Every session repeats its question; measure the full query path, not cache hits
+        rag.answer_cache = None
+
+        # Ingest every session at once, through the same engine
+        start_time = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.sessions) as executor:
+            summaries = list(executor.map(lambda s: rag.process_documents(s[1], s[2]), sessions))
+        failed = [s for s in summaries if not isinstance(s, dict)]
+        print(f"Ingested {args.sessions} sessions concurrently in {time.perf_counter() - start_time:.2f}s"
+              f"{f', {len(failed)} failed: {failed[0]}' if failed else ''}", flush=True)
+
+        print(f"Running {args.sessions} sessions x {args.queries} queries over {len(models)} models...", flush=True)
+        start = threading.Barrier(args.sessions)
+        start_time = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.sessions) as executor:
+            futures = [
+                executor.submit(run_session, rag, session, db_dir, models, args.queries, args.stream_ratio, start, session)
+                for session, _, db_dir in sessions
+            ]
+            results = [r for future in futures for r in future.result()]
+        wall = time.perf_counter() - start_time
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    latencies = [r["latency"] for r in results]
+    ttfts = [r["ttft"] for r in results if r["streamed"] and r["ttft"] is not None]
+    counts = {kind: sum(kind in r["problems"] for r in results) for kind in ("error", "model", "context")}
+    # The engine must not have filled in llama-index's process-wide defaults
+    settings_untouched = Settings._llm is None and Settings._embed_model is None and Settings._node_parser is None
+
+    print(f"\nQueries:      {len(results)} in {wall:.2f}s ({len(results) / wall:.1f} queries/s)")
+    print(f"Latency:      p50 {percentile(latencies, 50) * 1000:.0f} ms, p95 {percentile(latencies, 95) * 1000:.0f} ms, "
+          f"p99 {percentile(latencies, 99) * 1000:.0f} ms")
+    if ttfts:
+        print(f"First token:  p50 {percentile(ttfts, 50) * 1000:.0f} ms, p95 {percentile(ttfts, 95) * 1000:.0f} ms")
+    print(f"Errors:       {counts['error']}")
+    print(f"Cross-talk:   {counts['model']} answered by another model, {counts['context']} with another session's context")
+    print(f"Settings:     {'untouched' if settings_untouched else 'MODIFIED by the engine'}")
+    for r in [r for r in results if r["problems"]][:5]:
+        print(f"  session {r['session']} {r['model']}: {r['problems']} {r['answer']!r}")
+
+    sys.exit(0 if not any(counts.values()) and settings_untouched else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import argparse
+import itertools
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from src.backend import AdvancedRAG
+from src.chunk_store import ChunkStore, parser_key
+from src.config import RETRIEVAL_MODE, VECTOR_STORE, TUNED_CONFIG_PATH
+from src.context import count_tokens
+from src.embedding_service import get_service_embed_model
+from src.fake_llm import fake_llm_factory
+from src.ingestion import parse_file
+from src.manifest import file_hash
+from src.benchmark.metrics import frequent_terms, item_hit, percentile
+from src.benchmark.offline_benchmark import PDF_PATH, build_synthetic_corpus
+
+DATASET_PATH = os.path.join("benchmark_data", "test_set.json")
+CACHE_PATH = os.path.join("benchmark_data", "sweep_cache.sqlite")
+OUTPUT_PATH = os.path.join("benchmark_data", "sweep_results.json")
+# Compared on all four: higher recall; lower latency, index size and prompt tokens
+OBJECTIVES = (("recall", 1), ("p50_ms", -1), ("index_mb", -1), ("context_tokens", -1))
+
+
+def parse_grid(text):
+    return [int(value) for value in text.split(",") if value.strip()]
+
+
+def dir_size_mb(path):
+    total = 0
+    for root, _, names in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in names)
+    return total / (1024 * 1024)
+
+
+def pareto_front(points):
+    """
+    Marks each point "pareto": True when no other point is at least as good on
+    every objective and strictly better on one.
+    """
+    def dominates(a, b):
+        at_least = all(a[key] * sign >= b[key] * sign for key, sign in OBJECTIVES)
+        better = any(a[key] * sign > b[key] * sign for key, sign in OBJECTIVES)
+        return at_least and better
+
+    for point in points:
+        point["pareto"] = not any(dominates(other, point) for other in points if other is not point)
+    return [point for point in points if point["pareto"]]
+
+
+def choose(front, max_latency_ms=None, min_recall_ratio=0.98):
+    """
+    Picks from the Pareto front: among points within min_recall_ratio of the best
+    recall (and under max_latency_ms), the one with the fewest prompt tokens,
+    then the lowest latency.
+    """
+    candidates = [p for p in front if max_latency_ms is None or p["p50_ms"] <= max_latency_ms]
+    if not candidates:
+        return None
+    best_recall = max(p["recall"] for p in candidates)
+    near_best = [p for p in candidates if p["recall"] >= best_recall * min_recall_ratio]
+    return min(near_best, key=lambda p: (p["context_tokens"], p["p50_ms"], p["index_mb"]))
+
+
+def has_sources(dataset):
+    # Recall can choose settings only when every question is scored on retrieving its source
+    return all((item.get("source") or {}).get("chunk") for item in dataset)
+
+
+def evaluate(rag, db_dir, dataset, top_k, mode):
+    rag.retrieve(dataset[0]["question"], db_dir, mode=mode, top_k=top_k)  # warm-up
+    common = frequent_terms(rag._get_store(db_dir)["bm25"])
+    latencies, hits, tokens = [], 0, []
+    for item in dataset:
+        start_time = time.perf_counter()
+        nodes = rag.retrieve(item["question"], db_dir, mode=mode, top_k=top_k)
+        latencies.append(time.perf_counter() - start_time)
+        texts = [n.node.get_content() for n in nodes]
+        hits += item_hit(item, texts, common=common)
+        tokens.append(sum(count_tokens(text) for text in texts))
+    return {
+        "recall": hits / len(dataset),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "context_tokens": sum(tokens) / len(tokens)
+    }
+
+
+def sweep(args):
+    work_dir = tempfile.mkdtemp(prefix="rag_sweep_")
+    files_dir = os.path.join(work_dir, "files")
+    os.makedirs(files_dir)
+
+    try:
+        if args.pdf:
+            shutil.copy(args.pdf, files_dir)
+            with open(args.dataset, "r") as f:
+                dataset = json.load(f)
+            corpus = {"type": "fixture", "source": args.pdf}
+        else:
+            dataset = build_synthetic_corpus(files_dir, args.pages)
+            corpus = {"type": "synthetic", "pages": args.pages}
+        if args.max_questions:
+            dataset = dataset[:args.max_questions]
+
+        # 1. Parse once; every chunking below starts from these documents
+        print("Parsing corpus...", flush=True)
+        parsed = []
+        for name in sorted(os.listdir(files_dir)):
+            path = os.path.join(files_dir, name)
+            parsed.append((file_hash(path), parse_file(path)[0]))
+        print(f"Parsed {sum(len(docs) for _, docs in parsed)} pages. {len(dataset)} questions.", flush=True)
+
+        embed_model = get_service_embed_model()
+        chunk_store = ChunkStore(args.cache)
+        points = []
+        grid = [(size, overlap) for size, overlap in itertools.product(args.chunk_sizes, args.overlaps) if overlap < size]
+
+        for size, overlap in grid:
+            # 2. One engine per chunking, sharing the loaded embedder and the on-disk cache:
+            # the parse cache is seeded from the documents above, and chunks seen in an
+            # earlier run (or another setting producing the same text) are not re-embedded
+            rag = AdvancedRAG(
+                llm_factory=fake_llm_factory(),
+                embed_model=embed_model,
+                chunk_size=size,
+                chunk_overlap=overlap,
+                chunk_store_path=args.cache,
+                vector_store=args.vector_store
+            )
+            rag.answer_cache = None
+            for digest, documents in parsed:
+                chunk_store.put_nodes(digest, parser_key(rag.node_parser), rag.node_parser.get_nodes_from_documents(documents))
+
+            db_dir = os.path.join(work_dir, f"db_{size}_{overlap}")
+            try:
+                start_time = time.perf_counter()
+                summary = rag.process_documents(files_dir, db_dir)
+                if not isinstance(summary, dict):
+                    raise RuntimeError(summary)
+                index_s = time.perf_counter() - start_time
+                chunks = summary["chunks_embedded"] + summary["chunks_reused"]
+                index_mb = dir_size_mb(db_dir)
+                print(f"chunk_size {size}, overlap {overlap}: {chunks} chunks ({summary['chunks_reused']} from cache), "
+                      f"indexed in {index_s:.1f}s, {index_mb:.1f} MB", flush=True)
+
+                # 3. Every top_k against the same index
+                for top_k in args.top_ks:
+                    point = {
+                        "chunk_size": size, "chunk_overlap": overlap, "top_k": top_k,
+                        "chunks": chunks, "index_mb": index_mb, "index_s": index_s,
+                        **evaluate(rag, db_dir, dataset, top_k, args.mode)
+                    }
+                    points.append(point)
+                    print(f"  top_k {top_k:2d}: recall {point['recall']:.3f}, p50 {point['p50_ms']:.1f} ms, "
+                          f"{point['context_tokens']:.0f} context tokens", flush=True)
+            finally:
+                # Drop this DB's references but never gc(): the sweep cache should keep every
+                # entry, however old, for the next run (release_session would collect them)
+                rag.close_session(db_dir)
+                rag.chunk_store.release_owner(os.path.abspath(db_dir))
+                rag.chunk_store.close()
+                shutil.rmtree(db_dir, ignore_errors=True)
+        chunk_store.close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    front = pareto_front(points)
+    chosen = choose(front, args.max_latency_ms, args.min_recall_ratio)
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "corpus": corpus,
+        "questions": len(dataset),
+        "scored_on_source": has_sources(dataset),
+        "mode": args.mode,
+        "vector_store": args.vector_store,
+        "points": points,
+        "pareto": [{key: p[key] for key in ("chunk_size", "chunk_overlap", "top_k")} for p in front],
+        "chosen": chosen
+    }
+
+
+def print_report(report):
+    print(f"\n{'chunk':>6} {'overlap':>7} {'top_k':>5} {'recall':>7} {'p50 ms':>7} {'p95 ms':>7} "
+          f"{'index MB':>8} {'tokens':>7}  pareto")
+    for p in sorted(report["points"], key=lambda p: (-p["recall"], p["p50_ms"])):
+        marker = "*" if p["pareto"] else ""
+        if p is report["chosen"]:
+            marker = "* chosen"
+        print(f"{p['chunk_size']:6d} {p['chunk_overlap']:7d} {p['top_k']:5d} {p['recall']:7.3f} {p['p50_ms']:7.1f} "
+              f"{p['p95_ms']:7.1f} {p['index_mb']:8.1f} {p['context_tokens']:7.0f}  {marker}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Sweeps chunk size, overlap and top-k for retrieval recall, latency, index size and prompt tokens."
+    )
+    parser.add_argument("--pdf", help=f"Fixture PDF to index, scored against --dataset (e.g. {PDF_PATH})")
+    parser.add_argument("--dataset", default=DATASET_PATH)
+    parser.add_argument("--pages", type=int, default=200, help="Pages of synthetic corpus when no --pdf is given")
+    parser.add_argument("--max-questions", type=int, default=0)
+    parser.add_argument("--chunk-sizes", type=parse_grid, default=[256, 512, 1024])
+    parser.add_argument("--overlaps", type=parse_grid, default=[0, 50, 100])
+    parser.add_argument("--top-ks", type=parse_grid, default=[3, 5, 8])
+    parser.add_argument("--mode", default=RETRIEVAL_MODE, choices=["dense", "hybrid"])
+    parser.add_argument("--vector-store", default=VECTOR_STORE)
+    parser.add_argument("--cache", default=CACHE_PATH, help="Chunk/embedding cache reused across settings and runs")
+    parser.add_argument("--max-latency-ms", type=float, help="Only choose settings with a retrieval p50 under this")
+    parser.add_argument("--min-recall-ratio", type=float, default=0.98,
+                        help="Choose the cheapest setting within this fraction of the best recall")
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    parser.add_argument("--apply", action="store_true", help=f"Write the chosen setting to {TUNED_CONFIG_PATH} for the app")
+    args = parser.parse_args()
+
+    if args.pdf and not os.path.exists(args.dataset):
+        print(f"Error: no dataset at {args.dataset} (run generate_dataset.py first)", flush=True)
+        sys.exit(1)
+
+    report = sweep(args)
+    print_report(report)
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=4)
+    print(f"\nResults written to {args.output}")
+
+    chosen = report["chosen"]
+    if chosen is None:
+        print("No setting meets --max-latency-ms.")
+        sys.exit(1)
+    setting = {key: chosen[key] for key in ("chunk_size", "chunk_overlap", "top_k")}
+    print(f"Chosen: {setting} (recall {chosen['recall']:.3f}, p50 {chosen['p50_ms']:.1f} ms)")
+    if args.apply and not report["scored_on_source"]:
+        print(f"Not writing {TUNED_CONFIG_PATH}: some questions in {args.dataset} record no source, so their "
+              f"recall is only estimated from answer terms. Regenerate it with generate_dataset.py.")
+        sys.exit(1)
+    if args.apply:
+        os.makedirs(os.path.dirname(TUNED_CONFIG_PATH) or ".", exist_ok=True)
+        with open(TUNED_CONFIG_PATH, "w") as f:
+            json.dump({**setting, "recall": chosen["recall"], "p50_ms": chosen["p50_ms"],
+                       "mode": report["mode"], "tuned_at": report["timestamp"]}, f, indent=4)
+        print(f"Wrote {TUNED_CONFIG_PATH}; the app uses it from its next start "
+              f"(sessions are re-chunked on their next 'Process Documents').")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import argparse
+import multiprocessing
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from src.sessions import dir_size
+from src.benchmark.metrics import percentile
+
+
+def open_store(kind, path):
+    if kind == "flat":
+        from src.flat_store import FlatVectorStore
+        return FlatVectorStore(path)
+    import chromadb
+    from llama_index.vector_stores.chroma import ChromaVectorStore
+    client = chromadb.PersistentClient(path=path)
+    return ChromaVectorStore(chroma_collection=client.get_or_create_collection("user_data"))
+
+
+def make_nodes(vectors, seed):
+    from llama_index.core.schema import TextNode
+
+    rng = np.random.default_rng(seed)
+    words = ["model", "training", "data", "feature", "accuracy", "kernel", "tree", "cluster", "loss", "layer"]
+    return [
+        TextNode(
+            id_=f"chunk-{i}",
+            text=" ".join(rng.choice(words, size=80)),
+            metadata={"file_name": f"doc_{i // 50}.pdf", "page_label": str(i % 50)},
+            embedding=vector.tolist()
+        )
+        for i, vector in enumerate(vectors)
+    ]
+
+
+def search(store, query_vector, top_k):
+    from llama_index.core.vector_stores.types import VectorStoreQuery
+
+    result = store.query(VectorStoreQuery(query_embedding=query_vector.tolist(), similarity_top_k=top_k))
+    return result.ids
+
+
+def cold_open(kind, path, query_vector, top_k, results):
+    # Runs in a fresh process: what the first query of a session pays (module imports excluded)
+    open_store(kind, os.path.join(os.path.dirname(path), "import-warmup"))
+    start_time = time.perf_counter()
+    store = open_store(kind, path)
+    opened = time.perf_counter()
+    search(store, query_vector, top_k)
+    results.put({"open_ms": (opened - start_time) * 1000, "first_query_ms": (time.perf_counter() - opened) * 1000})
+
+
+def run(kind, size, dim, queries, top_k, work_dir, seed=7):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((size, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    query_vectors = rng.standard_normal((queries, dim)).astype(np.float32)
+    # Exact neighbours for recall
+    truth = np.argsort(-(query_vectors @ vectors.T), axis=1)[:, :top_k]
+
+    path = os.path.join(work_dir, f"{kind}-{size}")
+    store = open_store(kind, path)
+    nodes = make_nodes(vectors, seed)
+    start_time = time.perf_counter()
+    for i in range(0, size, 256):
+        store.add(nodes[i:i + 256])
+    write_s = time.perf_counter() - start_time
+    del store
+
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=cold_open, args=(kind, path, query_vectors[0], top_k, results))
+    process.start()
+    cold = results.get()
+    process.join()
+
+    store = open_store(kind, path)
+    search(store, query_vectors[0], top_k)  # warm-up
+    latencies, hits = [], 0
+    for query_vector, expected in zip(query_vectors, truth):
+        start_time = time.perf_counter()
+        ids = search(store, query_vector, top_k)
+        latencies.append(time.perf_counter() - start_time)
+        hits += len({f"chunk-{i}" for i in expected} & set(ids))
+
+    return {
+        "store": kind,
+        "chunks": size,
+        "write_s": write_s,
+        **cold,
+        "query_p50_ms": percentile(latencies, 50) * 1000,
+        "query_p95_ms": percentile(latencies, 95) * 1000,
+        f"recall_at_{top_k}": hits / (queries * top_k),
+        "disk_mb": dir_size(path) / (1024 * 1024)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compares the Chroma and flat session vector stores.")
+    parser.add_argument("--sizes", default="1000,5000,20000", help="Comma-separated chunk counts")
+    parser.add_argument("--dim", type=int, default=384, help="Embedding dimension (384 for MiniLM)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=20)
+    parser.add_argument("--stores", default="chroma,flat")
+    parser.add_argument("--output", help="Also write the rows as JSON to this file")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="rag_vector_store_")
+    rows = []
+    try:
+        print(f"{'store':<7} {'chunks':>6} {'write_s':>8} {'open_ms':>8} {'first_q_ms':>10} {'q_p50_ms':>9} "
+              f"{'q_p95_ms':>9} {'recall':>7} {'disk_mb':>8}", flush=True)
+        for size in [int(s) for s in args.sizes.split(",")]:
+            for kind in args.stores.split(","):
+                row = run(kind, size, args.dim, args.queries, args.top_k, work_dir)
+                rows.append(row)
+                print(f"{kind:<7} {size:>6} {row['write_s']:>8.2f} {row['open_ms']:>8.1f} {row['first_query_ms']:>10.1f} "
+                      f"{row['query_p50_ms']:>9.2f} {row['query_p95_ms']:>9.2f} {row[f'recall_at_{args.top_k}']:>7.3f} "
+                      f"{row['disk_mb']:>8.1f}", flush=True)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(rows, f, indent=4)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import os
+import re
+import math
+import heapq
+import pickle
+import threading
+from collections import Counter
+
+BM25_NAME = "bm25.pkl"
+
+# Identifiers such as "INV-2024-0173" or "v2.1" are kept whole and also split into parts
+_TOKEN_RE = re.compile(r"\w+(?:[-_./]\w+)*")
+_PART_RE = re.compile(r"[-_./]")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the "
+    "this to was were what when where which who why will with how do does did".split()
+)
+
+
+def tokenize(text):
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        tokens.append(token)
+        if _PART_RE.search(token):
+            tokens.extend(part for part in _PART_RE.split(token) if part and part not in STOPWORDS)
+    return tokens
+
+
+class BM25Index:
+    """
+    In-memory BM25 inverted index over chunk ids, updated incrementally as chunks
+    are added or deleted and pickled next to the vector DB.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}  # term -> {doc_id: term frequency}
+        self.doc_terms = {}  # doc_id -> distinct terms, needed for removal
+        self.doc_len = {}
+        self.total_len = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.doc_len)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    def add(self, doc_id, text):
+        with self._lock:
+            if doc_id in self.doc_len:
+                self.remove(doc_id)
+            counts = Counter(tokenize(text))
+            for term, tf in counts.items():
+                self.postings.setdefault(term, {})[doc_id] = tf
+            self.doc_terms[doc_id] = tuple(counts)
+            length = sum(counts.values())
+            self.doc_len[doc_id] = length
+            self.total_len += length
+
+    def remove(self, doc_id):
+        with self._lock:
+            for term in self.doc_terms.pop(doc_id, ()):
+                docs = self.postings.get(term)
+                if docs is not None:
+                    docs.pop(doc_id, None)
+                    if not docs:
+                        del self.postings[term]
+            self.total_len -= self.doc_len.pop(doc_id, 0)
+
+    def search(self, query, top_k=10):
+        with self._lock:
+            n_docs = len(self.doc_len)
+            if not n_docs:
+                return []
+            avg_len = self.total_len / n_docs
+            scores = {}
+            for term in set(tokenize(query)):
+                docs = self.postings.get(term)
+                if not docs:
+                    continue
+                idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+                for doc_id, tf in docs.items():
+                    norm = self.k1 * (1 - self.b + self.b * self.doc_len[doc_id] / avg_len)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+            return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+
+    @staticmethod
+    def path_for(db_path):
+        return os.path.join(db_path, BM25_NAME)
+
+    def save(self, db_path):
+        path = self.path_for(db_path)
+        tmp_path = path + ".tmp"
+        with self._lock, open(tmp_path, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, db_path):
+        path = cls.path_for(db_path)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        except Exception:
+            return None
+
+    @classmethod
+    def from_documents(cls, documents):
+        """
+        Builds the index from (doc_id, text) pairs.
+        """
+        index = cls()
+        for doc_id, text in documents:
+            index.add(doc_id, text or "")
+        return index
+
+    @classmethod
+    def from_collection(cls, collection, page_size=1000):
+        """
+        Rebuilds the index from every document stored in a Chroma collection.
+        """
+        def documents():
+            offset = 0
+            while True:
+                page = collection.get(include=["documents"], limit=page_size, offset=offset)
+                yield from zip(page["ids"], page["documents"])
+                if len(page["ids"]) < page_size:
+                    return
+                offset += page_size
+        return cls.from_documents(documents())
@@ -0,0 +1,43 @@
+import io
+import threading
+
+
+class ChatExport:
+    """
+    DOCX log of one chat, built on demand. The document is kept between
+    downloads and only the messages added since the last one are appended;
+    the saved bytes are cached by message count.
+    """
+
+    def __init__(self):
+        self._doc = None
+        self._count = 0
+        self._bytes = None
+        self._lock = threading.Lock()
+
+    def _new_document(self):
+        from docx import Document
+
+        doc = Document()
+        doc.add_heading('Formal Conversation Log', 0)
+        return doc
+
+    def build(self, messages):
+        with self._lock:
+            if self._doc is None or len(messages) < self._count:
+                self._doc, self._count, self._bytes = self._new_document(), 0, None
+            if self._bytes is not None and len(messages) == self._count:
+                return self._bytes
+
+            for msg in messages[self._count:]:
+                role = "User" if msg["role"] == "user" else f"AI ({msg.get('model_name', 'System')})"
+                p = self._doc.add_paragraph()
+                p.add_run(f"{role}:").bold = True
+                self._doc.add_paragraph(msg["content"])
+                self._doc.add_paragraph("-" * 20)
+            self._count = len(messages)
+
+            buffer = io.BytesIO()
+            self._doc.save(buffer)
+            self._bytes = buffer.getvalue()
+            return self._bytes
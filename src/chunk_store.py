@@ -0,0 +1,196 @@
+import os
+import time
+import sqlite3
+import threading
+
+import numpy as np
+from llama_index.core.schema import TextNode
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    chunk_hash TEXT NOT NULL,
+    model TEXT NOT NULL,
+    vector BLOB NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (chunk_hash, model)
+);
+CREATE TABLE IF NOT EXISTS parses (
+    file_hash TEXT NOT NULL,
+    parser TEXT NOT NULL,
+    nodes TEXT NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (file_hash, parser)
+);
+CREATE TABLE IF NOT EXISTS chunk_refs (
+    owner TEXT NOT NULL,
+    node_id TEXT NOT NULL,
+    chunk_hash TEXT NOT NULL,
+    model TEXT NOT NULL,
+    PRIMARY KEY (owner, node_id)
+);
+CREATE TABLE IF NOT EXISTS file_refs (
+    owner TEXT NOT NULL,
+    rel_path TEXT NOT NULL,
+    file_hash TEXT NOT NULL,
+    parser TEXT NOT NULL,
+    PRIMARY KEY (owner, rel_path)
+);
+CREATE INDEX IF NOT EXISTS chunk_refs_target ON chunk_refs (chunk_hash, model);
+CREATE INDEX IF NOT EXISTS file_refs_target ON file_refs (file_hash, parser);
+"""
+
+
+def parser_key(node_parser):
+    # Cached chunks are only valid for the splitter settings that produced them
+    return f"{type(node_parser).__name__}:{node_parser.chunk_size}:{node_parser.chunk_overlap}"
+
+
+class ChunkStore:
+    """
+    Content-addressed cache shared by every session DB:
+    - embeddings keyed by (chunk hash, embedding model)
+    - chunked files keyed by (file hash, splitter settings)
+    Each session DB (the "owner") holds references to the entries it uses;
+    gc() drops entries nobody references any more.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        # One connection per store; several app processes may share the file
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def _write(self, sql, rows):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(sql, rows)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _select(self, sql, keys, extra=()):
+        # Stay below SQLite's bound-parameter limit
+        rows = []
+        keys = list(keys)
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                part = keys[start:start + 500]
+                placeholders = ",".join("?" * len(part))
+                rows.extend(self._conn.execute(sql.format(placeholders), [*extra, *part]).fetchall())
+        return rows
+
+    # --- Embeddings ---
+
+    def get_embeddings(self, chunk_hashes, model):
+        rows = self._select(
+            "SELECT chunk_hash, vector FROM embeddings WHERE model = ? AND chunk_hash IN ({})",
+            set(chunk_hashes), extra=(model,)
+        )
+        return {digest: np.frombuffer(blob, dtype=np.float32).tolist() for digest, blob in rows}
+
+    def put_embeddings(self, embeddings, model):
+        now = time.time()
+        self._write(
+            "INSERT OR IGNORE INTO embeddings (chunk_hash, model, vector, created) VALUES (?, ?, ?, ?)",
+            [(digest, model, np.asarray(vector, dtype=np.float32).tobytes(), now) for digest, vector in embeddings.items()]
+        )
+
+    # --- Chunked files ---
+
+    def get_nodes(self, file_hash, parser, file_path=None):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT nodes FROM parses WHERE file_hash = ? AND parser = ?", (file_hash, parser)
+            ).fetchone()
+        if row is None:
+            return None
+        nodes = [TextNode.from_json(line) for line in row[0].split("\n") if line]
+        if file_path is not None:
+            for node in nodes:
+                node.metadata["file_path"] = file_path
+        return nodes
+
+    def put_nodes(self, file_hash, parser, nodes):
+        payload = "\n".join(node.to_json() for node in nodes)
+        self._write(
+            "INSERT OR IGNORE INTO parses (file_hash, parser, nodes, created) VALUES (?, ?, ?, ?)",
+            [(file_hash, parser, payload, time.time())]
+        )
+
+    # --- References ---
+
+    def retain(self, owner, rel_path, file_hash, parser, chunks, model):
+        """
+        Records that `owner` stores rel_path (file_hash) as the chunks {node_id: chunk_hash}.
+        """
+        self._write(
+            "INSERT OR REPLACE INTO file_refs (owner, rel_path, file_hash, parser) VALUES (?, ?, ?, ?)",
+            [(owner, rel_path, file_hash, parser)]
+        )
+        self._write(
+            "INSERT OR REPLACE INTO chunk_refs (owner, node_id, chunk_hash, model) VALUES (?, ?, ?, ?)",
+            [(owner, node_id, digest, model) for node_id, digest in chunks.items()]
+        )
+
+    def release(self, owner, node_ids=(), rel_path=None):
+        self._write("DELETE FROM chunk_refs WHERE owner = ? AND node_id = ?", [(owner, n) for n in node_ids])
+        if rel_path is not None:
+            self._write("DELETE FROM file_refs WHERE owner = ? AND rel_path = ?", [(owner, rel_path)])
+
+    def release_owner(self, owner):
+        self._write("DELETE FROM chunk_refs WHERE owner = ?", [(owner,)])
+        self._write("DELETE FROM file_refs WHERE owner = ?", [(owner,)])
+
+    def gc(self, grace_s=3600):
+        """
+        Deletes unreferenced entries older than grace_s (younger ones may belong
+        to an ingestion that has not recorded its references yet).
+        """
+        cutoff = time.time() - grace_s
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                embeddings = self._conn.execute(
+                    "DELETE FROM embeddings WHERE created < ? AND NOT EXISTS ("
+                    "SELECT 1 FROM chunk_refs r WHERE r.chunk_hash = embeddings.chunk_hash AND r.model = embeddings.model)",
+                    (cutoff,)
+                ).rowcount
+                parses = self._conn.execute(
+                    "DELETE FROM parses WHERE created < ? AND NOT EXISTS ("
+                    "SELECT 1 FROM file_refs r WHERE r.file_hash = parses.file_hash AND r.parser = parses.parser)",
+                    (cutoff,)
+                ).rowcount
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return {"embeddings": embeddings, "parses": parses}
+
+    def stats(self):
+        with self._lock:
+            embeddings, chunk_refs, owners = self._conn.execute(
+                "SELECT (SELECT COUNT(*) FROM embeddings), (SELECT COUNT(*) FROM chunk_refs), "
+                "(SELECT COUNT(DISTINCT owner) FROM chunk_refs)"
+            ).fetchone()
+            parses, file_refs = self._conn.execute(
+                "SELECT (SELECT COUNT(*) FROM parses), (SELECT COUNT(*) FROM file_refs)"
+            ).fetchone()
+        return {
+            "embeddings": embeddings,
+            "chunk_refs": chunk_refs,
+            "parses": parses,
+            "file_refs": file_refs,
+            "owners": owners,
+            # Vectors each stored embedding stands in for across all session DBs
+            "sharing_ratio": chunk_refs / embeddings if embeddings else 0.0
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,125 @@
+import os
+import json
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _int(name, default):
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _float(name, default):
+    value = os.getenv(name)
+    return float(value) if value not in (None, "") else default
+
+
+def _tuned(path):
+    # Settings chosen by src/benchmark/sweep.py --apply; environment variables still override them
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+TUNED_CONFIG_PATH = os.getenv("RAG_TUNED_CONFIG", os.path.join("benchmark_data", "tuned_config.json"))
+TUNED = _tuned(TUNED_CONFIG_PATH)
+
+
+# Ingestion
+# Files are parsed in a process pool and embedded/upserted in fixed-size batches
+INGEST_WORKERS = _int("RAG_INGEST_WORKERS", min(4, os.cpu_count() or 1))
+EMBED_BATCH_SIZE = _int("RAG_EMBED_BATCH_SIZE", 64)
+# Background ingestion jobs: worker threads shared by all sessions, and jobs running at once per session
+INGEST_JOB_WORKERS = _int("RAG_INGEST_JOB_WORKERS", 2)
+INGEST_JOBS_PER_SESSION = _int("RAG_INGEST_JOBS_PER_SESSION", 1)
+
+# Embeddings
+# "torch" (default), "onnx" or "onnx-int8"; shared by the app and the benchmark scripts
+EMBED_MODEL_NAME = os.getenv("RAG_EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+EMBED_BACKEND = os.getenv("RAG_EMBED_BACKEND", "torch")
+EMBED_THREADS = _int("RAG_EMBED_THREADS", 0)
+ONNX_INT8_FILE = os.getenv("RAG_ONNX_INT8_FILE", "onnx/model_quint8_avx2.onnx")
+# "" (direct), "local" (in-process micro-batching) or "unix:<socket path>" (shared service process)
+EMBED_SERVICE = os.getenv("RAG_EMBED_SERVICE", "")
+EMBED_MAX_WAIT_MS = _float("RAG_EMBED_MAX_WAIT_MS", 5.0)
+# Chunking; existing sessions are re-chunked on their next "Process Documents" when this changes
+CHUNK_SIZE = _int("RAG_CHUNK_SIZE", TUNED.get("chunk_size", 512))
+CHUNK_OVERLAP = _int("RAG_CHUNK_OVERLAP", TUNED.get("chunk_overlap", 50))
+# Chunks and embeddings shared by all sessions, keyed by content hash ("" disables)
+CHUNK_STORE_PATH = os.getenv("RAG_CHUNK_STORE", os.path.join("temp_data", "chunk_store.sqlite"))
+
+# Session vector store
+# "chroma" (SQLite + HNSW) or "flat" (memory-mapped float16 matrix, brute-force search; see src/flat_store.py)
+VECTOR_STORE = os.getenv("RAG_VECTOR_STORE", "chroma")
+
+# Retrieval
+# "hybrid" fuses BM25 and dense results with reciprocal rank fusion; "dense" is vector-only
+RETRIEVAL_MODE = os.getenv("RAG_RETRIEVAL_MODE", "hybrid")
+TOP_K = _int("RAG_TOP_K", TUNED.get("top_k", 5))
+CANDIDATE_K = _int("RAG_CANDIDATE_K", 20)
+DENSE_WEIGHT = _float("RAG_DENSE_WEIGHT", 1.0)
+SPARSE_WEIGHT = _float("RAG_SPARSE_WEIGHT", 1.0)
+RRF_K = _int("RAG_RRF_K", 60)
+# Optional cross-encoder rerank (needs sentence-transformers): RERANK_CANDIDATES are over-fetched and
+# scored in batches until the per-query budget runs out, then the best top-k are kept
+RERANK = _int("RAG_RERANK", 0) == 1
+RERANK_MODEL = os.getenv("RAG_RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_CANDIDATES = _int("RAG_RERANK_CANDIDATES", 30)
+RERANK_BATCH_SIZE = _int("RAG_RERANK_BATCH_SIZE", 10)
+RERANK_BUDGET_MS = _float("RAG_RERANK_BUDGET_MS", 200.0)
+
+# Context packing
+# Retrieved chunks are filtered, de-duplicated and compressed to fit this many tokens (0 = send them as-is)
+CONTEXT_TOKEN_BUDGET = _int("RAG_CONTEXT_TOKENS", 1500)
+CONTEXT_MIN_RATIO = _float("RAG_CONTEXT_MIN_RATIO", 0.75)
+CONTEXT_MMR_LAMBDA = _float("RAG_CONTEXT_MMR_LAMBDA", 0.7)
+CONTEXT_DUP_THRESHOLD = _float("RAG_CONTEXT_DUP_THRESHOLD", 0.95)
+
+# Answer cache
+# Exact and semantic (cosine >= threshold on the query embedding) matches per (DB, model, index version);
+# RAG_ANSWER_CACHE_SIZE=0 disables it
+ANSWER_CACHE_SIZE = _int("RAG_ANSWER_CACHE_SIZE", 1000)
+ANSWER_CACHE_TTL_S = _float("RAG_ANSWER_CACHE_TTL_S", 3600.0)
+ANSWER_CACHE_THRESHOLD = _float("RAG_ANSWER_CACHE_THRESHOLD", 0.95)
+
+# Batch queries (python -m src.batch)
+# LLM calls in flight at once, and requests per minute across them
+BATCH_CONCURRENCY = _int("RAG_BATCH_CONCURRENCY", 4)
+BATCH_RPM = _int("RAG_BATCH_RPM", 30)
+
+# Model routing
+# "Auto" sends easy questions to the fast route and hard ones to the deep route; each route is a
+# fallback chain with a latency SLO in seconds (each attempt times out after half of it)
+GROQ_API_BASE = os.getenv("GROQ_API_BASE", "https://api.groq.com/openai/v1")
+ROUTE_FAST_MODELS = os.getenv(
+    "RAG_ROUTE_FAST_MODELS",
+    "llama-3.1-8b-instant,meta-llama/llama-4-scout-17b-16e-instruct,llama-3.3-70b-versatile"
+).split(",")
+ROUTE_DEEP_MODELS = os.getenv(
+    "RAG_ROUTE_DEEP_MODELS",
+    "llama-3.3-70b-versatile,qwen/qwen3-32b,openai/gpt-oss-20b,llama-3.1-8b-instant"
+).split(",")
+ROUTE_FAST_SLO_S = _float("RAG_ROUTE_FAST_SLO_S", 4.0)
+ROUTE_DEEP_SLO_S = _float("RAG_ROUTE_DEEP_SLO_S", 15.0)
+ROUTE_COMPLEXITY_THRESHOLD = _int("RAG_ROUTE_COMPLEXITY_THRESHOLD", 2)
+
+# Session storage
+# temp_data/<session_id> directories; idle ones are archived, the least recently used deleted over quota
+SESSION_DIR = os.getenv("RAG_SESSION_DIR", "temp_data")
+SESSION_QUOTA_MB = _float("RAG_SESSION_QUOTA_MB", 2048.0)
+SESSION_ARCHIVE_AFTER_S = _float("RAG_SESSION_ARCHIVE_AFTER_S", 3600.0)
+
+# Tracing
+# Per-stage spans as JSON lines: "" (off), "stdout" or a file path
+TRACE_SINK = os.getenv("RAG_TRACE_SINK", "")
+
+# Startup
+# Load the embedding model in the background as soon as the app starts (0 = on first use)
+WARMUP_ON_START = _int("RAG_WARMUP", 1) == 1
+
+# Chat page
+# Messages rendered per page of chat history; older ones stay collapsed until requested
+CHAT_WINDOW = _int("RAG_CHAT_WINDOW", 20)
@@ -0,0 +1,148 @@
+import re
+
+import numpy as np
+from llama_index.core.schema import MetadataMode
+from llama_index.core.utils import get_tokenizer
+
+from src.bm25 import tokenize
+from src.config import (
+    CONTEXT_TOKEN_BUDGET,
+    CONTEXT_MIN_RATIO,
+    CONTEXT_MMR_LAMBDA,
+    CONTEXT_DUP_THRESHOLD
+)
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n{2,}")
+
+
+def count_tokens(text):
+    return len(get_tokenizer()(text))
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def compress(text, query_terms, max_tokens):
+    """
+    Extractive compression: keeps the sentences sharing the most terms with the
+    query, in their original order, within max_tokens. Returns "" if none fit.
+    """
+    sentences = [s.strip() for s in _SENTENCE_END.split(text) if s and s.strip()]
+    scored = []
+    for position, sentence in enumerate(sentences):
+        overlap = len(query_terms & set(tokenize(sentence)))
+        scored.append((-overlap, position, sentence, count_tokens(sentence)))
+
+    chosen, used = [], 0
+    for _, position, sentence, tokens in sorted(scored):
+        if used + tokens <= max_tokens:
+            chosen.append((position, sentence))
+            used += tokens
+    return " ".join(sentence for _, sentence in sorted(chosen))
+
+
+class ContextPacker:
+    """
+    Turns the retrieved chunks into the context the LLM sees:
+    1. drops chunks whose similarity to the query is below min_ratio x the best one
+       (the first keep_top chunks of the retriever are always kept, so exact BM25
+       matches survive even when their embedding is far from the query)
+    2. orders the rest by maximal marginal relevance over the stored vectors and
+       drops near-duplicates (cosine >= dup_threshold to an already chosen chunk)
+    3. fills token_budget with whole chunks, then with sentence-compressed ones
+    """
+
+    def __init__(self, token_budget=CONTEXT_TOKEN_BUDGET, min_ratio=CONTEXT_MIN_RATIO,
+                 mmr_lambda=CONTEXT_MMR_LAMBDA, dup_threshold=CONTEXT_DUP_THRESHOLD, keep_top=1, min_sentence_tokens=24):
+        self.token_budget = token_budget
+        self.min_ratio = min_ratio
+        self.mmr_lambda = mmr_lambda
+        self.dup_threshold = dup_threshold
+        self.keep_top = keep_top
+        self.min_sentence_tokens = min_sentence_tokens
+
+    def pack(self, query_text, query_embedding, nodes, vectors, keep_top=None):
+        """
+        nodes: NodeWithScore list in retriever order; vectors: node_id -> stored embedding.
+        keep_top overrides self.keep_top (e.g. for chunks a reranker already ordered).
+        Returns (list of context strings, info dict).
+        """
+        keep_top = self.keep_top if keep_top is None else keep_top
+        info = {
+            "candidates": len(nodes), "low_score": 0, "duplicates": 0, "compressed": 0,
+            "over_budget": 0, "tokens_before": 0, "tokens_after": 0, "kept": 0, "top_similarity": None
+        }
+        if not nodes:
+            return [], info
+
+        query_vector = _unit(query_embedding)
+        units = [_unit(vectors[n.node.node_id]) if n.node.node_id in vectors else None for n in nodes]
+        sims = [float(u @ query_vector) if u is not None else None for u in units]
+        texts = [n.node.get_content(metadata_mode=MetadataMode.LLM) for n in nodes]
+        tokens = [count_tokens(text) for text in texts]
+        info["tokens_before"] = sum(tokens)
+
+        # 1. Adaptive cutoff relative to the best match of this query
+        known = [s for s in sims if s is not None]
+        cutoff = max(known) * self.min_ratio if known else None
+        kept = []
+        for i, sim in enumerate(sims):
+            if i < keep_top or sim is None or cutoff is None or sim >= cutoff:
+                kept.append(i)
+            else:
+                info["low_score"] += 1
+
+        # 2. MMR order, near-duplicates dropped
+        order, remaining = [], list(kept)
+        while remaining:
+            best, best_score = None, None
+            for i in list(remaining):
+                redundancy = max(
+                    (float(units[i] @ units[j]) for j in order if units[i] is not None and units[j] is not None),
+                    default=0.0
+                )
+                if redundancy >= self.dup_threshold:
+                    remaining.remove(i)
+                    info["duplicates"] += 1
+                    continue
+                # Retriever order wins for the chunks that are always kept
+                if i < keep_top:
+                    best = i
+                    break
+                relevance = sims[i] if sims[i] is not None else 0.0
+                score = self.mmr_lambda * relevance - (1 - self.mmr_lambda) * redundancy
+                if best_score is None or score > best_score:
+                    best, best_score = i, score
+            if best is None:
+                break
+            order.append(best)
+            remaining.remove(best)
+
+        # 3. Token budget: whole chunks first, then the most query-relevant sentences
+        query_terms = set(tokenize(query_text))
+        pieces, used = [], 0
+        for i in order:
+            if used + tokens[i] <= self.token_budget:
+                pieces.append(texts[i])
+                used += tokens[i]
+                continue
+            node = nodes[i].node
+            header_tokens = tokens[i] - count_tokens(node.get_content(metadata_mode=MetadataMode.NONE))
+            room = self.token_budget - used - header_tokens
+            text = compress(node.get_content(metadata_mode=MetadataMode.NONE), query_terms, room) \
+                if room >= self.min_sentence_tokens else ""
+            if not text:
+                info["over_budget"] += 1
+                continue
+            piece = node.model_copy(update={"text": text}).get_content(metadata_mode=MetadataMode.LLM)
+            pieces.append(piece)
+            used += count_tokens(piece)
+            info["compressed"] += 1
+
+        info["tokens_after"] = used
+        info["kept"] = len(pieces)
+        info["top_similarity"] = max(known) if known else None
+        return pieces, info
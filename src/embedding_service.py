@@ -0,0 +1,282 @@
+import os
+import json
+import time
+import queue
+import socket
+import struct
+import asyncio
+import argparse
+import threading
+import socketserver
+from concurrent.futures import Future
+from typing import Any, List
+
+import numpy as np
+from llama_index.core.embeddings import BaseEmbedding
+from pydantic import PrivateAttr
+
+from src.config import EMBED_SERVICE, EMBED_BATCH_SIZE, EMBED_MAX_WAIT_MS
+
+_HEADER = struct.Struct("!I")
+_SHAPE = struct.Struct("!II")
+_ERROR = 0xFFFFFFFF
+
+
+class MicroBatcher:
+    """
+    Collects embedding requests from any number of threads and runs them as
+    one batch once max_batch texts are queued or the oldest request has
+    waited max_wait_ms.
+    """
+
+    def __init__(self, embed_fn, max_batch=EMBED_BATCH_SIZE, max_wait_ms=EMBED_MAX_WAIT_MS, name="embed"):
+        self.embed_fn = embed_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.requests = 0
+        self.texts = 0
+        self.batches = 0
+        self._queue = queue.Queue()
+        threading.Thread(target=self._run, name=f"{name}-batcher", daemon=True).start()
+
+    def submit(self, texts):
+        future = Future()
+        self._queue.put((list(texts), future))
+        return future
+
+    def embed(self, texts):
+        return self.submit(texts).result()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            count = len(batch[0][0])
+            deadline = time.monotonic() + self.max_wait
+            while count < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(item)
+                count += len(item[0])
+
+            texts = [text for item_texts, _ in batch for text in item_texts]
+            try:
+                vectors = self.embed_fn(texts)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            self.requests += len(batch)
+            self.texts += len(texts)
+            self.batches += 1
+            offset = 0
+            for item_texts, future in batch:
+                future.set_result(vectors[offset:offset + len(item_texts)])
+                offset += len(item_texts)
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "texts": self.texts,
+            "batches": self.batches,
+            "avg_batch": self.texts / self.batches if self.batches else 0.0
+        }
+
+
+def _query_batch_fn(embed_model, probe="query batching probe"):
+    """
+    Many queries in one forward pass through the public get_text_embedding_batch,
+    when that gives the same vectors as get_query_embedding (models without a
+    query instruction, such as all-MiniLM-L6-v2; checked once on a probe).
+    Otherwise queries are embedded one at a time.
+    """
+    try:
+        symmetric = np.allclose(
+            embed_model.get_query_embedding(probe), embed_model.get_text_embedding_batch([probe])[0], atol=1e-5
+        )
+    except Exception:
+        symmetric = False
+    if symmetric:
+        return embed_model.get_text_embedding_batch
+    return lambda texts: [embed_model.get_query_embedding(text) for text in texts]
+
+
+def embed_queries(embed_model, texts):
+    """
+    Query embeddings for many texts at once: one service call, or one forward pass of the plain model.
+    """
+    if isinstance(embed_model, BatchedEmbedding):
+        return embed_model.service.embed(texts, "query")
+    return _query_batch_fn(embed_model)(texts)
+
+
+class LocalEmbeddingService:
+    """
+    One embedding model shared by every session of the process, behind two
+    micro-batchers (queries and document chunks).
+    """
+
+    def __init__(self, embed_model, max_batch=EMBED_BATCH_SIZE, max_wait_ms=EMBED_MAX_WAIT_MS):
+        self.embed_model = embed_model
+        self.model_name = embed_model.model_name
+        self.batchers = {
+            "query": MicroBatcher(_query_batch_fn(embed_model), max_batch, max_wait_ms, name="query"),
+            "text": MicroBatcher(embed_model.get_text_embedding_batch, max_batch, max_wait_ms, name="text")
+        }
+
+    def embed(self, texts, kind="text"):
+        return self.batchers[kind].embed(texts)
+
+    def stats(self):
+        return {kind: batcher.stats() for kind, batcher in self.batchers.items()}
+
+
+def _recv_exact(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("Embedding service closed the connection.")
+        data.extend(chunk)
+    return bytes(data)
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        service = self.server.service
+        while True:
+            try:
+                (size,) = _HEADER.unpack(_recv_exact(self.request, _HEADER.size))
+            except ConnectionError:
+                return
+            request = json.loads(_recv_exact(self.request, size))
+            try:
+                vectors = np.asarray(service.embed(request["texts"], request.get("kind", "text")), dtype=np.float32)
+                rows, dim = vectors.shape if vectors.size else (0, 0)
+                self.request.sendall(_SHAPE.pack(rows, dim) + vectors.tobytes())
+            except Exception as e:
+                message = str(e).encode("utf-8")
+                self.request.sendall(_SHAPE.pack(_ERROR, len(message)) + message)
+
+
+class EmbeddingServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Serves a LocalEmbeddingService over a Unix socket, so several app processes
+    share one model and their requests are batched together.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, service):
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        self.service = service
+        super().__init__(socket_path, _Handler)
+
+
+class UnixSocketClient:
+    """
+    Client side of EmbeddingServer; one connection per calling thread.
+    """
+
+    def __init__(self, socket_path, model_name="remote"):
+        self.socket_path = socket_path
+        self.model_name = model_name
+        self._local = threading.local()
+
+    def _socket(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(self.socket_path)
+            self._local.sock = sock
+        return sock
+
+    def embed(self, texts, kind="text"):
+        payload = json.dumps({"texts": list(texts), "kind": kind}).encode("utf-8")
+        sock = self._socket()
+        try:
+            sock.sendall(_HEADER.pack(len(payload)) + payload)
+            rows, dim = _SHAPE.unpack(_recv_exact(sock, _SHAPE.size))
+            if rows == _ERROR:
+                raise RuntimeError(f"Embedding service error: {_recv_exact(sock, dim).decode('utf-8')}")
+            data = _recv_exact(sock, rows * dim * 4)
+        except (ConnectionError, OSError):
+            sock.close()
+            self._local.sock = None
+            raise
+        return np.frombuffer(data, dtype=np.float32).reshape(rows, dim).tolist()
+
+
+class BatchedEmbedding(BaseEmbedding):
+    """
+    Drop-in embed_model that routes every call through an embedding service
+    (LocalEmbeddingService or UnixSocketClient).
+    """
+
+    _service: Any = PrivateAttr()
+
+    def __init__(self, service, **kwargs):
+        # Hand whole ingestion batches to the service; it does its own batching
+        kwargs.setdefault("embed_batch_size", 2048)
+        super().__init__(model_name=service.model_name, **kwargs)
+        self._service = service
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "BatchedEmbedding"
+
+    @property
+    def service(self):
+        return self._service
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._service.embed([query], "query")[0]
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._service.embed([text], "text")[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._service.embed(texts, "text")
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return await asyncio.to_thread(self._get_query_embedding, query)
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return await asyncio.to_thread(self._get_text_embedding, text)
+
+
+def get_service_embed_model(mode=EMBED_SERVICE):
+    """
+    "" -> the plain model, "local" -> in-process micro-batching,
+    "unix:<path>" -> a shared EmbeddingServer process (no model loaded here).
+    """
+    if mode.startswith("unix:"):
+        return BatchedEmbedding(UnixSocketClient(mode[len("unix:"):]))
+
+    from src.embeddings import get_embed_model
+
+    if mode == "local":
+        return BatchedEmbedding(LocalEmbeddingService(get_embed_model()))
+    if mode:
+        raise ValueError(f"Unknown RAG_EMBED_SERVICE '{mode}'. Use '', 'local' or 'unix:<socket path>'.")
+    return get_embed_model()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shared embedding service over a Unix socket.")
+    parser.add_argument("--socket", default="/tmp/rag-embed.sock")
+    parser.add_argument("--max-batch", type=int, default=EMBED_BATCH_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=EMBED_MAX_WAIT_MS)
+    args = parser.parse_args()
+
+    from src.embeddings import get_embed_model
+
+    server = EmbeddingServer(args.socket, LocalEmbeddingService(get_embed_model(), args.max_batch, args.max_wait_ms))
+    print(f"Embedding service listening on {args.socket} (set RAG_EMBED_SERVICE=unix:{args.socket})", flush=True)
+    server.serve_forever()
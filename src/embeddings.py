@@ -0,0 +1,77 @@
+import numpy as np
+from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+
+from src.config import (
+    EMBED_MODEL_NAME,
+    EMBED_BACKEND,
+    EMBED_BATCH_SIZE,
+    EMBED_THREADS,
+    ONNX_INT8_FILE
+)
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+PARITY_TEXTS = [
+    "Random forests combine many decision trees trained on bootstrap samples.",
+    "Support vector machines find the maximum-margin separating hyperplane.",
+    "Gradient boosting fits each new tree to the residuals of the ensemble.",
+    "K-means clustering assigns points to the nearest of k centroids.",
+    "The invoice number INV-2024-0173 was issued on 3 March.",
+    "Logistic regression models the log-odds of a binary outcome.",
+    "Principal component analysis projects data onto directions of maximum variance.",
+    "What is the difference between bagging and boosting?"
+]
+
+
+def get_embed_model(backend=EMBED_BACKEND, batch_size=EMBED_BATCH_SIZE, threads=EMBED_THREADS):
+    """
+    Builds the MiniLM embedding model on the requested backend.
+    The ONNX backends run on CPU through ONNX Runtime and need `optimum[onnxruntime]` (requirements-onnx.txt);
+    "onnx-int8" loads the dynamically quantized weights shipped with the model.
+    """
+    if backend == "torch":
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        return HuggingFaceEmbedding(model_name=EMBED_MODEL_NAME, embed_batch_size=batch_size)
+
+    if backend in ("onnx", "onnx-int8"):
+        import onnxruntime
+        session_options = onnxruntime.SessionOptions()
+        if threads:
+            session_options.intra_op_num_threads = threads
+            session_options.inter_op_num_threads = 1
+        model_kwargs = {"provider": "CPUExecutionProvider", "session_options": session_options}
+        if backend == "onnx-int8":
+            model_kwargs["file_name"] = ONNX_INT8_FILE
+        return HuggingFaceEmbedding(
+            model_name=EMBED_MODEL_NAME,
+            embed_batch_size=batch_size,
+            device="cpu",
+            backend="onnx",
+            model_kwargs=model_kwargs
+        )
+
+    raise ValueError(f"Unknown embedding backend '{backend}'. Choose one of: {', '.join(BACKENDS)}")
+
+
+def _cosine_matrix(vectors):
+    matrix = np.asarray(vectors, dtype=np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix, matrix @ matrix.T
+
+
+def parity_check(candidate, reference, texts=PARITY_TEXTS, tolerance=0.02):
+    """
+    Compares two embedding models on the same texts. Passes when every pairwise
+    cosine similarity differs by at most `tolerance` between the two models.
+    """
+    cand, cand_sims = _cosine_matrix(candidate.get_text_embedding_batch(texts))
+    ref, ref_sims = _cosine_matrix(reference.get_text_embedding_batch(texts))
+    max_diff = float(np.max(np.abs(cand_sims - ref_sims)))
+    return {
+        "max_similarity_diff": max_diff,
+        "min_self_cosine": float(np.min(np.sum(cand * ref, axis=1))),
+        "tolerance": tolerance,
+        "passed": max_diff <= tolerance
+    }
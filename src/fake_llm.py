@@ -0,0 +1,77 @@
+import re
+import time
+from typing import Any
+
+from llama_index.core.llms import (
+    CustomLLM,
+    CompletionResponse,
+    CompletionResponseGen,
+    LLMMetadata
+)
+from llama_index.core.llms.callbacks import llm_completion_callback
+
+
+class FakeLLM(CustomLLM):
+    """
+    Local stand-in for Groq. Answers with the model name and the start of the
+    retrieved context, so tests can check both streaming and which model answered.
+    """
+
+    model_name: str = "fake-llm"
+    first_token_delay: float = 0.0
+    token_delay: float = 0.0
+    answer_words: int = 30
+    # Like a client timeout: a first token later than this raises TimeoutError (0 = never)
+    timeout: float = 0.0
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(model_name=self.model_name, is_chat_model=False)
+
+    def _answer(self, prompt):
+        match = re.search(r"-{5,}\n(.*?)\n-{5,}", prompt, re.S)
+        context = match.group(1) if match else prompt
+        words = context.split()[:self.answer_words]
+        return f"[{self.model_name}] " + " ".join(words)
+
+    def _wait_first_token(self):
+        if self.timeout and self.first_token_delay > self.timeout:
+            time.sleep(self.timeout)
+            raise TimeoutError(f"{self.model_name} timed out after {self.timeout}s")
+        time.sleep(self.first_token_delay)
+
+    @llm_completion_callback()
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        text = self._answer(prompt)
+        self._wait_first_token()
+        time.sleep(self.token_delay * len(text.split()))
+        return CompletionResponse(text=text)
+
+    @llm_completion_callback()
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponseGen:
+        tokens = re.findall(r"\S+\s*", self._answer(prompt))
+
+        def gen() -> CompletionResponseGen:
+            self._wait_first_token()
+            text = ""
+            for token in tokens:
+                text += token
+                yield CompletionResponse(text=text, delta=token)
+                time.sleep(self.token_delay)
+
+        return gen()
+
+
+def fake_llm_factory(first_token_delay=0.0, token_delay=0.0, model_delays=None):
+    """
+    Returns an AdvancedRAG llm_factory that builds FakeLLMs instead of Groq clients.
+    model_delays overrides first_token_delay per model name (e.g. to make one model time out).
+    """
+    def factory(model_name, timeout=None):
+        return FakeLLM(
+            model_name=model_name,
+            first_token_delay=(model_delays or {}).get(model_name, first_token_delay),
+            token_delay=token_delay,
+            timeout=timeout or 0.0
+        )
+    return factory
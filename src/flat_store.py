@@ -0,0 +1,273 @@
+import os
+import json
+import threading
+from typing import Any, List, Optional
+
+import numpy as np
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.schema import BaseNode, MetadataMode
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    VectorStoreQuery,
+    VectorStoreQueryResult
+)
+from llama_index.core.vector_stores.utils import metadata_dict_to_node, node_to_metadata_dict
+
+INDEX_NAME = "index.json"
+
+
+class FlatVectorStore(BasePydanticVectorStore):
+    """
+    Brute-force vector store for small session corpora, in one directory:
+    - vectors.<generation>.f16: unit-normalised float16 rows, memory-mapped for search
+    - nodes.<generation>.jsonl: one line per row with the node's text and metadata
+    - index.json: row -> (node id, ref doc id, byte range in the nodes file)
+    Both data files are append-only and index.json is rewritten last, so a write
+    that did not finish leaves only unreferenced bytes behind. Deleted rows are
+    masked; compact() writes the live ones to the next generation's files.
+    The first query after a write upcasts the mapped rows once to float32
+    (numpy has no fast float16 matrix product); opening stays a few file reads.
+    """
+
+    stores_text: bool = True
+    flat_metadata: bool = False
+
+    path: str
+    _dim: Optional[int] = PrivateAttr(default=None)
+    _generation: int = PrivateAttr(default=0)
+    _rows: list = PrivateAttr(default_factory=list)
+    _positions: dict = PrivateAttr(default_factory=dict)
+    _vectors: Any = PrivateAttr(default=None)
+    _matrix: Any = PrivateAttr(default=None)
+    _live: Any = PrivateAttr(default=None)
+    _lock: Any = PrivateAttr(default_factory=threading.RLock)
+
+    def __init__(self, path: str, **kwargs: Any) -> None:
+        super().__init__(path=path, **kwargs)
+        os.makedirs(path, exist_ok=True)
+        index_path = os.path.join(path, INDEX_NAME)
+        if os.path.exists(index_path):
+            with open(index_path, "r") as f:
+                index = json.load(f)
+            self._dim = index["dim"]
+            self._generation = index["generation"]
+            self._rows = index["rows"]
+        self._positions = {row[0]: i for i, row in enumerate(self._rows) if row is not None}
+        self._remap()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "FlatVectorStore"
+
+    @property
+    def client(self) -> Any:
+        return None
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __bool__(self) -> bool:
+        # llama-index tests `if vector_store:` and would swap an empty store for a SimpleVectorStore
+        return True
+
+    def _vectors_file(self, generation=None):
+        return os.path.join(self.path, f"vectors.{self._generation if generation is None else generation}.f16")
+
+    def _nodes_file(self, generation=None):
+        return os.path.join(self.path, f"nodes.{self._generation if generation is None else generation}.jsonl")
+
+    def _remap(self):
+        # Rows past the last committed one (from an interrupted write) are ignored
+        if self._rows:
+            self._vectors = np.memmap(self._vectors_file(), dtype=np.float16, mode="r", shape=(len(self._rows), self._dim))
+        else:
+            self._vectors = None
+        self._matrix = None
+        self._live = np.array([row is not None for row in self._rows], dtype=bool)
+
+    def _save_index(self):
+        path = os.path.join(self.path, INDEX_NAME)
+        with open(path + ".tmp", "w") as f:
+            json.dump({"dim": self._dim, "generation": self._generation, "rows": self._rows}, f)
+        os.replace(path + ".tmp", path)
+
+    def _append(self, nodes):
+        vectors = np.asarray([node.get_embedding() for node in nodes], dtype=np.float32)
+        if self._dim is None:
+            self._dim = vectors.shape[1]
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = (vectors / np.where(norms > 0, norms, 1)).astype(np.float16)
+
+        with open(self._vectors_file(), "ab") as f:
+            f.truncate(len(self._rows) * self._dim * 2)
+            f.write(vectors.tobytes())
+        with open(self._nodes_file(), "ab") as f:
+            offset = f.tell()
+            for node in nodes:
+                record = node_to_metadata_dict(node, remove_text=True, flat_metadata=False)
+                record["text"] = node.get_content(metadata_mode=MetadataMode.NONE)
+                line = (json.dumps(record) + "\n").encode("utf-8")
+                f.write(line)
+                self._rows.append([node.node_id, node.ref_doc_id, offset, len(line)])
+                offset += len(line)
+
+    def add(self, nodes: List[BaseNode], **add_kwargs: Any) -> List[str]:
+        if not nodes:
+            return []
+        with self._lock:
+            # Re-adding an id replaces its row
+            for node in nodes:
+                self._drop(node.node_id)
+            first = len(self._rows)
+            self._append(nodes)
+            for i in range(first, len(self._rows)):
+                self._positions[self._rows[i][0]] = i
+            self._save_index()
+            self._remap()
+        return [node.node_id for node in nodes]
+
+    def _drop(self, node_id):
+        position = self._positions.pop(node_id, None)
+        if position is not None:
+            self._rows[position] = None
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        with self._lock:
+            ids = [row[0] for row in self._rows if row is not None and row[1] == ref_doc_id]
+        self.delete_nodes(node_ids=ids)
+
+    def delete_nodes(self, node_ids: Optional[List[str]] = None, filters: Any = None, **delete_kwargs: Any) -> None:
+        if filters:
+            raise ValueError("FlatVectorStore does not support metadata filters.")
+        with self._lock:
+            for node_id in node_ids or []:
+                self._drop(node_id)
+            if len(self._rows) - len(self._positions) > max(256, len(self._positions)):
+                self.compact()
+            else:
+                self._save_index()
+                self._remap()
+
+    def clear(self) -> None:
+        with self._lock:
+            old = (self._vectors_file(), self._nodes_file())
+            self._rows, self._positions = [], {}
+            self._generation += 1
+            self._save_index()
+            self._remap()
+            for path in old:
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def compact(self):
+        """
+        Rewrites the data files without the deleted rows.
+        """
+        with self._lock:
+            live = [i for i, row in enumerate(self._rows) if row is not None]
+            old = (self._vectors_file(), self._nodes_file())
+            generation = self._generation + 1
+            rows = []
+            with open(self._nodes_file(), "rb") as src, open(self._nodes_file(generation), "wb") as dst:
+                for i in live:
+                    node_id, ref_doc_id, offset, length = self._rows[i]
+                    src.seek(offset)
+                    rows.append([node_id, ref_doc_id, dst.tell(), length])
+                    dst.write(src.read(length))
+            with open(self._vectors_file(generation), "wb") as f:
+                if live:
+                    f.write(np.asarray(self._vectors[live]).tobytes())
+
+            # The new generation is live once index.json points at it
+            self._rows, self._generation = rows, generation
+            self._positions = {row[0]: i for i, row in enumerate(rows)}
+            self._save_index()
+            self._remap()
+            for path in old:
+                os.remove(path)
+
+    def _read_nodes(self, positions):
+        rows = [self._rows[i] for i in positions]
+        nodes = []
+        if not rows:
+            return nodes
+        with open(self._nodes_file(), "rb") as f:
+            for node_id, _, offset, length in rows:
+                f.seek(offset)
+                record = json.loads(f.read(length))
+                text = record.pop("text")
+                nodes.append(metadata_dict_to_node(record, text=text))
+        return nodes
+
+    def get_nodes(self, node_ids: Optional[List[str]] = None, filters: Any = None, **kwargs: Any) -> List[BaseNode]:
+        if filters:
+            raise ValueError("FlatVectorStore does not support metadata filters.")
+        with self._lock:
+            if node_ids is None:
+                positions = [i for i, row in enumerate(self._rows) if row is not None]
+            else:
+                positions = [self._positions[n] for n in node_ids if n in self._positions]
+            return self._read_nodes(positions)
+
+    def get_embeddings(self, node_ids):
+        """
+        node_id -> stored (unit-normalised) vector, for the ids that exist.
+        """
+        with self._lock:
+            found = [(n, self._positions[n]) for n in node_ids if n in self._positions]
+            return {n: self._vectors[i].astype(np.float32) for n, i in found}
+
+    def matrix(self):
+        """
+        (node ids, float32 matrix) of every live row, e.g. for batched search.
+        """
+        with self._lock:
+            if self._vectors is None:
+                return [], np.zeros((0, self._dim or 0), dtype=np.float32)
+            if self._matrix is None:
+                self._matrix = np.asarray(self._vectors, dtype=np.float32)
+            live = np.flatnonzero(self._live)
+            return [self._rows[i][0] for i in live], self._matrix[live]
+
+    def documents(self):
+        """
+        Yields (node_id, text) for every stored node, e.g. to rebuild the BM25 index.
+        """
+        for node in self.get_nodes():
+            yield node.node_id, node.get_content(metadata_mode=MetadataMode.NONE)
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        if query.filters:
+            raise ValueError("FlatVectorStore does not support metadata filters.")
+        empty = VectorStoreQueryResult(nodes=[], similarities=[], ids=[])
+        with self._lock:
+            if self._vectors is None or query.query_embedding is None:
+                return empty
+            if self._matrix is None:
+                self._matrix = np.asarray(self._vectors, dtype=np.float32)
+
+            query_vector = np.asarray(query.query_embedding, dtype=np.float32)
+            norm = np.linalg.norm(query_vector)
+            # Cosine similarity against every row; deleted rows can never win
+            scores = self._matrix @ (query_vector / norm if norm else query_vector)
+            scores[~self._live] = -np.inf
+            if query.node_ids is not None:
+                allowed = np.zeros(len(self._rows), dtype=bool)
+                allowed[[self._positions[n] for n in query.node_ids if n in self._positions]] = True
+                scores[~allowed] = -np.inf
+
+            k = min(query.similarity_top_k, int(np.isfinite(scores).sum()))
+            if k <= 0:
+                return empty
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            nodes = self._read_nodes(top)
+        return VectorStoreQueryResult(
+            nodes=nodes,
+            similarities=[float(scores[i]) for i in top],
+            ids=[node.node_id for node in nodes]
+        )
+
+    def close(self):
+        with self._lock:
+            self._vectors = self._matrix = None
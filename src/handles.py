@@ -0,0 +1,119 @@
+import os
+import threading
+from collections import OrderedDict
+
+
+class HandleCache:
+    """
+    LRU cache for the objects a query needs: one vector store handle (Chroma
+    client/collection or flat store) per DB path and one query pipeline per
+    (db_path, model_name).
+    Evicting a DB path also drops every pipeline built on top of it.
+    Callers hold a lease (acquire/release) on a DB path while they use its
+    handle: an evicted handle is closed right away when nobody holds a lease,
+    otherwise when the last lease is released. There is at most one handle
+    per DB path, open or waiting to be closed.
+    """
+
+    def __init__(self, max_clients=4, max_pipelines=16, close=None):
+        self.max_clients = max_clients
+        self.max_pipelines = max_pipelines
+        # Called with a handle once it is evicted and no longer leased
+        self.close = close or (lambda handle: None)
+        self._clients = OrderedDict()
+        self._pipelines = OrderedDict()
+        # Evicted handles still in use by a lease holder, one per DB path
+        self._evicted = {}
+        self._leases = {}
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(db_path):
+        return os.path.abspath(db_path)
+
+    def get_client(self, db_path, factory):
+        key = self._key(db_path)
+        with self._lock:
+            if key in self._clients:
+                self._clients.move_to_end(key)
+                return self._clients[key]
+            # An evicted handle that is still leased is taken back rather than opened twice
+            handle = self._evicted.pop(key, None) or factory()
+            self._clients[key] = handle
+            while len(self._clients) > self.max_clients:
+                old_key, old_handle = self._clients.popitem(last=False)
+                self._drop_pipelines(old_key)
+                self.evictions += 1
+                if self._leases.get(old_key):
+                    self._evicted[old_key] = old_handle
+                else:
+                    self.close(old_handle)
+            return handle
+
+    def acquire(self, db_path):
+        """
+        Takes a lease on db_path: its handle is not closed on eviction until
+        the matching release().
+        """
+        key = self._key(db_path)
+        with self._lock:
+            self._leases[key] = self._leases.get(key, 0) + 1
+
+    def release(self, db_path):
+        key = self._key(db_path)
+        with self._lock:
+            count = self._leases.get(key, 0) - 1
+            if count > 0:
+                self._leases[key] = count
+                return
+            self._leases.pop(key, None)
+            handle = self._evicted.pop(key, None)
+            if handle is not None:
+                self.close(handle)
+
+    def get_pipeline(self, db_path, model_name, factory):
+        key = (self._key(db_path), model_name)
+        with self._lock:
+            if key in self._pipelines:
+                self._pipelines.move_to_end(key)
+                self.hits += 1
+                return self._pipelines[key]
+            self.misses += 1
+            pipeline = factory()
+            self._pipelines[key] = pipeline
+            while len(self._pipelines) > self.max_pipelines:
+                self._pipelines.popitem(last=False)
+                self.evictions += 1
+            return pipeline
+
+    def _drop_pipelines(self, path_key):
+        for key in [k for k in self._pipelines if k[0] == path_key]:
+            del self._pipelines[key]
+
+    def invalidate(self, db_path, drop_client=False):
+        """
+        Drops the pipelines of db_path. With drop_client also its client handle,
+        open or evicted, returned as a list so the caller can close it.
+        """
+        key = self._key(db_path)
+        with self._lock:
+            self._drop_pipelines(key)
+            if not drop_client:
+                return []
+            return [h for h in (self._evicted.pop(key, None), self._clients.pop(key, None)) if h is not None]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "open_clients": len(self._clients),
+                "evicted_in_use": len(self._evicted),
+                "pipelines": len(self._pipelines)
+            }
@@ -0,0 +1,270 @@
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from llama_index.core import SimpleDirectoryReader
+from llama_index.core.schema import MetadataMode
+from llama_index.readers.file import PyMuPDFReader
+
+from src.config import INGEST_WORKERS, EMBED_BATCH_SIZE
+from src.chunk_store import parser_key
+from src.manifest import file_hash, chunk_hash, node_id_for
+from src.tracing import Trace
+
+
+class IngestionCancelled(Exception):
+    pass
+
+
+def parse_file(path):
+    # Runs inside a worker process, so it must stay a top-level function
+    # Using PyMuPDFReader for better table and structure extraction
+    start_time = time.perf_counter()
+    file_extractor = {".pdf": PyMuPDFReader()}
+    reader = SimpleDirectoryReader(input_files=[path], file_extractor=file_extractor)
+    documents = reader.load_data()
+    for document in documents:
+        # The absolute upload path differs per session; keeping it out of the
+        # embedded text makes identical chunks hash (and embed) identically
+        if "file_path" not in document.excluded_embed_metadata_keys:
+            document.excluded_embed_metadata_keys.append("file_path")
+    return documents, time.perf_counter() - start_time
+
+
+class IngestionPipeline:
+    """
+    Streams files through parse -> chunk -> embed -> upsert.
+    Files are parsed in a process pool with a bounded number of files in flight,
+    and embeddings are computed and upserted batch_size chunks at a time, so peak
+    memory depends on the worker count, the batch size and the largest single
+    file, not on the size of the corpus.
+    With a ChunkStore, files and chunks already seen by any session are taken
+    from the shared store instead of being parsed and embedded again.
+    """
+
+    def __init__(self, embed_model, node_parser, workers=INGEST_WORKERS, batch_size=EMBED_BATCH_SIZE,
+                 chunk_store=None, embed_key=None):
+        self.embed_model = embed_model
+        self.node_parser = node_parser
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.chunk_store = chunk_store
+        self.embed_key = embed_key or embed_model.model_name
+        self.parser_key = parser_key(node_parser)
+
+    def _parsed_files(self, jobs):
+        # Small jobs are not worth the process start-up cost
+        if self.workers == 1 or len(jobs) == 1:
+            for job in jobs:
+                yield job, parse_file(job[1])
+            return
+
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=context) as executor:
+            queued = iter(jobs)
+            in_flight = {}
+            try:
+                while True:
+                    while len(in_flight) < self.workers * 2:
+                        job = next(queued, None)
+                        if job is None:
+                            break
+                        in_flight[executor.submit(parse_file, job[1])] = job
+                    if not in_flight:
+                        return
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield in_flight.pop(future), future.result()
+            finally:
+                # Closed early (error or cancel): don't wait for files nobody will use
+                for future in in_flight:
+                    future.cancel()
+
+    def _chunked_files(self, jobs, trace):
+        """
+        Yields (job, nodes) per file; cached files first, then freshly parsed ones.
+        """
+        to_parse = []
+        for job in jobs:
+            nodes = None
+            if self.chunk_store is not None:
+                with trace.span("parse_cache_lookup", file=job[0]) as span:
+                    nodes = self.chunk_store.get_nodes(job[2], self.parser_key, file_path=job[1])
+                    span["hit"] = nodes is not None
+            if nodes is None:
+                to_parse.append(job)
+            else:
+                yield job, nodes
+
+        for job, (documents, parse_seconds) in self._parsed_files(to_parse):
+            trace.record("pdf_parse", parse_seconds, file=job[0], documents=len(documents))
+            with trace.span("chunking", file=job[0]) as span:
+                nodes = self.node_parser.get_nodes_from_documents(documents)
+                span["chunks"] = len(nodes)
+            del documents
+            if self.chunk_store is not None:
+                self.chunk_store.put_nodes(job[2], self.parser_key, nodes)
+            yield job, nodes
+
+    def run(self, files, manifest, vector_store, bm25=None, trace=None, owner=None,
+            progress=None, cancelled=None):
+        """
+        progress(event, **data) is told about the plan ("plan"), every chunked
+        file ("chunked"), every stored batch ("batch") and every committed file
+        ("file_done"). If cancelled() turns true, the run stops at the next file
+        or batch, removes the chunks of files it had not committed and raises
+        IngestionCancelled. Any other error removes them the same way before
+        it propagates.
+        """
+        trace = trace or Trace(None, "ingest")
+        progress = progress or (lambda event, **data: None)
+
+        def check_cancelled():
+            if cancelled is not None and cancelled():
+                raise IngestionCancelled("Ingestion cancelled.")
+
+        store = self.chunk_store if owner is not None else None
+        summary = {
+            "added": 0, "updated": 0, "skipped": 0, "deleted": 0,
+            "chunks_embedded": 0, "chunks_reused": 0, "chunks_deleted": 0
+        }
+
+        def delete(node_ids):
+            if not node_ids:
+                return
+            with trace.span("chroma_delete", chunks=len(node_ids)):
+                vector_store.delete_nodes(node_ids=node_ids)
+                if bm25 is not None:
+                    for node_id in node_ids:
+                        bm25.remove(node_id)
+
+        # Files that disappeared from the upload set lose all their vectors
+        for rel_path in [p for p in manifest.files if p not in files]:
+            stale_ids = list(manifest.remove(rel_path)["chunks"].values())
+            delete(stale_ids)
+            if store is not None:
+                store.release(owner, stale_ids, rel_path=rel_path)
+            summary["deleted"] += 1
+            summary["chunks_deleted"] += len(stale_ids)
+            manifest.save()
+
+        jobs = []
+        for rel_path, path in sorted(files.items()):
+            with trace.span("file_read", file=rel_path):
+                digest = file_hash(path)
+            entry = manifest.get(rel_path)
+            # Re-chunked when the splitter settings changed; unchanged chunks are kept as they are
+            if entry and entry["hash"] == digest and entry.get("parser") == self.parser_key:
+                summary["skipped"] += 1
+            else:
+                jobs.append((rel_path, path, digest))
+        progress("plan", files=len(jobs), skipped=summary["skipped"], deleted=summary["deleted"])
+
+        # A file is committed to the manifest only once all of its new chunks are stored
+        pending = {}
+        buffer = []
+
+        def finish(rel_path):
+            state = pending.pop(rel_path)
+            delete(state["stale_ids"])
+            if store is not None:
+                store.retain(
+                    owner, rel_path, state["digest"], self.parser_key,
+                    {node_id: h for h, node_id in state["chunks"].items()}, self.embed_key
+                )
+                store.release(owner, state["stale_ids"])
+            manifest.set(rel_path, state["digest"], state["chunks"], parser=self.parser_key)
+            manifest.save()
+            summary["updated" if state["existed"] else "added"] += 1
+            summary["chunks_deleted"] += len(state["stale_ids"])
+            progress("file_done", file=rel_path)
+
+        def flush(batch):
+            check_cancelled()
+            cached = {}
+            if self.chunk_store is not None:
+                with trace.span("embedding_lookup", chunks=len(batch)) as span:
+                    cached = self.chunk_store.get_embeddings([h for _, h, _ in batch], self.embed_key)
+                    span["hits"] = len(cached)
+            missing = {h: node for _, h, node in batch if h not in cached}
+            if missing:
+                with trace.span("embedding_batch", chunks=len(missing)):
+                    embeddings = self.embed_model.get_text_embedding_batch(
+                        [node.get_content(metadata_mode=MetadataMode.EMBED) for node in missing.values()]
+                    )
+                computed = dict(zip(missing, embeddings))
+                if self.chunk_store is not None:
+                    self.chunk_store.put_embeddings(computed, self.embed_key)
+                cached.update(computed)
+            for _, h, node in batch:
+                node.embedding = cached[h]
+            summary["chunks_embedded"] += len(missing)
+            summary["chunks_reused"] += len(batch) - len(missing)
+            # Recorded before the write, so a batch that fails halfway is cleaned up too
+            for rel_path, _, node in batch:
+                pending[rel_path]["stored"].append(node.node_id)
+            with trace.span("chroma_upsert", chunks=len(batch)):
+                vector_store.add([node for _, _, node in batch])
+                if bm25 is not None:
+                    for _, _, node in batch:
+                        bm25.add(node.node_id, node.get_content(metadata_mode=MetadataMode.NONE))
+            per_file = {}
+            for rel_path, _, _ in batch:
+                per_file[rel_path] = per_file.get(rel_path, 0) + 1
+            progress("batch", chunks=len(batch), files=per_file)
+            for rel_path, _, _ in batch:
+                pending[rel_path]["remaining"] -= 1
+                if pending[rel_path]["remaining"] == 0:
+                    finish(rel_path)
+
+        chunked = self._chunked_files(jobs, trace)
+        try:
+            for (rel_path, path, digest), nodes in chunked:
+                check_cancelled()
+                entry = manifest.get(rel_path)
+                old_chunks = entry["chunks"] if entry else {}
+                new_nodes = {}
+                for node in nodes:
+                    new_nodes.setdefault(chunk_hash(node.get_content(metadata_mode=MetadataMode.EMBED)), node)
+                del nodes
+
+                # Only chunks whose content changed are written again
+                fresh_nodes = []
+                for chunk_digest, node in new_nodes.items():
+                    if chunk_digest not in old_chunks:
+                        node.id_ = node_id_for(rel_path, chunk_digest)
+                        fresh_nodes.append((chunk_digest, node))
+
+                pending[rel_path] = {
+                    "digest": digest,
+                    "existed": entry is not None,
+                    "chunks": {h: old_chunks.get(h) or node_id_for(rel_path, h) for h in new_nodes},
+                    "stale_ids": [old_chunks[h] for h in old_chunks if h not in new_nodes],
+                    "remaining": len(fresh_nodes),
+                    "stored": []
+                }
+                progress("chunked", file=rel_path, chunks=len(fresh_nodes))
+                if not fresh_nodes:
+                    finish(rel_path)
+
+                buffer.extend((rel_path, h, node) for h, node in fresh_nodes)
+                while len(buffer) >= self.batch_size:
+                    flush(buffer[:self.batch_size])
+                    del buffer[:self.batch_size]
+
+            if buffer:
+                flush(buffer)
+        except BaseException:
+            # Cancelled or failed: uncommitted files leave nothing behind (they have no
+            # manifest entry to delete them later); committed ones stay indexed
+            for state in pending.values():
+                try:
+                    delete(state["stored"])
+                except Exception:
+                    # Best effort; the original error is what the caller needs to see
+                    pass
+            raise
+        finally:
+            chunked.close()
+
+        return summary
@@ -0,0 +1,180 @@
+import time
+import uuid
+import threading
+from collections import OrderedDict
+
+from src.config import INGEST_JOB_WORKERS, INGEST_JOBS_PER_SESSION
+
+ACTIVE = ("queued", "running")
+
+
+class IngestionJob:
+    """
+    One process_documents run. Progress is filled in from the pipeline's
+    progress events; snapshot() gives a consistent copy for the UI.
+    """
+
+    def __init__(self, session, file_dir, db_path):
+        self.id = uuid.uuid4().hex[:12]
+        self.session = session
+        self.file_dir = file_dir
+        self.db_path = db_path
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.files_total = None
+        self.files_done = 0
+        self.current_file = None
+        self.batches = 0
+        self.chunks_done = 0
+        # rel_path -> [fresh chunks, chunks stored]; present once the file is chunked
+        self.file_chunks = {}
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancel_requested(self):
+        return self._cancel.is_set()
+
+    def on_progress(self, event, **data):
+        with self._lock:
+            if event == "plan":
+                self.files_total = data["files"]
+            elif event == "chunked":
+                self.current_file = data["file"]
+                self.file_chunks[data["file"]] = [data["chunks"], 0]
+            elif event == "batch":
+                self.batches += 1
+                self.chunks_done += data["chunks"]
+                for rel_path, count in data["files"].items():
+                    self.file_chunks[rel_path][1] += count
+            elif event == "file_done":
+                self.files_done += 1
+
+    def fraction(self):
+        # Each file counts 30% once chunked and the rest as its chunks are stored
+        if not self.files_total:
+            return 1.0 if self.status not in ACTIVE else 0.0
+        done = 0.0
+        for fresh, stored in self.file_chunks.values():
+            done += 0.3 + 0.7 * (stored / fresh if fresh else 1.0)
+        return min(1.0, done / self.files_total)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "id": self.id,
+                "status": self.status,
+                "fraction": self.fraction(),
+                "files_total": self.files_total,
+                "files_done": self.files_done,
+                "current_file": self.current_file,
+                "batches": self.batches,
+                "chunks_done": self.chunks_done,
+                "result": self.result,
+                "error": self.error,
+                "queued_s": (self.started or time.time()) - self.created,
+                "elapsed_s": (self.finished or time.time()) - self.started if self.started else 0.0
+            }
+
+
+class IngestionQueue:
+    """
+    Runs ingestion jobs from every session on a shared pool of worker threads,
+    at most per_session at a time for the same session (later ones wait in order).
+    engine_getter() returns the AdvancedRAG engine; it is called on the worker,
+    so jobs can be submitted while the models are still loading.
+    """
+
+    def __init__(self, engine_getter, workers=INGEST_JOB_WORKERS, per_session=INGEST_JOBS_PER_SESSION, keep_finished=200):
+        self.engine_getter = engine_getter
+        self.per_session = max(1, per_session)
+        self.keep_finished = keep_finished
+        self._jobs = OrderedDict()
+        self._queue = []
+        self._running = {}
+        self._cond = threading.Condition()
+        for i in range(max(1, workers)):
+            threading.Thread(target=self._worker, name=f"ingest-job-{i}", daemon=True).start()
+
+    def submit(self, session, file_dir, db_path):
+        job = IngestionJob(session, file_dir, db_path)
+        with self._cond:
+            self._jobs[job.id] = job
+            self._queue.append(job)
+            self._forget_finished()
+            self._cond.notify()
+        return job.id
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def status(self, job_id):
+        job = self._jobs.get(job_id)
+        return job.snapshot() if job else None
+
+    def cancel(self, job_id):
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.status not in ACTIVE:
+                return False
+            job.cancel()
+            if job.status == "queued":
+                self._queue.remove(job)
+                job.status = "cancelled"
+                job.finished = time.time()
+            return True
+
+    def active(self, session):
+        return [job.id for job in list(self._jobs.values()) if job.session == session and job.status in ACTIVE]
+
+    def busy_sessions(self):
+        return {job.session for job in list(self._jobs.values()) if job.status in ACTIVE}
+
+    def _forget_finished(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.status not in ACTIVE]
+        for job_id in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[job_id]
+
+    def _next_job(self):
+        # First queued job whose session is below its concurrency limit
+        for job in self._queue:
+            if self._running.get(job.session, 0) < self.per_session:
+                self._queue.remove(job)
+                self._running[job.session] = self._running.get(job.session, 0) + 1
+                job.status = "running"
+                job.started = time.time()
+                return job
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                job = self._next_job()
+                while job is None:
+                    self._cond.wait()
+                    job = self._next_job()
+            try:
+                result = self.engine_getter().process_documents(
+                    job.file_dir, job.db_path,
+                    progress=job.on_progress, cancelled=lambda: job.cancel_requested
+                )
+                if isinstance(result, dict):
+                    job.result, job.status = result, "done"
+                elif job.cancel_requested:
+                    job.status = "cancelled"
+                else:
+                    job.error, job.status = result, "failed"
+            except Exception as e:
+                job.error, job.status = f"Error: {str(e)}", "failed"
+            finally:
+                job.finished = time.time()
+                with self._cond:
+                    self._running[job.session] -= 1
+                    self._cond.notify_all()
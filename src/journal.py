@@ -0,0 +1,97 @@
+import os
+import json
+import threading
+
+
+class ResultsJournal:
+    """
+    Append-only JSONL log of results, keyed by (model, question) unless a
+    key function is given (src.batch keys answers by item id). Every append
+    is a single fsync'd line, so a crash loses at most the line being
+    written; the latest line for a key wins on replay. compact() turns the
+    journal into the results.json array read by docs/script.js.
+    """
+
+    def __init__(self, path, key=None):
+        self.path = path
+        self.entries = {}
+        if key is not None:
+            self.key = key
+        self._lock = threading.Lock()
+        self._file = None
+        self._load()
+
+    @staticmethod
+    def key(entry):
+        return (entry["model"], entry["question"])
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        good_offset = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                self.entries[self.key(entry)] = entry
+                good_offset += len(line)
+        # Drop a torn last line so later appends start on a clean line
+        if good_offset != os.path.getsize(self.path):
+            print(f"Journal {self.path}: discarding a partially written last line.")
+            with open(self.path, "r+b") as f:
+                f.truncate(good_offset)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def values(self):
+        return list(self.entries.values())
+
+    def append(self, entry):
+        line = (json.dumps(entry) + "\n").encode("utf-8")
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._file = open(self.path, "ab")
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.entries[self.key(entry)] = entry
+
+    def seed(self, results):
+        """
+        Imports an existing results.json array into an empty journal.
+        """
+        for entry in results:
+            self.append(entry)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def compact(self, output_path, keep=None):
+        """
+        Atomically writes the latest entry per key, in first-seen order, as a JSON array.
+        With keep, only the entries for which keep(entry) is true.
+        """
+        with self._lock:
+            results = [entry for entry in self.entries.values() if keep is None or keep(entry)]
+        tmp_path = output_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(results, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, output_path)
+        return len(results)
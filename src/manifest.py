@@ -0,0 +1,79 @@
+import os
+import json
+import hashlib
+
+MANIFEST_NAME = "manifest.json"
+
+
+def file_hash(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def node_id_for(rel_path, digest):
+    # Deterministic ids let us delete exactly the vectors a chunk produced
+    return hashlib.sha256(f"{rel_path}\0{digest}".encode("utf-8")).hexdigest()
+
+
+def list_files(file_dir):
+    """
+    Maps each non-hidden file under file_dir (path relative to file_dir) to its absolute path.
+    """
+    files = {}
+    for root, dirs, names in os.walk(file_dir):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        for name in names:
+            if name.startswith("."):
+                continue
+            path = os.path.join(root, name)
+            rel = os.path.relpath(path, file_dir).replace(os.sep, "/")
+            files[rel] = path
+    return files
+
+
+class IngestionManifest:
+    """
+    Tracks, per DB path, the content hash of every indexed file, the
+    splitter settings it was chunked with and the chunk hash -> vector id
+    mapping that file produced.
+    """
+
+    def __init__(self, db_path, files=None):
+        self.path = os.path.join(db_path, MANIFEST_NAME)
+        self.files = files or {}
+
+    @classmethod
+    def load(cls, db_path):
+        path = os.path.join(db_path, MANIFEST_NAME)
+        if not os.path.exists(path):
+            return cls(db_path)
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+            return cls(db_path, data.get("files", {}))
+        except (OSError, ValueError):
+            # A broken manifest only costs a full re-index
+            return cls(db_path)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"files": self.files}, f)
+        os.replace(tmp_path, self.path)
+
+    def get(self, rel_path):
+        return self.files.get(rel_path)
+
+    def set(self, rel_path, digest, chunks, parser=None):
+        self.files[rel_path] = {"hash": digest, "parser": parser, "chunks": chunks}
+
+    def remove(self, rel_path):
+        return self.files.pop(rel_path, None)
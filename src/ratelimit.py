@@ -0,0 +1,80 @@
+import time
+import random
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Async token bucket: `rate` requests per second with bursts up to `capacity`.
+    block_for() empties the bucket and pauses it, e.g. after a 429.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    def per_minute(cls, rpm, burst=None):
+        return cls(rpm / 60.0, capacity=burst)
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def block_for(self, seconds):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+
+def status_code(error):
+    code = getattr(error, "status_code", None)
+    if code is None:
+        code = getattr(getattr(error, "response", None), "status_code", None)
+    return code
+
+
+def is_rate_limited(error):
+    return status_code(error) == 429
+
+
+def retry_after(error):
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+async def call_with_backoff(call, bucket, max_retries=6, base_delay=1.0, max_delay=60.0, label=""):
+    """
+    Awaits call() under the bucket. On a 429 the bucket is paused for the
+    server's Retry-After, or for an exponentially growing, jittered delay,
+    and the call is retried. Other errors propagate immediately.
+    """
+    for attempt in range(max_retries + 1):
+        await bucket.acquire()
+        try:
+            return await call()
+        except Exception as e:
+            if not is_rate_limited(e) or attempt == max_retries:
+                raise
+            delay = retry_after(e) or min(max_delay, base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+            logger.warning("429 %s: backing off %.1fs (attempt %d/%d)", label, delay, attempt + 1, max_retries)
+            bucket.block_for(delay)
@@ -0,0 +1,66 @@
+import time
+import threading
+
+from llama_index.core.schema import NodeWithScore
+
+from src.config import RERANK_MODEL, RERANK_BATCH_SIZE, RERANK_BUDGET_MS
+
+
+class Reranker:
+    """
+    Re-scores over-fetched candidates with a small local cross-encoder on CPU.
+    Candidates are scored in retriever order, batch by batch, while the next
+    batch still fits in budget_ms (the first batch always runs); the scored
+    ones are reordered by the cross-encoder and the rest keep their retriever
+    order behind them.
+    """
+
+    def __init__(self, model_name=RERANK_MODEL, batch_size=RERANK_BATCH_SIZE, budget_ms=RERANK_BUDGET_MS):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.budget_ms = budget_ms
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._model is None:
+                from sentence_transformers import CrossEncoder
+
+                self._model = CrossEncoder(self.model_name, device="cpu")
+        return self._model
+
+    def warm(self):
+        # Loads the model and pays for the first forward pass outside any query's budget
+        self.score("warm up", ["warm up"])
+
+    def score(self, query_text, texts):
+        scores = self._load().predict([(query_text, text) for text in texts], batch_size=len(texts), show_progress_bar=False)
+        return [float(s) for s in scores]
+
+    def rerank(self, query_text, nodes, top_k):
+        """
+        Returns (best top_k NodeWithScore, info dict). Reordered nodes carry the cross-encoder score.
+        """
+        self._load()
+        budget_s = self.budget_ms / 1000
+        start_time = time.perf_counter()
+        scored, batch_s = [], 0.0
+        for begin in range(0, len(nodes), self.batch_size):
+            # Stop when another batch as slow as the last one would overrun the budget
+            if time.perf_counter() - start_time + batch_s > budget_s:
+                break
+            batch_start = time.perf_counter()
+            batch = nodes[begin:begin + self.batch_size]
+            scores = self.score(query_text, [n.node.get_content() for n in batch])
+            scored.extend(NodeWithScore(node=n.node, score=s) for n, s in zip(batch, scores))
+            batch_s = time.perf_counter() - batch_start
+
+        ranked = sorted(scored, key=lambda n: n.score, reverse=True) + list(nodes[len(scored):])
+        info = {
+            "candidates": len(nodes),
+            "scored": len(scored),
+            "complete": len(scored) == len(nodes),
+            "rerank_ms": (time.perf_counter() - start_time) * 1000
+        }
+        return ranked[:top_k], info
@@ -0,0 +1,52 @@
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore
+
+
+def reciprocal_rank_fusion(rankings, weights, k=60):
+    """
+    Fuses ranked id lists: score(id) = sum(weight / (k + rank)), rank starting at 1.
+    Returns (id, score) pairs, best first.
+    """
+    scores = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + weight / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Runs the dense retriever and the BM25 index side by side and fuses both
+    rankings with reciprocal rank fusion. Chunks only found by BM25 are
+    fetched from the vector store by id.
+    """
+
+    def __init__(self, dense_retriever, bm25, vector_store, top_k=5, candidate_k=20,
+                 dense_weight=1.0, sparse_weight=1.0, rrf_k=60):
+        super().__init__()
+        self.dense_retriever = dense_retriever
+        self.bm25 = bm25
+        self.vector_store = vector_store
+        self.top_k = top_k
+        self.candidate_k = candidate_k
+        self.dense_weight = dense_weight
+        self.sparse_weight = sparse_weight
+        self.rrf_k = rrf_k
+
+    def _retrieve(self, query_bundle):
+        dense = self.dense_retriever.retrieve(query_bundle)
+        sparse = self.bm25.search(query_bundle.query_str, self.candidate_k)
+
+        fused = reciprocal_rank_fusion(
+            [[n.node.node_id for n in dense], [doc_id for doc_id, _ in sparse]],
+            [self.dense_weight, self.sparse_weight],
+            k=self.rrf_k
+        )[:self.top_k]
+
+        nodes = {n.node.node_id: n.node for n in dense}
+        missing = [doc_id for doc_id, _ in fused if doc_id not in nodes]
+        if missing:
+            for node in self.vector_store.get_nodes(node_ids=missing):
+                nodes[node.node_id] = node
+
+        return [NodeWithScore(node=nodes[doc_id], score=score) for doc_id, score in fused if doc_id in nodes]
@@ -0,0 +1,175 @@
+import re
+import time
+import threading
+from collections import deque
+
+from src.config import (
+    ROUTE_FAST_MODELS,
+    ROUTE_DEEP_MODELS,
+    ROUTE_FAST_SLO_S,
+    ROUTE_DEEP_SLO_S,
+    ROUTE_COMPLEXITY_THRESHOLD
+)
+from src.ratelimit import status_code
+
+AUTO_MODEL = "auto"
+
+# Wording that asks for reasoning or synthesis rather than a lookup
+_COMPLEX_CUES = re.compile(
+    r"\b(why|how does|how do|how can|explain|compare|comparison|contrast|difference|differences|"
+    r"analy[sz]e|analysis|evaluate|assess|summari[sz]e|summary|discuss|implications?|trade-?offs?|"
+    r"pros and cons|advantages|disadvantages|relationship|step[- ]by[- ]step|in detail|detailed|elaborate)\b",
+    re.I
+)
+_LOOKUP_START = re.compile(r"^\s*(what is|what's|who|when|where|which|list|name|define|how many|how much)\b", re.I)
+_FALLBACK_ERRORS = ("APITimeoutError", "APIConnectionError", "ReadTimeout", "ConnectTimeout", "ConnectError")
+
+
+def should_fall_back(error):
+    """
+    Rate limits, timeouts, connection problems and server errors move on to the next model;
+    anything else (bad request, auth) would fail the same way everywhere.
+    """
+    code = status_code(error)
+    if code is not None:
+        return code == 429 or code >= 500
+    return isinstance(error, TimeoutError) or type(error).__name__ in _FALLBACK_ERRORS
+
+
+class ModelRouter:
+    """
+    "Auto" model selection. classify() scores how hard a question is from its
+    wording and from how well retrieval matched it (a strong match lowers the
+    score only for questions without reasoning cues), and picks the "fast" or
+    the "deep" route. Each route is an ordered model list with a latency SLO;
+    an attempt that runs past half the SLO (or gets a 429 / 5xx) moves on to
+    the next model, so one fallback still fits in the SLO.
+    """
+
+    def __init__(self, llm_factory, routes=None, threshold=ROUTE_COMPLEXITY_THRESHOLD):
+        self.llm_factory = llm_factory
+        self.routes = routes or {
+            "fast": {"models": ROUTE_FAST_MODELS, "slo_s": ROUTE_FAST_SLO_S},
+            "deep": {"models": ROUTE_DEEP_MODELS, "slo_s": ROUTE_DEEP_SLO_S}
+        }
+        self.threshold = threshold
+        self._llms = {}
+        self._lock = threading.Lock()
+        self._history = {name: deque(maxlen=500) for name in self.routes}
+
+    def classify(self, query_text, context_info=None):
+        score, reasons = 0, []
+        words = len(query_text.split())
+        if words > 18:
+            score += 1
+            reasons.append("long question")
+        if words > 35:
+            score += 1
+        # Comparison / multi-step wording needs the deep model however well retrieval matched
+        reasoning = bool(_COMPLEX_CUES.search(query_text))
+        if reasoning:
+            score += 2
+            reasons.append("asks for reasoning")
+        if query_text.count("?") > 1:
+            reasoning = True
+            score += 1
+            reasons.append("several questions")
+        if _LOOKUP_START.match(query_text) and words <= 12:
+            score -= 1
+            reasons.append("lookup")
+
+        if context_info:
+            top = context_info.get("top_similarity")
+            if top is not None and top < 0.35:
+                score += 1
+                reasons.append("weak retrieval match")
+            elif top is not None and top >= 0.6 and not reasoning:
+                score -= 1
+                reasons.append("strong retrieval match")
+            if context_info.get("kept", 0) >= 4:
+                score += 1
+                reasons.append("spread over many chunks")
+
+        route = "deep" if score >= self.threshold else "fast"
+        return {"route": route, "score": score, "reasons": reasons, **self.routes[route]}
+
+    def llm(self, model_name, timeout):
+        key = (model_name, timeout)
+        with self._lock:
+            if key not in self._llms:
+                self._llms[key] = self.llm_factory(model_name, timeout=timeout)
+            return self._llms[key]
+
+    def complete(self, decision, call, trace):
+        """
+        Runs call(llm) on the route's models in order until one succeeds.
+        Returns (result, model_name, fallbacks).
+        """
+        start_time = time.perf_counter()
+        last_error = None
+        for fallbacks, model_name in enumerate(decision["models"]):
+            try:
+                with trace.span("llm_completion", model=model_name):
+                    result = call(self.llm(model_name, decision["slo_s"] / 2))
+                self.record(decision, time.perf_counter() - start_time, fallbacks)
+                return result, model_name, fallbacks
+            except Exception as e:
+                if not should_fall_back(e):
+                    raise
+                last_error = e
+        self.record(decision, time.perf_counter() - start_time, len(decision["models"]), failed=True)
+        raise last_error
+
+    def stream(self, decision, start_stream, trace, on_model=None):
+        """
+        Streaming variant of complete(): start_stream(llm) returns a token generator.
+        A model is abandoned only before its first token; on_model(name, fallbacks)
+        is called once a model has produced one.
+        """
+        start_time = time.perf_counter()
+        last_error = None
+        for fallbacks, model_name in enumerate(decision["models"]):
+            tokens = None
+            try:
+                with trace.span("llm_first_token", model=model_name):
+                    tokens = start_stream(self.llm(model_name, decision["slo_s"] / 2))
+                    first = next(tokens, None)
+            except Exception as e:
+                if not should_fall_back(e):
+                    raise
+                last_error = e
+                continue
+
+            if on_model is not None:
+                on_model(model_name, fallbacks)
+            try:
+                if first is not None:
+                    yield first
+                yield from tokens
+            finally:
+                self.record(decision, time.perf_counter() - start_time, fallbacks)
+            return
+        self.record(decision, time.perf_counter() - start_time, len(decision["models"]), failed=True)
+        raise last_error
+
+    def record(self, decision, latency, fallbacks, failed=False):
+        self._history[decision["route"]].append((latency, fallbacks, failed, latency <= decision["slo_s"]))
+
+    def stats(self):
+        """
+        Per route: queries, SLO attainment, latency percentiles, fallback and failure counts.
+        """
+        stats = {}
+        for name, history in self._history.items():
+            entries = list(history)
+            latencies = sorted(e[0] for e in entries)
+            stats[name] = {
+                "queries": len(entries),
+                "slo_s": self.routes[name]["slo_s"],
+                "slo_met": sum(e[3] and not e[2] for e in entries) / len(entries) if entries else 0.0,
+                "p50_s": latencies[len(latencies) // 2] if latencies else 0.0,
+                "p95_s": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else 0.0,
+                "fallbacks": sum(e[1] for e in entries),
+                "failed": sum(e[2] for e in entries)
+            }
+        return stats
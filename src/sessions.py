@@ -0,0 +1,262 @@
+import os
+import time
+import shutil
+import tarfile
+import threading
+from collections import deque
+
+from src.config import SESSION_DIR, SESSION_QUOTA_MB, SESSION_ARCHIVE_AFTER_S
+
+ARCHIVE_DIR = ".archive"
+MARKER = ".last_used"
+
+
+def dir_size(path):
+    total = 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class SessionStore:
+    """
+    Owns the base_dir/<session_id>/{files,db} directories of the chat sessions
+    and keeps base_dir within a disk quota:
+    - sessions idle for archive_after_s are packed into base_dir/.archive/<id>.tar.gz
+      and unpacked again the next time they are opened
+    - while still over quota, the least recently used sessions are deleted
+    Sessions used within the last protect_s seconds are never touched. Only
+    session directories and their archives count towards the quota; shared
+    files in base_dir (such as the chunk store) do not.
+    maybe_enforce() runs enforce() on a background thread, so page renders
+    never wait for the directory walk or an archive being written.
+
+    on_close(db_path) is called before a session DB is archived, on_delete(db_path)
+    before it is deleted (to close Chroma clients and release shared chunks).
+    """
+
+    def __init__(self, base_dir=SESSION_DIR, quota_mb=SESSION_QUOTA_MB, archive_after_s=SESSION_ARCHIVE_AFTER_S,
+                 protect_s=300, enforce_every_s=30, on_close=None, on_delete=None):
+        self.base_dir = base_dir
+        self.archive_dir = os.path.join(base_dir, ARCHIVE_DIR)
+        self.quota_bytes = quota_mb * 1024 * 1024
+        self.archive_after_s = archive_after_s
+        self.protect_s = protect_s
+        self.enforce_every_s = enforce_every_s
+        self.on_close = on_close
+        self.on_delete = on_delete
+        self.timings = {"open": deque(maxlen=500), "restore": deque(maxlen=500), "archive": deque(maxlen=500)}
+        self.counters = {"archived": 0, "restored": 0, "deleted": 0}
+        self._last_enforce = 0.0
+        self._enforcing = None
+        self._snapshot = None
+        # Guards _session_locks and the background pass; each session has its own lock,
+        # so opening one never waits for another being archived
+        self._lock = threading.Lock()
+        self._session_locks = {}
+        os.makedirs(self.archive_dir, exist_ok=True)
+
+    def paths(self, session_id):
+        session_dir = os.path.join(self.base_dir, session_id)
+        return os.path.join(session_dir, "files"), os.path.join(session_dir, "db")
+
+    def _session_lock(self, session_id):
+        with self._lock:
+            return self._session_locks.setdefault(session_id, threading.RLock())
+
+    def _archive_path(self, session_id):
+        return os.path.join(self.archive_dir, f"{session_id}.tar.gz")
+
+    def open(self, session_id):
+        """
+        Returns (files_dir, db_dir) for the session, restoring it from its archive if needed.
+        """
+        start_time = time.perf_counter()
+        with self._session_lock(session_id):
+            session_dir = os.path.join(self.base_dir, session_id)
+            restored = not os.path.isdir(session_dir) and os.path.exists(self._archive_path(session_id))
+            if restored:
+                self._restore(session_id)
+            files_dir, db_dir = self.paths(session_id)
+            os.makedirs(files_dir, exist_ok=True)
+            os.makedirs(db_dir, exist_ok=True)
+            self.touch(session_id)
+        elapsed = time.perf_counter() - start_time
+        self.timings["restore" if restored else "open"].append(elapsed)
+        return files_dir, db_dir
+
+    def _last_used(self, session_id):
+        session_dir = os.path.join(self.base_dir, session_id)
+        marker = os.path.join(session_dir, MARKER)
+        return os.path.getmtime(marker if os.path.exists(marker) else session_dir)
+
+    def touch(self, session_id):
+        marker = os.path.join(self.base_dir, session_id, MARKER)
+        with open(marker, "a"):
+            pass
+        os.utime(marker)
+
+    def sessions(self):
+        """
+        Every known session: {"id", "archived", "bytes", "last_used"}.
+        """
+        found = []
+        for name in os.listdir(self.base_dir):
+            path = os.path.join(self.base_dir, name)
+            if name.startswith(".") or not os.path.isdir(path):
+                continue
+            found.append({"id": name, "archived": False, "bytes": dir_size(path), "last_used": self._last_used(name)})
+        for name in os.listdir(self.archive_dir):
+            if not name.endswith(".tar.gz"):
+                continue
+            path = os.path.join(self.archive_dir, name)
+            # The archive's mtime is set to the session's last use when it is written
+            found.append({
+                "id": name[:-len(".tar.gz")], "archived": True,
+                "bytes": os.path.getsize(path), "last_used": os.path.getmtime(path)
+            })
+        return found
+
+    def usage_bytes(self, sessions=None):
+        # Session directories and archives only: shared files cannot be freed by evicting sessions
+        return sum(s["bytes"] for s in (self.sessions() if sessions is None else sessions))
+
+    def archive(self, session_id):
+        start_time = time.perf_counter()
+        with self._session_lock(session_id):
+            session_dir = os.path.join(self.base_dir, session_id)
+            last_used = self._last_used(session_id)
+            if self.on_close is not None:
+                self.on_close(self.paths(session_id)[1])
+
+            archive_path = self._archive_path(session_id)
+            tmp_path = archive_path + ".tmp"
+            with tarfile.open(tmp_path, "w:gz", compresslevel=6) as tar:
+                tar.add(session_dir, arcname=session_id)
+            os.utime(tmp_path, (last_used, last_used))
+            os.replace(tmp_path, archive_path)
+            shutil.rmtree(session_dir)
+            self.counters["archived"] += 1
+        self.timings["archive"].append(time.perf_counter() - start_time)
+
+    def _restore(self, session_id):
+        archive_path = self._archive_path(session_id)
+        tmp_dir = os.path.join(self.archive_dir, f"{session_id}.restore")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        with tarfile.open(archive_path, "r:gz") as tar:
+            if hasattr(tarfile, "data_filter"):
+                tar.extractall(tmp_dir, filter="data")
+            else:
+                tar.extractall(tmp_dir)
+        os.replace(os.path.join(tmp_dir, session_id), os.path.join(self.base_dir, session_id))
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.remove(archive_path)
+        self.counters["restored"] += 1
+
+    def delete(self, session_id):
+        with self._session_lock(session_id):
+            if self.on_delete is not None:
+                self.on_delete(self.paths(session_id)[1])
+            shutil.rmtree(os.path.join(self.base_dir, session_id), ignore_errors=True)
+            if os.path.exists(self._archive_path(session_id)):
+                os.remove(self._archive_path(session_id))
+            self.counters["deleted"] += 1
+
+    def _in_use(self, session_id, keep, now):
+        # Re-checked under the lock: the session may have been opened since enforce() listed it
+        if session_id in keep:
+            return True
+        if not os.path.isdir(os.path.join(self.base_dir, session_id)):
+            return False
+        return now - self._last_used(session_id) <= self.protect_s
+
+    def enforce(self, keep=()):
+        """
+        Archives idle sessions, then deletes least recently used ones until
+        their total size fits the quota. Returns {"archived": [...], "deleted": [...]}.
+        Each archive or delete only locks its own session.
+        """
+        actions = {"archived": [], "deleted": []}
+        self._last_enforce = time.time()
+        now = time.time()
+        candidates = [
+            s for s in self.sessions()
+            if s["id"] not in keep and now - s["last_used"] > self.protect_s
+        ]
+
+        if self.archive_after_s > 0:
+            for session in candidates:
+                if not session["archived"] and now - session["last_used"] > self.archive_after_s:
+                    with self._session_lock(session["id"]):
+                        if self._in_use(session["id"], keep, time.time()):
+                            continue
+                        self.archive(session["id"])
+                    actions["archived"].append(session["id"])
+
+        sessions = self.sessions()
+        usage = self.usage_bytes(sessions)
+        if usage > self.quota_bytes:
+            # Sizes changed for the sessions archived above
+            candidate_ids = {s["id"] for s in candidates}
+            candidates = [s for s in sessions if s["id"] in candidate_ids]
+            for session in sorted(candidates, key=lambda s: s["last_used"]):
+                if usage <= self.quota_bytes:
+                    break
+                with self._session_lock(session["id"]):
+                    if self._in_use(session["id"], keep, time.time()):
+                        continue
+                    self.delete(session["id"])
+                actions["deleted"].append(session["id"])
+                usage -= session["bytes"]
+
+        self._take_snapshot()
+        return actions
+
+    def _take_snapshot(self):
+        sessions = self.sessions()
+        self._snapshot = {
+            "usage_mb": self.usage_bytes(sessions) / (1024 * 1024),
+            "sessions": sum(not s["archived"] for s in sessions),
+            "archived_sessions": sum(s["archived"] for s in sessions)
+        }
+
+    def maybe_enforce(self, keep=()):
+        """
+        Starts enforce(keep) on a background thread unless one is running or the
+        last pass was less than enforce_every_s ago. Returns the thread, or None.
+        """
+        with self._lock:
+            if self._enforcing is not None and self._enforcing.is_alive():
+                return None
+            if time.time() - self._last_enforce < self.enforce_every_s:
+                return None
+            self._last_enforce = time.time()
+            self._enforcing = threading.Thread(
+                target=self.enforce, args=(set(keep),), name="session-quota", daemon=True
+            )
+            self._enforcing.start()
+            return self._enforcing
+
+    def stats(self):
+        """
+        Disk usage as of the last enforce() (None until the first pass has
+        finished) plus counters and latency percentiles.
+        """
+        snapshot = self._snapshot or {"usage_mb": None, "sessions": None, "archived_sessions": None}
+        stats = {**snapshot, "quota_mb": self.quota_bytes / (1024 * 1024), **self.counters}
+        for name, values in self.timings.items():
+            values = list(values)
+            stats[f"{name}_p50_ms"] = _percentile(values, 50) * 1000
+            stats[f"{name}_p95_ms"] = _percentile(values, 95) * 1000
+        return stats
@@ -0,0 +1,143 @@
+import sys
+import json
+import time
+import uuid
+import threading
+from contextlib import contextmanager
+
+from src.config import TRACE_SINK
+
+
+class Trace:
+    """
+    Spans of one ingestion run or one query. Spans are plain dicts:
+    {"trace_id", "trace", "span", "offset_ms", "duration_ms", "status", ...attributes}.
+    """
+
+    def __init__(self, tracer, name, **attrs):
+        self.tracer = tracer
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.attrs = attrs
+        self.spans = []
+        self.error = None
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def _add(self, record):
+        with self._lock:
+            self.spans.append(record)
+        if self.tracer is not None:
+            self.tracer.emit(record)
+
+    def _record(self, name, start, duration, attrs):
+        return {
+            "trace_id": self.trace_id,
+            "trace": self.name,
+            "span": name,
+            "offset_ms": (start - self._start) * 1000,
+            "duration_ms": duration * 1000,
+            "status": "ok",
+            **attrs
+        }
+
+    @contextmanager
+    def span(self, name, **attrs):
+        """
+        Times the enclosed block. The yielded dict can be given extra attributes.
+        """
+        start = time.perf_counter()
+        record = self._record(name, start, 0.0, attrs)
+        try:
+            yield record
+        except Exception as e:
+            record["status"] = "error"
+            record["error"] = str(e)
+            raise
+        finally:
+            record["duration_ms"] = (time.perf_counter() - start) * 1000
+            self._add(record)
+
+    def record(self, name, duration, **attrs):
+        """
+        Adds a span measured elsewhere (e.g. in a worker process) that ended just now.
+        """
+        now = time.perf_counter()
+        self._add(self._record(name, now - duration, duration, attrs))
+
+    def fail(self, error):
+        self.error = str(error)
+
+    def finish(self, **attrs):
+        duration = time.perf_counter() - self._start
+        record = self._record(self.name, self._start, duration, {**self.attrs, **attrs, "root": True})
+        if self.error is not None:
+            record["status"] = "error"
+            record["error"] = self.error
+        self._add(record)
+        return self.breakdown()
+
+    def breakdown(self):
+        with self._lock:
+            return [
+                {"span": s["span"], "duration_ms": s["duration_ms"], "status": s["status"]}
+                for s in self.spans
+            ]
+
+
+class Tracer:
+    """
+    Creates traces and writes every finished span as one JSON line to the sink:
+    "" (off), "stdout", or a file path. Listeners receive each span dict as well.
+    """
+
+    def __init__(self, sink=TRACE_SINK):
+        self.sink = sink
+        self.listeners = []
+        self._lock = threading.Lock()
+
+    def start(self, name, **attrs):
+        return Trace(self, name, **attrs)
+
+    def emit(self, record):
+        for listener in self.listeners:
+            listener(record)
+        if not self.sink:
+            return
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock:
+            if self.sink == "stdout":
+                sys.stdout.write(line)
+            else:
+                with open(self.sink, "a") as f:
+                    f.write(line)
+
+
+def load_spans(path):
+    spans = []
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                spans.append(json.loads(line))
+    return spans
+
+
+def summarize_spans(spans):
+    """
+    Per-stage count, total, p50 and p95 duration (ms) for a list of span dicts.
+    """
+    by_name = {}
+    for span in spans:
+        by_name.setdefault(span["span"], []).append(span["duration_ms"])
+    summary = {}
+    for name, durations in by_name.items():
+        durations.sort()
+        summary[name] = {
+            "count": len(durations),
+            "total_ms": sum(durations),
+            "p50_ms": durations[len(durations) // 2],
+            "p95_ms": durations[min(len(durations) - 1, int(len(durations) * 0.95))]
+        }
+    return summary
@@ -0,0 +1,77 @@
+import time
+import threading
+import importlib
+
+
+class EngineLoader:
+    """
+    Imports src.backend (torch, chromadb, llama_index, ...) and builds the
+    AdvancedRAG engine on a background thread, so the UI can render first.
+    get() blocks only until the warm-up has finished.
+    """
+
+    def __init__(self, eager=True, **engine_kwargs):
+        self.engine_kwargs = engine_kwargs
+        self.profile = {}
+        self._created = time.perf_counter()
+        self._engine = None
+        self._error = None
+        self._started = False
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        if eager:
+            self.start()
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(target=self._load, name="rag-warmup", daemon=True).start()
+
+    def _load(self):
+        try:
+            start_time = time.perf_counter()
+            backend = importlib.import_module("src.backend")
+            self.profile["import_s"] = time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
+            engine = backend.AdvancedRAG(**self.engine_kwargs)
+            self.profile["engine_init_s"] = time.perf_counter() - start_time
+
+            # First forward pass pays for lazy kernel/session initialisation
+            start_time = time.perf_counter()
+            engine.embed_model.get_query_embedding("warm up")
+            self.profile["warmup_embed_s"] = time.perf_counter() - start_time
+
+            if engine.reranker is not None:
+                start_time = time.perf_counter()
+                engine.reranker.warm()
+                self.profile["warmup_rerank_s"] = time.perf_counter() - start_time
+
+            self._engine = engine
+        except Exception as e:
+            self._error = e
+        finally:
+            self.profile["ready_after_s"] = time.perf_counter() - self._created
+            print(f"Startup profile: {self.format_profile()}", flush=True)
+            self._done.set()
+
+    @property
+    def ready(self):
+        return self._done.is_set()
+
+    def get(self, timeout=None):
+        self.start()
+        if not self._done.is_set():
+            start_time = time.perf_counter()
+            self._done.wait(timeout)
+            self.profile.setdefault("first_wait_s", time.perf_counter() - start_time)
+        if self._error is not None:
+            raise self._error
+        if self._engine is None:
+            raise TimeoutError("RAG engine is still loading.")
+        return self._engine
+
+    def format_profile(self):
+        return ", ".join(f"{key} {value:.2f}s" for key, value in self.profile.items())
@@ -0,0 +1,88 @@
+import os
+import sys
+
+from llama_index.core.embeddings import MockEmbedding
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.answer_cache import AnswerCache
+from src.backend import AdvancedRAG
+from src.fake_llm import fake_llm_factory
+
+
+def touch_manifest(db_path, mtime_ns):
+    # What committing a file to the index does to the index version
+    os.makedirs(db_path, exist_ok=True)
+    path = os.path.join(db_path, "manifest.json")
+    with open(path, "w") as f:
+        f.write('{"files": {}}')
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_entries_are_not_served_after_the_index_version_changes(tmp_path):
+    db_path = str(tmp_path / "db")
+    touch_manifest(db_path, 1_000_000_000)
+    cache = AnswerCache(max_entries=10, ttl_s=0, threshold=0.9)
+    cache.put(cache.scope(db_path, "model"), "What is QX-1?", [1.0, 0.0], "old answer")
+    assert cache.get_exact(cache.scope(db_path, "model"), "what is qx-1")["answer"] == "old answer"
+
+    # Re-ingested (by this engine or any other): same path, new manifest mtime
+    touch_manifest(db_path, 2_000_000_000)
+    scope = cache.scope(db_path, "model")
+    assert cache.get_exact(scope, "What is QX-1?") is None
+    assert cache.get_similar(scope, "What is QX-1?", [1.0, 0.0]) is None
+
+
+def test_semantic_hits_stay_within_one_session_db(tmp_path):
+    db_a, db_b = str(tmp_path / "a"), str(tmp_path / "b")
+    touch_manifest(db_a, 1_000_000_000)
+    touch_manifest(db_b, 1_000_000_000)
+    cache = AnswerCache(max_entries=10, ttl_s=0, threshold=0.9)
+    cache.put(cache.scope(db_a, "model"), "Which code did experiment 7 use?", [1.0, 0.1], "answer from a")
+
+    paraphrase = "What code was used by experiment 7?"
+    assert cache.get_similar(cache.scope(db_b, "model"), paraphrase, [1.0, 0.1]) is None
+    assert cache.get_similar(cache.scope(db_a, "other model"), paraphrase, [1.0, 0.1]) is None
+    assert cache.get_similar(cache.scope(db_a, "model"), paraphrase, [1.0, 0.1])["answer"] == "answer from a"
+
+    # Dropping one session leaves the other's answers alone
+    cache.put(cache.scope(db_b, "model"), "Which code did experiment 7 use?", [1.0, 0.1], "answer from b")
+    cache.invalidate(db_a)
+    assert cache.get_exact(cache.scope(db_a, "model"), "Which code did experiment 7 use?") is None
+    assert cache.get_exact(cache.scope(db_b, "model"), "Which code did experiment 7 use?")["answer"] == "answer from b"
+
+
+def test_query_is_not_answered_from_cache_after_reingest(tmp_path):
+    files_dir = tmp_path / "files"
+    files_dir.mkdir()
+    (files_dir / "a.txt").write_text("The reference code of experiment one is QX-1111.")
+    db_path = str(tmp_path / "db")
+
+    rag = AdvancedRAG(
+        llm_factory=fake_llm_factory(),
+        embed_model=MockEmbedding(embed_dim=8),
+        ingest_workers=1,
+        chunk_store_path="",
+        vector_store="flat"
+    )
+    assert isinstance(rag.process_documents(str(files_dir), db_path), dict)
+    question = "Which reference code did experiment one use?"
+    for expected in ("miss", "exact"):
+        stats = {}
+        rag.query(question, db_path, "stub-llm", stats=stats)
+        assert stats["cache"] == expected
+
+    # Another engine rewrote the index: only the manifest mtime tells this one
+    manifest = os.path.join(db_path, "manifest.json")
+    mtime_ns = os.stat(manifest).st_mtime_ns + 1_000_000_000
+    os.utime(manifest, ns=(mtime_ns, mtime_ns))
+    stats = {}
+    rag.query(question, db_path, "stub-llm", stats=stats)
+    assert stats["cache"] == "miss"
+
+    # And this engine's own re-ingest drops the entries outright
+    (files_dir / "b.txt").write_text("The reference code of experiment two is QX-2222.")
+    assert isinstance(rag.process_documents(str(files_dir), db_path), dict)
+    stats = {}
+    rag.query(question, db_path, "stub-llm", stats=stats)
+    assert stats["cache"] == "miss"
+    rag.close_session(db_path)
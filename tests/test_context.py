@@ -0,0 +1,63 @@
+import os
+import sys
+
+from llama_index.core.schema import NodeWithScore, TextNode
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.context import ContextPacker, count_tokens
+
+QUERY = [1.0, 0.0, 0.0]
+
+
+def chunks(*items):
+    # items: (node_id, text, vector); returns retriever-ordered nodes and the stored vectors
+    nodes = [NodeWithScore(node=TextNode(id_=node_id, text=text), score=1.0) for node_id, text, _ in items]
+    return nodes, {node_id: vector for node_id, _, vector in items}
+
+
+def test_similarity_cutoff_drops_weak_chunks_but_keeps_the_top_ranked():
+    nodes, vectors = chunks(
+        ("bm25", "Exact identifier match QX-4471.", [0.1, 0.0, 1.0]),
+        ("good", "Gradient boosting adds trees one at a time.", [1.0, 0.0, 0.0]),
+        ("close", "Each new tree fits the previous residuals.", [0.9, 0.5, 0.0]),
+        ("weak", "The lab is on the second floor.", [0.2, 0.0, 1.0])
+    )
+    packer = ContextPacker(token_budget=1000, min_ratio=0.5, dup_threshold=0.99, keep_top=1)
+    pieces, info = packer.pack("How does gradient boosting work?", QUERY, nodes, vectors)
+    assert pieces[0] == "Exact identifier match QX-4471."
+    assert "The lab is on the second floor." not in pieces
+    assert info["low_score"] == 1 and info["kept"] == 3
+    assert info["top_similarity"] == 1.0
+
+
+def test_mmr_drops_near_duplicates_and_prefers_new_information():
+    nodes, vectors = chunks(
+        ("a", "Random forests average many decorrelated trees.", [0.9, 0.44, 0.0]),
+        ("a-copy", "Random forests average many de-correlated trees.", [0.9, 0.441, 0.0]),
+        ("similar", "Forests of trees are averaged.", [0.95, 0.31, 0.0]),
+        ("different", "Bagging samples the training set with replacement.", [0.85, -0.2, 0.5])
+    )
+    packer = ContextPacker(token_budget=1000, min_ratio=0.0, mmr_lambda=0.5, dup_threshold=0.995, keep_top=1)
+    pieces, info = packer.pack("random forests", QUERY, nodes, vectors)
+    assert info["duplicates"] == 1
+    assert "Random forests average many de-correlated trees." not in pieces
+    # Less similar to the query than "similar", but far less redundant with what is already chosen
+    assert pieces.index("Bagging samples the training set with replacement.") < pieces.index("Forests of trees are averaged.")
+
+
+def test_compression_keeps_the_answer_sentence_within_the_budget():
+    filler = " ".join(f"Filler sentence {i} talks about unrelated laboratory logistics." for i in range(30))
+    answer = "The reference code of experiment seven is QX-4471."
+    long_text = f"{filler} {answer} {filler}"
+    nodes, vectors = chunks(
+        ("first", "Experiments are registered with a reference code.", [1.0, 0.0, 0.0]),
+        ("long", long_text, [0.8, 0.6, 0.0])
+    )
+    budget = 80
+    assert count_tokens(long_text) > budget
+    packer = ContextPacker(token_budget=budget, min_ratio=0.0, dup_threshold=0.99, min_sentence_tokens=10)
+    pieces, info = packer.pack("What is the reference code of experiment seven?", QUERY, nodes, vectors)
+    assert info["compressed"] == 1
+    assert answer in pieces[1]
+    assert info["tokens_after"] <= budget
+    assert sum(count_tokens(piece) for piece in pieces) <= budget
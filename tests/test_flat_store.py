@@ -0,0 +1,44 @@
+import os
+import sys
+
+from llama_index.core import StorageContext
+from llama_index.core.embeddings import MockEmbedding
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import src.backend
+from src.backend import AdvancedRAG
+from src.fake_llm import fake_llm_factory
+from src.flat_store import FlatVectorStore
+
+
+def test_empty_store_is_used_by_storage_context(tmp_path):
+    # An empty store has len() == 0; llama-index must still use it rather than a SimpleVectorStore
+    store = FlatVectorStore(str(tmp_path / "flat"))
+    assert len(store) == 0
+    assert StorageContext.from_defaults(vector_store=store).vector_store is store
+
+
+def test_ingest_then_query_fresh_flat_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(src.backend, "get_service_embed_model", lambda: MockEmbedding(embed_dim=8))
+    files_dir = tmp_path / "files"
+    files_dir.mkdir()
+    (files_dir / "notes.txt").write_text(
+        "The reference code of experiment seven is QX-4471. It was run on the second floor."
+    )
+    db_path = str(tmp_path / "db")
+
+    rag = AdvancedRAG(
+        llm_factory=fake_llm_factory(),
+        ingest_workers=1,
+        chunk_store_path="",
+        vector_store="flat"
+    )
+    summary = rag.process_documents(str(files_dir), db_path)
+    assert isinstance(summary, dict) and summary["added"] == 1
+
+    # Dense retrieval alone, so BM25 cannot hide an empty vector store
+    nodes = rag.retrieve("Which reference code did experiment seven use?", db_path, mode="dense")
+    assert nodes
+    assert "QX-4471" in nodes[0].node.get_content()
+    assert len(rag._get_store(db_path)["vector_store"]) == summary["chunks_embedded"]
+    rag.close_session(db_path)
@@ -0,0 +1,140 @@
+import os
+import sys
+import time
+import random
+import threading
+
+from llama_index.core.embeddings import MockEmbedding
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.backend import AdvancedRAG
+from src.fake_llm import fake_llm_factory
+from src.handles import HandleCache
+
+
+class Handle:
+    def __init__(self, name):
+        self.name = name
+        self.closed = 0
+
+
+def close(handle):
+    handle.closed += 1
+
+
+def test_lru_eviction_closes_the_least_recently_used_handle():
+    cache = HandleCache(max_clients=2, close=close)
+    a = cache.get_client("a", lambda: Handle("a"))
+    b = cache.get_client("b", lambda: Handle("b"))
+    cache.get_pipeline("a", "model", lambda: "pipeline a")
+    assert cache.get_client("a", lambda: Handle("a2")) is a  # a is now the most recent
+
+    cache.get_client("c", lambda: Handle("c"))
+    assert (a.closed, b.closed) == (0, 1)
+    assert cache.get_client("b", lambda: Handle("b2")).name == "b2"
+    # Evicting a drops its pipelines too
+    assert a.closed == 1
+    assert cache.get_pipeline("a", "model", lambda: "rebuilt") == "rebuilt"
+    assert cache.stats()["evictions"] == 2
+
+
+def test_leased_handle_is_closed_only_after_the_last_release():
+    cache = HandleCache(max_clients=1, close=close)
+    a = cache.get_client("a", lambda: Handle("a"))
+    cache.acquire("a")
+    cache.acquire("a")
+    cache.get_client("b", lambda: Handle("b"))
+    assert a.closed == 0 and cache.stats()["evicted_in_use"] == 1
+
+    cache.release("a")
+    assert a.closed == 0
+    cache.release("a")
+    assert a.closed == 1 and cache.stats()["evicted_in_use"] == 0
+
+
+def test_leased_handle_is_taken_back_instead_of_reopened():
+    cache = HandleCache(max_clients=1, close=close)
+    a = cache.get_client("a", lambda: Handle("a"))
+    cache.acquire("a")
+    cache.get_client("b", lambda: Handle("b"))
+    assert cache.get_client("a", lambda: Handle("a2")) is a
+    cache.release("a")
+    # a is open again, so the release must not close it
+    assert a.closed == 0
+    assert cache.stats()["evicted_in_use"] == 0
+
+
+def test_concurrent_leases_never_close_a_handle_in_use():
+    in_use = {}
+    errors = []
+    lock = threading.Lock()
+
+    def checked_close(handle):
+        with lock:
+            if in_use.get(handle, 0):
+                errors.append(f"{handle.name} closed while in use")
+        close(handle)
+
+    cache = HandleCache(max_clients=2, close=checked_close)
+    opened = []
+
+    def open_handle(path):
+        handle = Handle(path)
+        opened.append(handle)
+        return handle
+
+    def worker(seed):
+        rng = random.Random(seed)
+        for _ in range(300):
+            path = f"db{rng.randrange(6)}"
+            cache.acquire(path)
+            try:
+                handle = cache.get_client(path, lambda: open_handle(path))
+                with lock:
+                    if handle.closed:
+                        errors.append(f"{path} handed out after close")
+                    in_use[handle] = in_use.get(handle, 0) + 1
+                time.sleep(0.0002)  # a query using the handle
+                with lock:
+                    in_use[handle] -= 1
+            finally:
+                cache.release(path)
+
+    threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert all(handle.closed <= 1 for handle in opened)
+    assert cache.stats()["evicted_in_use"] == 0
+    # Everything not currently open was closed exactly once
+    assert sum(handle.closed == 0 for handle in opened) == cache.stats()["open_clients"]
+
+
+def test_process_documents_invalidates_cached_pipelines(tmp_path):
+    files_dir = tmp_path / "files"
+    files_dir.mkdir()
+    (files_dir / "a.txt").write_text("The reference code of experiment one is QX-1111.")
+    db_path = str(tmp_path / "db")
+
+    rag = AdvancedRAG(
+        llm_factory=fake_llm_factory(),
+        embed_model=MockEmbedding(embed_dim=8),
+        ingest_workers=1,
+        chunk_store_path="",
+        vector_store="flat"
+    )
+    rag.answer_cache = None
+    assert isinstance(rag.process_documents(str(files_dir), db_path), dict)
+    pipeline = rag._get_pipeline(db_path, "stub-llm")
+    assert rag._get_pipeline(db_path, "stub-llm") is pipeline
+
+    (files_dir / "b.txt").write_text("The reference code of experiment two is QX-2222.")
+    assert isinstance(rag.process_documents(str(files_dir), db_path), dict)
+    assert rag._get_pipeline(db_path, "stub-llm") is not pipeline
+
+    nodes = rag.retrieve("Which reference code is QX-2222?", db_path, mode="hybrid")
+    assert any("QX-2222" in n.node.get_content() for n in nodes)
+    rag.close_session(db_path)
@@ -0,0 +1,52 @@
+import os
+import sys
+
+from llama_index.core.embeddings import MockEmbedding
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.backend import AdvancedRAG
+from src.fake_llm import fake_llm_factory
+from src.manifest import IngestionManifest
+
+
+class FailingEmbedder:
+    # Embeds the first `good_batches` batches, then fails like a crashed backend would
+    def __init__(self, good_batches):
+        self.model = MockEmbedding(embed_dim=8)
+        self.good_batches = good_batches
+
+    def get_text_embedding_batch(self, texts, **kwargs):
+        if self.good_batches == 0:
+            raise RuntimeError("embedding backend crashed")
+        self.good_batches -= 1
+        return self.model.get_text_embedding_batch(texts)
+
+
+def test_failed_ingest_leaves_no_uncommitted_chunks(tmp_path):
+    files_dir = tmp_path / "files"
+    files_dir.mkdir()
+    sentence = "Experiment {} on gradient boosting was registered under reference code QX-{}. "
+    (files_dir / "a.txt").write_text("".join(sentence.format(i, 1000 + i) for i in range(40)))
+    db_path = str(tmp_path / "db")
+
+    rag = AdvancedRAG(
+        llm_factory=fake_llm_factory(),
+        embed_model=MockEmbedding(embed_dim=8),
+        ingest_workers=1,
+        embed_batch_size=2,
+        chunk_size=64,
+        chunk_overlap=0,
+        chunk_store_path="",
+        vector_store="flat"
+    )
+    rag.ingestion.embed_model = FailingEmbedder(good_batches=1)
+
+    result = rag.process_documents(str(files_dir), db_path)
+    assert isinstance(result, str) and "embedding backend crashed" in result
+
+    # The first batch reached the store, but the file never committed: nothing may stay behind
+    store = rag._get_store(db_path)
+    assert len(store["vector_store"]) == 0
+    assert len(store["bm25"]) == 0
+    assert IngestionManifest.load(db_path).files == {}
+    rag.close_session(db_path)
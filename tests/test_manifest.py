@@ -0,0 +1,95 @@
+import os
+import sys
+
+from llama_index.core.embeddings import MockEmbedding
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.backend import AdvancedRAG
+from src.fake_llm import fake_llm_factory
+from src.manifest import IngestionManifest, chunk_hash, node_id_for
+
+
+class RecordingEmbedder:
+    # Remembers every text it was asked to embed
+    def __init__(self):
+        self.model = MockEmbedding(embed_dim=8)
+        self.texts = []
+
+    def get_text_embedding_batch(self, texts, **kwargs):
+        self.texts.extend(texts)
+        return self.model.get_text_embedding_batch(texts)
+
+
+def paragraph(name, n):
+    return " ".join(f"Note {i} about {name} was filed under code {name.upper()}-{i}." for i in range(n))
+
+
+def chunk_ids(db_path):
+    return {rel: set(entry["chunks"].values()) for rel, entry in IngestionManifest.load(db_path).files.items()}
+
+
+def test_incremental_reindex(tmp_path):
+    files_dir = tmp_path / "files"
+    files_dir.mkdir()
+    (files_dir / "a.txt").write_text(paragraph("alpha", 12) + "\n\n" + paragraph("omega", 12))
+    (files_dir / "b.txt").write_text(paragraph("beta", 6))
+    (files_dir / "c.txt").write_text(paragraph("gamma", 6))
+    db_path = str(tmp_path / "db")
+
+    rag = AdvancedRAG(
+        llm_factory=fake_llm_factory(),
+        embed_model=MockEmbedding(embed_dim=8),
+        ingest_workers=1,
+        chunk_size=64,
+        chunk_overlap=0,
+        chunk_store_path="",
+        vector_store="flat"
+    )
+    embedder = RecordingEmbedder()
+    rag.ingestion.embed_model = embedder
+
+    def stored_ids():
+        return {node_id for node_id, _ in rag._get_store(db_path)["vector_store"].documents()}
+
+    summary = rag.process_documents(str(files_dir), db_path)
+    assert (summary["added"], summary["chunks_embedded"]) == (3, len(embedder.texts))
+    first = chunk_ids(db_path)
+    assert len(first["a.txt"]) > 2
+    assert stored_ids() == set().union(*first.values())
+    # Ids come from the file path and chunk content only
+    for rel, entry in IngestionManifest.load(db_path).files.items():
+        assert all(node_id == node_id_for(rel, h) for h, node_id in entry["chunks"].items())
+
+    # Unchanged: nothing is parsed, embedded or deleted
+    embedder.texts.clear()
+    summary = rag.process_documents(str(files_dir), db_path)
+    assert (summary["skipped"], summary["chunks_embedded"], summary["chunks_deleted"]) == (3, 0, 0)
+    assert chunk_ids(db_path) == first
+
+    # Modified: only the changed chunks are embedded again; the rest keep their ids
+    (files_dir / "a.txt").write_text(paragraph("alpha", 12) + "\n\n" + paragraph("sigma", 12))
+    embedder.texts.clear()
+    summary = rag.process_documents(str(files_dir), db_path)
+    second = chunk_ids(db_path)
+    kept, removed, fresh = first["a.txt"] & second["a.txt"], first["a.txt"] - second["a.txt"], second["a.txt"] - first["a.txt"]
+    assert kept and removed and fresh
+    assert (summary["updated"], summary["skipped"]) == (1, 2)
+    assert summary["chunks_embedded"] == len(fresh) == len(embedder.texts)
+    assert summary["chunks_deleted"] == len(removed)
+    assert all("SIGMA" in text for text in embedder.texts)
+    assert {node_id_for("a.txt", chunk_hash(text)) for text in embedder.texts} == fresh
+    assert not stored_ids() & removed
+
+    # Added and deleted: the new file is embedded, the removed one loses every vector
+    (files_dir / "d.txt").write_text(paragraph("delta", 6))
+    os.remove(files_dir / "b.txt")
+    embedder.texts.clear()
+    summary = rag.process_documents(str(files_dir), db_path)
+    third = chunk_ids(db_path)
+    assert (summary["added"], summary["deleted"], summary["skipped"]) == (1, 1, 2)
+    assert set(third) == {"a.txt", "c.txt", "d.txt"}
+    assert summary["chunks_deleted"] == len(first["b.txt"])
+    assert all("DELTA" in text for text in embedder.texts)
+    assert stored_ids() == set().union(*third.values())
+    assert not stored_ids() & first["b.txt"]
+    rag.close_session(db_path)
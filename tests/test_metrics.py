@@ -0,0 +1,39 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.bm25 import BM25Index
+from src.benchmark.metrics import frequent_terms, item_hit, recall_at_k
+
+GOLD = ("Support vector machines find the maximum-margin hyperplane. "
+        "Experiment 12 on support vector machines was registered under reference code KT-4821.")
+WRONG = ("Experiment 7 on support vector machines was registered under reference code BP-1093. "
+         "Support vector machines benefit from careful feature scaling.")
+
+
+def test_wrong_chunk_with_the_same_vocabulary_is_not_a_hit():
+    item = {
+        "question": "Which reference code was experiment 12 on support vector machines registered under?",
+        "ground_truth": "Experiment 12 on support vector machines was registered under reference code KT-4821.",
+        "source": {"chunk": "Experiment 12 on support vector machines was registered under reference code KT-4821."}
+    }
+    assert not item_hit(item, [WRONG])
+    assert item_hit(item, [WRONG, GOLD])
+    # Line breaks from PDF extraction do not matter
+    assert item_hit(item, [GOLD.replace(" on ", "\non ")])
+
+
+def test_items_without_a_source_ignore_corpus_frequent_terms():
+    bm25 = BM25Index()
+    for i, text in enumerate([GOLD, WRONG] + [f"Support vector machines, note {i}." for i in range(8)]):
+        bm25.add(str(i), text)
+    common = frequent_terms(bm25)
+    assert {"support", "vector", "machines"} <= common
+
+    item = {"question": "What was experiment 12 registered under?",
+            "ground_truth": "Support vector machines experiment 12 code KT-4821"}
+    # Half the answer's raw terms are in the wrong chunk; none of its distinctive ones are
+    assert item_hit(item, [WRONG])
+    assert not item_hit(item, [WRONG], common=common)
+    assert item_hit(item, [GOLD], common=common)
+    assert recall_at_k([item], lambda q: [WRONG], common=common) == 0.0
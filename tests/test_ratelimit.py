@@ -0,0 +1,27 @@
+import os
+import sys
+import asyncio
+import logging
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.ratelimit import TokenBucket, call_with_backoff
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+
+def test_backoff_is_logged_not_printed(capsys, caplog):
+    attempts = []
+
+    async def call():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise RateLimited("429 Too Many Requests")
+        return "answer"
+
+    with caplog.at_level(logging.WARNING, logger="src.ratelimit"):
+        result = asyncio.run(call_with_backoff(call, TokenBucket(1000), base_delay=0.001, label="Q1"))
+    assert result == "answer"
+    assert [r.getMessage().split(":")[0] for r in caplog.records] == ["429 Q1", "429 Q1"]
+    assert capsys.readouterr().out == ""
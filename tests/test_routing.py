@@ -0,0 +1,81 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.fake_llm import fake_llm_factory
+from src.routing import ModelRouter
+from src.tracing import Trace
+
+ROUTES = {
+    "fast": {"models": ["fast-a", "fast-b"], "slo_s": 2.0},
+    "deep": {"models": ["deep-a", "deep-b"], "slo_s": 2.0}
+}
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+
+class BadRequest(Exception):
+    status_code = 400
+
+
+def test_strong_retrieval_match_does_not_cancel_reasoning_cues():
+    router = ModelRouter(fake_llm_factory(), routes=ROUTES, threshold=2)
+    strong = {"top_similarity": 0.8, "kept": 2}
+    decision = router.classify("Compare and explain in detail why random forests overfit less than trees.", strong)
+    assert decision["route"] == "deep"
+    assert "strong retrieval match" not in decision["reasons"]
+
+    decision = router.classify("What is the reference code of experiment seven?", strong)
+    assert decision["route"] == "fast"
+    assert "strong retrieval match" in decision["reasons"]
+
+
+def test_rate_limited_model_falls_back_to_the_next_one():
+    router = ModelRouter(fake_llm_factory(), routes=ROUTES)
+    decision = router.classify("What is QX-1?")
+
+    def call(llm):
+        if llm.model_name == "fast-a":
+            raise RateLimited("429 Too Many Requests")
+        return llm.complete("context").text
+
+    result, model, fallbacks = router.complete(decision, call, Trace(None, "query"))
+    assert (model, fallbacks) == ("fast-b", 1)
+    assert result.startswith("[fast-b]")
+    assert router.stats()["fast"]["fallbacks"] == 1
+
+
+def test_timed_out_stream_falls_back_before_its_first_token():
+    # fast-a takes longer than half the SLO to its first token, so its client times out
+    router = ModelRouter(fake_llm_factory(model_delays={"fast-a": 5.0}), routes={
+        "fast": {"models": ["fast-a", "fast-b"], "slo_s": 0.2}
+    })
+    decision = {"route": "fast", **router.routes["fast"]}
+    answered = []
+    tokens = router.stream(
+        decision, lambda llm: (r.delta for r in llm.stream_complete("context")),
+        Trace(None, "query"), on_model=lambda name, fallbacks: answered.append((name, fallbacks))
+    )
+    text = "".join(tokens)
+    assert answered == [("fast-b", 1)]
+    assert text.startswith("[fast-b]")
+
+
+def test_other_errors_are_not_retried_on_another_model():
+    router = ModelRouter(fake_llm_factory(), routes=ROUTES)
+    decision = router.classify("What is QX-1?")
+    calls = []
+
+    def call(llm):
+        calls.append(llm.model_name)
+        raise BadRequest("400 Bad Request")
+
+    try:
+        router.complete(decision, call, Trace(None, "query"))
+    except BadRequest:
+        pass
+    else:
+        raise AssertionError("BadRequest was swallowed")
+    assert calls == ["fast-a"]
@@ -0,0 +1,91 @@
+import os
+import sys
+import time
+from typing import Any
+
+from llama_index.core.embeddings import MockEmbedding
+from llama_index.core.llms import CompletionResponse, CompletionResponseGen
+from llama_index.core.llms.callbacks import llm_completion_callback
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.backend import AdvancedRAG
+from src.fake_llm import FakeLLM, fake_llm_factory
+
+
+class BrokenStreamLLM(FakeLLM):
+    # Streams a few tokens, then the connection drops
+    fail_after: int = 3
+
+    @llm_completion_callback()
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponseGen:
+        def gen() -> CompletionResponseGen:
+            text = ""
+            for i, token in enumerate(self._answer(prompt).split(" ")):
+                if i == self.fail_after:
+                    raise ConnectionError("stream interrupted")
+                text += token + " "
+                yield CompletionResponse(text=text, delta=token + " ")
+        return gen()
+
+
+def make_rag(tmp_path, llm_factory):
+    files_dir = tmp_path / "files"
+    files_dir.mkdir()
+    (files_dir / "notes.txt").write_text(
+        "The reference code of experiment seven is QX-4471. It was run on the second floor "
+        "by the gradient boosting group, who registered it in the spring."
+    )
+    db_path = str(tmp_path / "db")
+    rag = AdvancedRAG(
+        llm_factory=llm_factory,
+        embed_model=MockEmbedding(embed_dim=8),
+        ingest_workers=1,
+        chunk_store_path="",
+        vector_store="flat"
+    )
+    assert isinstance(rag.process_documents(str(files_dir), db_path), dict)
+    return rag, db_path
+
+
+def test_tokens_arrive_in_order_and_ttft_is_the_first_token(tmp_path):
+    rag, db_path = make_rag(tmp_path, fake_llm_factory(first_token_delay=0.2, token_delay=0.02))
+    rag.answer_cache = None
+    question = "Which reference code did experiment seven use?"
+
+    stats, received = {}, []
+    start_time = time.perf_counter()
+    for token in rag.query_stream(question, db_path, "stub-llm", stats=stats):
+        received.append((time.perf_counter() - start_time, token))
+    tokens = [token for _, token in received]
+
+    # The stream is the full answer, in order, in more than one piece
+    assert len(tokens) > 5
+    assert "".join(tokens) == rag.query(question, db_path, "stub-llm")
+    assert tokens[0].startswith("[stub-llm]")
+
+    # ttft is when the first token was yielded, not when the answer finished
+    assert 0.2 <= stats["ttft"] <= received[0][0]
+    assert stats["total_time"] >= stats["ttft"] + 0.02 * (len(tokens) - 1)
+    assert received[-1][0] - received[0][0] >= 0.02 * (len(tokens) - 1)
+    assert any(span["span"] == "llm_first_token" for span in stats["spans"])
+    rag.close_session(db_path)
+
+
+def test_error_mid_stream_ends_with_a_message_and_caches_nothing(tmp_path):
+    rag, db_path = make_rag(tmp_path, lambda model_name, timeout=None: BrokenStreamLLM(model_name=model_name))
+    question = "Which reference code did experiment seven use?"
+
+    stats = {}
+    tokens = list(rag.query_stream(question, db_path, "stub-llm", stats=stats))
+    assert tokens[0].startswith("[stub-llm]")
+    assert len(tokens) == 4
+    assert tokens[-1] == "Error during query: stream interrupted"
+    assert "ttft" in stats and stats["total_time"] >= stats["ttft"]
+    # The query trace is marked failed, and so is the completion span the error escaped from
+    assert [span["status"] for span in stats["spans"] if span["span"] in ("query", "llm_completion")] == ["error", "error"]
+    # The lease on the DB is released and the partial answer is not served next time
+    assert rag.handles._leases == {}
+    stats = {}
+    list(rag.query_stream(question, db_path, "stub-llm", stats=stats))
+    assert stats["cache"] == "miss"
+    rag.close_session(db_path)